@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.v1.endpoints import auth, projects, maps, events, map_events, event_comments, users, monitoring, notifications, event_history
+from app.api.v1.endpoints import auth, projects, maps, events, map_events, event_comments, users, monitoring, notifications, event_history, images, direct_uploads
 
 api_router = APIRouter()
 
@@ -32,4 +32,10 @@ api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(monitoring.router, prefix="/monitoring", tags=["monitoring"])
 
 # Notifications routes
-api_router.include_router(notifications.router, prefix="/notifications", tags=["notifications"]) 
\ No newline at end of file
+api_router.include_router(notifications.router, prefix="/notifications", tags=["notifications"])
+
+# Signed attachment URLs
+api_router.include_router(images.router, prefix="/image", tags=["images"])
+
+# Local stand-in for direct-to-bucket uploads
+api_router.include_router(direct_uploads.router, prefix="/direct-uploads", tags=["direct-uploads"])
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_db
+from app.core.security import verify_signed_url
+from app.services import storage
+from app.services import direct_upload as direct_upload_service
+
+router = APIRouter()
+
+
+@router.put("/{intent_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def receive_direct_upload(
+    intent_id: str,
+    request: Request,
+    expires: int = Query(...),
+    signature: str = Query(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Stand-in for the storage bucket, used when the storage backend cannot sign uploads.
+    Receives the file of a direct upload as the raw request body, through the signed
+    upload_url returned when the upload intent was created. No authentication header is needed.
+    """
+    if storage.get_backend().signed_uploads:
+        raise HTTPException(status_code=404, detail="Direct uploads go to Cloud Storage")
+    
+    if not verify_signed_url(f"{direct_upload_service.LOCAL_UPLOAD_ROUTE}/{intent_id}", expires, signature):
+        raise HTTPException(status_code=403, detail="Invalid or expired upload URL")
+    
+    intent = direct_upload_service.get_intent(db, intent_id)
+    if not intent:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    
+    # The signed Cloud Storage URL is only valid for the announced content type
+    if request.headers.get("content-type") != intent.content_type:
+        raise HTTPException(status_code=400, detail=f"Content-Type must be {intent.content_type}")
+    
+    await direct_upload_service.receive_local_upload(db, intent, request)
+    return None
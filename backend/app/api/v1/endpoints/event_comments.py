@@ -48,6 +48,7 @@ def get_event_comments(
             username=username or f"User {comment.user_id}",
             content=comment.content,
             image_url=comment.image_url,
+            thumbnails_ready=comment.thumbnails_ready,
             created_at=comment.created_at,
             updated_at=comment.updated_at,
             comment_data=comment.comment_data
@@ -1,13 +1,18 @@
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, Query, Response, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_active_user, get_db
 from app.models.user import User
-from app.schemas.event import Event, EventCreate, EventUpdate, EventDetail
+from app.schemas.event import Event, EventCreate, EventUpdate, EventDetail, EventSearchResult, EventUploadIntentCreate
+from app.schemas.upload_intent import UploadIntent
 from app.services import event as event_service
 from app.services import project as project_service
 from app.services import event_comment as comment_service
+from app.services import event_stats as event_stats_service
+from app.services import event_search
+from app.services import direct_upload as direct_upload_service
 from app.models.map import Map
 from app.models.event import Event as EventModel
 from app.api.v1.endpoints.monitoring import log_user_activity
@@ -18,6 +23,7 @@ router = APIRouter()
 @router.get("/", response_model=List[Event])
 def get_events(
     project_id: int,
+    response: Response,
     user_id: Optional[int] = None,
     status: Optional[List[str]] = Query(None),
     type: Optional[List[str]] = Query(None),
@@ -27,7 +33,8 @@ def get_events(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None
 ):
     """
     Get all events for a project with optional filtering.
@@ -43,6 +50,7 @@ def get_events(
     - tags: Optional list of tags to filter by
     - skip: Number of records to skip for pagination
     - limit: Maximum number of records to return
+    - cursor: Opaque cursor from the X-Next-Cursor header of the previous page (keyset pagination)
     """
     # Check if project exists and user has access
     project = project_service.get_project(db, project_id)
@@ -70,21 +78,35 @@ def get_events(
         tags_filter=tags,
         skip=skip,
         limit=limit,
-        include_closed=include_closed
+        include_closed=include_closed,
+        cursor=cursor
     )
+    
+    # Expose the cursor of the next page (absent on the last page)
+    next_cursor = event_service.get_next_event_cursor(events, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return events
 
 
 @router.get("/map/{map_id}", response_model=List[Event])
 def get_events_by_map(
     map_id: int,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    min_x: Optional[float] = None,
+    min_y: Optional[float] = None,
+    max_x: Optional[float] = None,
+    max_y: Optional[float] = None
 ):
     """
     Get all events for a specific map.
+    Pass the X-Next-Cursor header of the previous page as `cursor` to get the next page.
+    Pass min_x, min_y, max_x and max_y to only get the events inside the visible viewport.
     """
     # Get the map to check project access
     map_obj = db.query(Map).filter(Map.id == map_id).first()
@@ -97,20 +119,26 @@ def get_events_by_map(
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
     # Get events for this map
-    events = event_service.get_events_by_map(db, map_id, skip, limit)
+    bbox = event_service.get_bbox(min_x, min_y, max_x, max_y)
+    events = event_service.get_events_by_map(db, map_id, skip, limit, cursor, bbox)
+    
+    next_cursor = event_service.get_next_event_cursor(events, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return events
 
 
 @router.get("/export")
 def export_events(
     project_id: int,
-    format: str = Query("csv", regex="^(csv|xlsx)$"),
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
     user_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Export events to CSV or Excel format.
+    The file is streamed, so exports of any size use constant memory.
     """
     # Check if project exists and user has access
     project = project_service.get_project(db, project_id)
@@ -124,14 +152,38 @@ def export_events(
     # Export events
     export_data = event_service.export_events(db, project_id, format, user_id)
     
-    # Return file response
-    return Response(
-        content=export_data["content"],
+    # Stream the file response
+    return StreamingResponse(
+        export_data["content"],
         media_type=export_data["media_type"],
         headers={"Content-Disposition": f"attachment; filename={export_data['filename']}"}
     )
 
 
+@router.get("/search", response_model=List[EventSearchResult])
+def search_events(
+    project_id: int,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Full-text search over the titles, descriptions and comments of the events of a project.
+    Results are ranked, best matches first. Regular users cannot see closed events.
+    """
+    # Check if project exists and user has access
+    project = project_service.get_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    # Check if user has access to project
+    if not any(pu.user_id == current_user.id for pu in project.users):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    return event_search.search_events(db, project_id, q, current_user.is_admin, limit)
+
+
 @router.get("/{event_id}", response_model=EventDetail)
 def get_event(
     event_id: int,
@@ -141,34 +193,16 @@ def get_event(
     """
     Get an event by ID.
     """
-    # Get event
-    event_dict = event_service.get_event_with_comments_count(db, event_id)
-    if not event_dict:
+    # Event, map name, creator name and the caller's membership in one query
+    event_detail = event_service.get_event_detail(db, event_id, current_user.id)
+    if not event_detail:
         raise HTTPException(status_code=404, detail="Event not found")
     
     # Check if user has access to project
-    project = project_service.get_project(db, event_dict["project_id"])
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
-    if not current_user.is_admin and not any(pu.user_id == current_user.id for pu in project.users):
+    is_project_member = event_detail.pop("is_project_member")
+    if not current_user.is_admin and not is_project_member:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    # Get map name
-    map_obj = db.query(Map).filter(Map.id == event_dict["map_id"]).first()
-    map_name = map_obj.name if map_obj else f"Map ID: {event_dict['map_id']}"
-    
-    # Get creator username
-    creator = db.query(User).filter(User.id == event_dict["created_by_user_id"]).first()
-    creator_name = creator.username if creator else f"User ID: {event_dict['created_by_user_id']}"
-    
-    # Create EventDetail object with additional information
-    event_detail = {
-        **event_dict,
-        "map_name": map_name,
-        "created_by_user_name": creator_name,
-    }
-    
     return event_detail
 
 
@@ -245,8 +279,98 @@ async def create_event(
         )
         
         return event
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/upload-intents", response_model=UploadIntent)
+def start_event_upload_intent(
+    intent_in: EventUploadIntentCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Start creating an event whose attachment is uploaded directly to storage:
+    PUT the file to the returned upload_url (with the returned headers), then call
+    POST /upload-intents/{intent_id}/complete to create the event.
+    """
+    project = project_service.get_project(db, intent_in.project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    if not any(pu.user_id == current_user.id for pu in project.users):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    map_obj = db.query(Map).filter(Map.id == intent_in.map_id, Map.project_id == intent_in.project_id).first()
+    if not map_obj:
+        raise HTTPException(status_code=404, detail="Map not found or doesn't belong to this project")
+    
+    intent = direct_upload_service.start_intent(
+        db,
+        kind="event",
+        project_id=intent_in.project_id,
+        user_id=current_user.id,
+        filename=intent_in.filename,
+        content_type=intent_in.content_type,
+        size=intent_in.size,
+        data=intent_in.dict(exclude={"project_id", "filename", "content_type", "size"})
+    )
+    return UploadIntent(**direct_upload_service.upload_target(intent))
+
+
+@router.post("/upload-intents/{intent_id}/complete", response_model=Event)
+async def complete_event_upload_intent(
+    intent_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Create the event of a direct upload, once its attachment has been uploaded.
+    """
+    intent = direct_upload_service.get_own_intent(db, intent_id, "event", current_user)
+    
+    try:
+        event = await direct_upload_service.complete_intent(db, intent)
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    # Log user activity
+    log_user_activity(
+        user_id=current_user.id,
+        username=current_user.username,
+        action="event_create",
+        ip_address=request.client.host if request.client else "Unknown",
+        user_type="admin" if current_user.is_admin else "member",
+        details={
+            "project_id": event.project_id,
+            "map_id": event.map_id,
+            "event_id": event.id,
+            "event_title": event.title,
+            "event_status": event.status,
+            "event_state": event.state
+        }
+    )
+    
+    return event
+
+
+@router.delete("/upload-intents/{intent_id}", status_code=status.HTTP_204_NO_CONTENT)
+def cancel_event_upload_intent(
+    intent_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Cancel a direct upload and discard its attachment, if it was uploaded.
+    """
+    intent = direct_upload_service.get_own_intent(db, intent_id, "event", current_user)
+    direct_upload_service.cancel_intent(db, intent)
+    return None
 
 
 @router.put("/{event_id}", response_model=Event)
@@ -396,4 +520,54 @@ def fix_all_events_active_maps(
     if fixed_count > 0:
         db.commit()
     
-    return {"message": f"Fixed {fixed_count} events with invalid active_maps values"} 
\ No newline at end of file
+    return {"message": f"Fixed {fixed_count} events with invalid active_maps values"} 
+
+@router.post("/admin/rebuild-tags", response_model=dict)
+def rebuild_event_tags(
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Rebuild the indexed event_tags rows from the JSON tags of every event
+    (optionally of a single project). Only admin users can run this.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Only administrators can perform this operation")
+    
+    processed = event_service.rebuild_event_tags(db, project_id)
+    return {"message": f"Rebuilt tags for {processed} events"}
+
+
+@router.post("/admin/recount-comments", response_model=dict)
+def recount_event_comments(
+    event_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Repair the comment_count of every event (or of a single event) from the comments table.
+    Only admin users can run this.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Only administrators can perform this operation")
+    
+    updated = comment_service.recount_comments(db, event_id)
+    return {"message": f"Recounted comments for {updated} events"}
+
+
+@router.post("/admin/rebuild-stats", response_model=dict)
+def rebuild_event_stats(
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Recompute the materialized event statistics from the events table
+    (optionally of a single project). Only admin users can run this.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Only administrators can perform this operation")
+    
+    written = event_stats_service.rebuild_stats(db, project_id)
+    return {"message": f"Rebuilt {written} event statistics counters"}
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Query
+
+from app.core.static_files import signed_image_response
+
+router = APIRouter()
+
+
+@router.get("/{image_path:path}")
+def get_image(
+    image_path: str,
+    expires: int = Query(...),
+    signature: str = Query(...)
+):
+    """
+    Get an event or comment attachment through a signed URL
+    (the signed_image_url of an event or comment). No authentication header is needed.
+    """
+    return signed_image_response(image_path, expires, signature)
@@ -1,11 +1,13 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response, Query
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_active_user, get_db
 from app.models.user import User
-from app.schemas.event import Event
+from app.schemas.event import Event, EventClusterList, EventHeatmap
 from app.services import event as event_service
+from app.services import event_cluster
+from app.services import event_heatmap
 from app.services import project as project_service
 from app.models.map import Map
 
@@ -14,13 +16,21 @@ router = APIRouter()
 @router.get("/", response_model=List[Event])
 def get_map_events(
     map_id: int,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    min_x: Optional[float] = None,
+    min_y: Optional[float] = None,
+    max_x: Optional[float] = None,
+    max_y: Optional[float] = None
 ):
     """
     Get all events for a specific map.
+    Pass the X-Next-Cursor header of the previous page as `cursor` to get the next page.
+    Pass min_x, min_y, max_x and max_y to only get the events inside the visible viewport.
     """
     # Get the map to check project access
     map_obj = db.query(Map).filter(Map.id == map_id).first()
@@ -33,5 +43,111 @@ def get_map_events(
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
     # Get events for this map
-    events = event_service.get_events_by_map(db, map_id, skip, limit)
-    return events 
\ No newline at end of file
+    bbox = event_service.get_bbox(min_x, min_y, max_x, max_y)
+    events = event_service.get_events_by_map(db, map_id, skip, limit, cursor, bbox)
+    
+    next_cursor = event_service.get_next_event_cursor(events, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return events
+
+
+@router.get("/clusters", response_model=EventClusterList)
+def get_map_event_clusters(
+    map_id: int,
+    zoom: int = Query(0, ge=0, le=event_cluster.MAX_CLUSTER_ZOOM),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    min_x: Optional[float] = None,
+    min_y: Optional[float] = None,
+    max_x: Optional[float] = None,
+    max_y: Optional[float] = None
+):
+    """
+    Get event marker clusters for a map at a zoom level.
+    Each cluster has its centroid, total count and counts per state (red/yellow/green).
+    Pass min_x, min_y, max_x and max_y to only get the clusters inside the visible viewport.
+    Admin users also see closed events.
+    """
+    # Get the map to check project access
+    map_obj = db.query(Map).filter(Map.id == map_id).first()
+    if not map_obj:
+        raise HTTPException(status_code=404, detail="Map not found")
+    
+    # Check if user has access to the project
+    project = project_service.get_project(db, map_obj.project_id)
+    if not any(pu.user_id == current_user.id for pu in project.users):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    bbox = event_service.get_bbox(min_x, min_y, max_x, max_y)
+    clusters = event_cluster.get_clusters(
+        db,
+        map_id,
+        zoom,
+        include_closed=current_user.is_admin,
+        bbox=bbox
+    )
+    return {"map_id": map_id, "zoom": zoom, "clusters": clusters}
+
+
+def _get_map_heatmap(db: Session, map_id: int, current_user: User, zoom: int, state: Optional[str], tag: Optional[str]):
+    # Get the map to check project access
+    map_obj = db.query(Map).filter(Map.id == map_id).first()
+    if not map_obj:
+        raise HTTPException(status_code=404, detail="Map not found")
+    
+    # Check if user has access to the project
+    project = project_service.get_project(db, map_obj.project_id)
+    if not any(pu.user_id == current_user.id for pu in project.users):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    return event_heatmap.get_heatmap(
+        db,
+        map_id,
+        zoom,
+        include_closed=current_user.is_admin,
+        state=state,
+        tag=tag
+    )
+
+
+@router.get("/heatmap", response_model=EventHeatmap)
+def get_map_event_heatmap(
+    map_id: int,
+    zoom: int = Query(0, ge=0, le=event_heatmap.MAX_HEATMAP_ZOOM),
+    state: Optional[str] = Query(None, pattern="^(red|yellow|green)$"),
+    tag: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get the event density grid of a map: the number of events per cell of a
+    (16 * 2^zoom)^2 grid over the map, optionally only for a state or a tag.
+    Admin users also see closed events.
+    """
+    grid = _get_map_heatmap(db, map_id, current_user, zoom, state, tag)
+    return {"map_id": map_id, "zoom": zoom, **event_heatmap.heatmap_summary(grid)}
+
+
+@router.get("/heatmap.png")
+def get_map_event_heatmap_png(
+    map_id: int,
+    zoom: int = Query(0, ge=0, le=event_heatmap.MAX_HEATMAP_ZOOM),
+    state: Optional[str] = Query(None, pattern="^(red|yellow|green)$"),
+    tag: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get the event density of a map as a transparent PNG overlay (one pixel per grid
+    cell), to be stretched over the map image.
+    """
+    if not event_heatmap.PIL_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Heatmap images are not available on this server")
+    
+    grid = _get_map_heatmap(db, map_id, current_user, zoom, state, tag)
+    return Response(
+        content=event_heatmap.render_png(grid),
+        media_type="image/png",
+        headers={"Cache-Control": "private, max-age=60"}
+    )
@@ -2,16 +2,23 @@ from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, Query, Request
 from sqlalchemy.orm import Session
 import os
+import json
 from datetime import datetime
 
 from app.api.deps import get_current_active_user, get_db
+from app.core.config import settings
 from app.models.user import User
-from app.schemas.map import Map, MapCreate, MapUpdate
+from app.schemas.map import Map, MapCreate, MapUpdate, MapUploadCreate, MapUploadIntentCreate, MapUploadStatus, MapTiles
+from app.schemas.upload_intent import UploadIntent
 from app.services import map as map_service
+from app.services import map_upload as map_upload_service
+from app.services import direct_upload as direct_upload_service
+from app.services import map_tiles
+from app.services import storage
 from app.services import project as project_service
 from app.api.v1.endpoints.monitoring import log_user_activity
 
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, FileResponse, RedirectResponse, Response
 import traceback
 import sys
 
@@ -121,13 +128,90 @@ def get_map(
     return map_obj
 
 
+def _get_accessible_map(db: Session, map_id: int, current_user: User):
+    map_obj = map_service.get_map(db, map_id)
+    if not map_obj:
+        raise HTTPException(status_code=404, detail="Map not found")
+    
+    project = project_service.get_project(db, map_obj.project_id)
+    if not current_user.is_admin and not any(pu.user_id == current_user.id for pu in project.users):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return map_obj
+
+
+@router.get("/{map_id}/tiles", response_model=MapTiles)
+def get_map_tiles(
+    map_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get the tile pyramid of a map: levels 0..max_level of tile_size px PNG tiles,
+    level 0 being the whole sheet in a single tile. Tiles are served by
+    GET /maps/{map_id}/tiles/{z}/{x}/{y}.png or directly from url_template.
+    While the status is 'pending', the viewer should fall back to the PDF.
+    """
+    map_obj = _get_accessible_map(db, map_id, current_user)
+    
+    manifest = map_tiles.get_manifest(map_obj.filename)
+    if manifest is None:
+        # Maps uploaded before tiling existed get their tiles on first request
+        map_tiles.schedule_tiles(map_obj.filename)
+        return MapTiles(status=map_tiles.get_tiles_status(map_obj.filename))
+    
+    return MapTiles(
+        status="ready",
+        url_template=storage.get_file_url("{z}/{x}/{y}.png", map_tiles.tile_directory(map_obj.filename)),
+        **manifest
+    )
+
+
+@router.get("/{map_id}/tiles/{z}/{x}/{y}.png")
+def get_map_tile(
+    map_id: int,
+    z: int,
+    x: int,
+    y: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get one tile of the pyramid of a map.
+    """
+    map_obj = _get_accessible_map(db, map_id, current_user)
+    
+    manifest = map_tiles.get_manifest(map_obj.filename)
+    if manifest is None:
+        map_tiles.schedule_tiles(map_obj.filename)
+        raise HTTPException(status_code=404, detail="Map tiles are not ready yet")
+    if not 0 <= z <= manifest["max_level"]:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    level = manifest["levels"][z]
+    if not (0 <= x < level["columns"] and 0 <= y < level["rows"]):
+        raise HTTPException(status_code=404, detail="Tile not found")
+    
+    path = map_tiles.tile_path(map_obj.filename, z, x, y)
+    # Tiles never change for a given map file
+    headers = {"Cache-Control": "private, max-age=31536000, immutable"}
+    backend = storage.get_backend()
+    if backend.remote:
+        return RedirectResponse(backend.public_url(path), headers=headers)
+    local_path = backend.local_path(path)
+    if local_path is not None:
+        return FileResponse(local_path, media_type="image/png", headers=headers)
+    data = storage.read_stored_bytes(path)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    return Response(data, media_type="image/png", headers=headers)
+
+
 @router.post("/", response_model=Map)
 async def create_map(
     request: Request,
     project_id: int = Form(...),
     map_type: str = Form(...),
     name: str = Form(...),
-    transform_data: Optional[Dict[str, Any]] = Form(None),
+    transform_data: Optional[str] = Form(None),
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
@@ -148,6 +232,16 @@ async def create_map(
     if map_type not in ["implantation", "overlay"]:
         raise HTTPException(status_code=400, detail="Map type must be 'implantation' or 'overlay'")
     
+    # The transform data is sent as a JSON string in the form
+    transform = None
+    if transform_data:
+        try:
+            transform = json.loads(transform_data)
+        except ValueError:
+            transform = None
+        if not isinstance(transform, dict):
+            raise HTTPException(status_code=400, detail="transform_data must be a JSON object")
+    
     # Create map
     try:
         map_obj = await map_service.create_map(
@@ -156,7 +250,7 @@ async def create_map(
             map_type, 
             name, 
             file, 
-            transform_data
+            transform
         )
         
         # Log user activity
@@ -184,6 +278,237 @@ async def create_map(
         )
 
 
+def _upload_status(upload) -> MapUploadStatus:
+    return MapUploadStatus(
+        upload_id=upload.id,
+        chunk_size=upload.chunk_size,
+        total_size=upload.total_size,
+        total_chunks=map_upload_service.total_chunks(upload),
+        received_chunks=map_upload_service.get_received_chunks(upload),
+        expires_at=upload.expires_at
+    )
+
+
+def _get_own_upload(db: Session, upload_id: str, current_user: User):
+    upload = map_upload_service.get_upload(db, upload_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    if upload.user_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return upload
+
+
+@router.post("/uploads", response_model=MapUploadStatus)
+def start_map_upload(
+    upload_in: MapUploadCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Start a resumable map upload, for large files or unreliable connections.
+    Send the file in chunks of chunk_size bytes to PUT /uploads/{upload_id}/chunks/{index},
+    then call POST /uploads/{upload_id}/complete to create the map.
+    """
+    project = project_service.get_project(db, upload_in.project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    if not any(pu.user_id == current_user.id for pu in project.users):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    if upload_in.map_type not in ["implantation", "overlay"]:
+        raise HTTPException(status_code=400, detail="Map type must be 'implantation' or 'overlay'")
+    
+    upload = map_upload_service.start_upload(
+        db,
+        project_id=upload_in.project_id,
+        user_id=current_user.id,
+        map_type=upload_in.map_type,
+        name=upload_in.name,
+        filename=upload_in.filename,
+        total_size=upload_in.total_size,
+        transform_data=upload_in.transform_data,
+        sha256=upload_in.sha256
+    )
+    return _upload_status(upload)
+
+
+@router.get("/uploads/{upload_id}", response_model=MapUploadStatus)
+def get_map_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get the state of a resumable upload; after a dropped connection, only the chunks
+    missing from received_chunks need to be sent again.
+    """
+    upload = _get_own_upload(db, upload_id, current_user)
+    return _upload_status(upload)
+
+
+@router.put("/uploads/{upload_id}/chunks/{index}", status_code=status.HTTP_204_NO_CONTENT)
+async def upload_map_chunk(
+    upload_id: str,
+    index: int,
+    chunk: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Upload chunk number `index` (0-based) of a resumable upload. Sending a chunk again replaces it.
+    """
+    upload = _get_own_upload(db, upload_id, current_user)
+    await map_upload_service.save_chunk(upload, index, chunk)
+    return None
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=Map)
+async def complete_map_upload(
+    upload_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Assemble the chunks of a resumable upload and create the map.
+    """
+    upload = _get_own_upload(db, upload_id, current_user)
+    
+    try:
+        map_obj = await map_upload_service.complete_upload(db, upload)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to create map: {str(e)}"
+        )
+    
+    # Log user activity
+    log_user_activity(
+        user_id=current_user.id,
+        username=current_user.username,
+        action="map_upload",
+        ip_address=request.client.host if request.client else "Unknown",
+        user_type="admin" if current_user.is_admin else "member",
+        details={
+            "project_id": map_obj.project_id,
+            "map_id": map_obj.id,
+            "map_name": map_obj.name,
+            "map_type": map_obj.map_type
+        }
+    )
+    
+    return map_obj
+
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+def cancel_map_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Cancel a resumable upload and discard its chunks.
+    """
+    upload = _get_own_upload(db, upload_id, current_user)
+    map_upload_service.cancel_upload(db, upload)
+    return None
+
+
+@router.post("/upload-intents", response_model=UploadIntent)
+def start_map_upload_intent(
+    intent_in: MapUploadIntentCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Start a direct upload: PUT the file to the returned upload_url (with the returned
+    headers), then call POST /upload-intents/{intent_id}/complete to create the map.
+    The file goes straight to storage instead of through the API.
+    """
+    project = project_service.get_project(db, intent_in.project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    if not any(pu.user_id == current_user.id for pu in project.users):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    if intent_in.map_type not in ["implantation", "overlay"]:
+        raise HTTPException(status_code=400, detail="Map type must be 'implantation' or 'overlay'")
+    
+    intent = direct_upload_service.start_intent(
+        db,
+        kind="map",
+        project_id=intent_in.project_id,
+        user_id=current_user.id,
+        filename=intent_in.filename,
+        content_type="application/pdf",
+        size=intent_in.size,
+        data={
+            "map_type": intent_in.map_type,
+            "name": intent_in.name,
+            "transform_data": intent_in.transform_data
+        }
+    )
+    return UploadIntent(**direct_upload_service.upload_target(intent))
+
+
+@router.post("/upload-intents/{intent_id}/complete", response_model=Map)
+async def complete_map_upload_intent(
+    intent_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Create the map of a direct upload, once its file has been uploaded.
+    """
+    intent = direct_upload_service.get_own_intent(db, intent_id, "map", current_user)
+    
+    try:
+        map_obj = await direct_upload_service.complete_intent(db, intent)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to create map: {str(e)}"
+        )
+    
+    # Log user activity
+    log_user_activity(
+        user_id=current_user.id,
+        username=current_user.username,
+        action="map_upload",
+        ip_address=request.client.host if request.client else "Unknown",
+        user_type="admin" if current_user.is_admin else "member",
+        details={
+            "project_id": map_obj.project_id,
+            "map_id": map_obj.id,
+            "map_name": map_obj.name,
+            "map_type": map_obj.map_type
+        }
+    )
+    
+    return map_obj
+
+
+@router.delete("/upload-intents/{intent_id}", status_code=status.HTTP_204_NO_CONTENT)
+def cancel_map_upload_intent(
+    intent_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Cancel a direct upload and discard its file, if it was uploaded.
+    """
+    intent = direct_upload_service.get_own_intent(db, intent_id, "map", current_user)
+    direct_upload_service.cancel_intent(db, intent)
+    return None
+
+
 @router.put("/{map_id}", response_model=Map)
 def update_map(
     map_id: int,
@@ -379,7 +704,8 @@ def check_mixed_content(
         
         # Check storage service configuration
         storage_info = {
-            "cloud_storage_enabled": os.getenv("USE_CLOUD_STORAGE", "false").lower() == "true",
+            "storage_backend": storage.get_backend().name,
+            "cloud_storage_enabled": storage.get_backend().remote,
             "storage_bucket": os.getenv("CLOUD_STORAGE_BUCKET", "servitec-map-storage"),
             "in_cloud_run": os.getenv("K_SERVICE") is not None
         }
@@ -194,6 +194,20 @@ def get_system_metrics(current_user: User = Depends(get_current_user)):
             detail=f"Failed to get system metrics: {str(e)}"
         )
 
+@router.get("/metrics/storage-cache")
+def get_storage_cache_metrics(current_user: User = Depends(get_current_user)):
+    """Get the hit/miss counters of the local disk cache of cloud storage objects"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin users can access system metrics"
+        )
+    
+    from app.services import storage
+    if not storage.uses_blob_cache():
+        return {"enabled": False}
+    return {"enabled": True, **storage.get_blob_cache().stats()}
+
 @router.get("/user-activity", response_model=UserActivityList)
 def get_user_activity(
     user_id: Optional[int] = None,
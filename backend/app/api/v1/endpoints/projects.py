@@ -1,14 +1,20 @@
 from typing import List, Optional, Any, Dict
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_active_user, get_db
 from app.models.user import User
 from app.models.project import ProjectUser
 from app.models.event import Event
-from app.schemas.project import Project, ProjectCreate, ProjectUpdate, ProjectDetail, ProjectUserCreate, ProjectUserUpdate, ProjectUserAdd
+from app.schemas.project import Project, ProjectCreate, ProjectUpdate, ProjectDetail, ProjectUserCreate, ProjectUserUpdate, ProjectUserAdd, ProjectStats, TagCount, ProjectTimeline
 from app.schemas.user import User as UserSchema
+from app.schemas.event import EventChangeFeed
 from app.services import project as project_service
+from app.services import event_stats as event_stats_service
+from app.services import tag_dictionary
+from app.services import event_changes
+from app.services import event_timeline
 
 router = APIRouter()
 
@@ -326,6 +332,78 @@ def get_project_members(
     return members
 
 
+@router.get("/{project_id}/stats", response_model=ProjectStats)
+def get_project_stats(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get event counts of a project by status, state, tag and creator, overall and per map.
+    Served from the materialized event_stats table, so it does not scan the events.
+    """
+    # Check if project exists
+    project = project_service.get_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    # Check if user has access to project or is an admin
+    if not current_user.is_admin and not any(pu.user_id == current_user.id for pu in project.users):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    return event_stats_service.get_project_stats(db, project_id)
+
+
+@router.get("/{project_id}/changes", response_model=EventChangeFeed)
+def get_project_changes(
+    project_id: int,
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get the events of a project created, updated, closed or deleted after the since token.
+    Deleted events (and, for regular users, closed events) are returned as tombstones.
+    Poll again with next_token as since to only receive newer changes.
+    """
+    # Check if project exists
+    project = project_service.get_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    # Check if user has access to project or is an admin
+    if not current_user.is_admin and not any(pu.user_id == current_user.id for pu in project.users):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    return event_changes.get_changes(db, project_id, since, limit, current_user.is_admin)
+
+
+@router.get("/{project_id}/timeline", response_model=ProjectTimeline)
+def get_project_timeline(
+    project_id: int,
+    interval: str = Query("day", pattern="^(day|week)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get the number of events created and closed per day or week, by state and tag,
+    between start_date and end_date (defaults to the last 30 days).
+    """
+    # Check if project exists
+    project = project_service.get_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    # Check if user has access to project or is an admin
+    if not current_user.is_admin and not any(pu.user_id == current_user.id for pu in project.users):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    return event_timeline.get_timeline(db, project_id, interval, start_date, end_date)
+
+
 @router.put("/{project_id}/members/{user_id}/role", status_code=status.HTTP_200_OK)
 def update_member_role(
     project_id: int,
@@ -393,11 +471,14 @@ def update_member_field(
 @router.get("/{project_id}/tags", response_model=List[str])
 def get_project_tags(
     project_id: int,
+    prefix: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    Get all unique tags used in events for a specific project.
+    Get all unique tags used in events for a specific project, sorted alphabetically.
+    Optionally only the tags starting with prefix (for autocomplete).
     """
     # Check if project exists
     project = project_service.get_project(db, project_id)
@@ -408,19 +489,31 @@ def get_project_tags(
     if not current_user.is_admin and not any(pu.user_id == current_user.id for pu in project.users):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    # Get all events for the project
-    events = db.query(Event).filter(Event.project_id == project_id).all()
-    
-    # Extract all tags from events
-    all_tags = []
-    for event in events:
-        if event.tags and isinstance(event.tags, list):
-            all_tags.extend(event.tags)
-    
-    # Return unique tags (sort alphabetically for better UX)
-    unique_tags = sorted(list(set(all_tags)))
+    # Served from the cached tag dictionary of the project
+    return [tag for tag, _ in tag_dictionary.get_tags(db, project_id, prefix, limit)]
+
+
+@router.get("/{project_id}/tags/counts", response_model=List[TagCount])
+def get_project_tag_counts(
+    project_id: int,
+    prefix: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get the tags of a project with the number of events using each of them.
+    """
+    # Check if project exists
+    project = project_service.get_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
     
-    # Log the response for debugging
-    print(f"Returning {len(unique_tags)} unique tags for project {project_id}")
+    # Check if user has access to project or is an admin
+    if not current_user.is_admin and not any(pu.user_id == current_user.id for pu in project.users):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    return unique_tags 
\ No newline at end of file
+    return [
+        {"tag": tag, "count": count}
+        for tag, count in tag_dictionary.get_tags(db, project_id, prefix, limit)
+    ]
@@ -3,6 +3,7 @@ from typing import Optional, Dict, Any, List, Union
 import os
 import json
 import secrets
+import tempfile
 import logging
 import pathlib
 from pydantic import validator, AnyHttpUrl
@@ -121,9 +122,31 @@ class Settings(BaseSettings):
     # Security
     SECRET_KEY: str = get_or_create_secret_key()
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", str(60 * 24 * 7)))  # 7 days default
+    SIGNED_URL_EXPIRE_MINUTES: int = int(os.getenv("SIGNED_URL_EXPIRE_MINUTES", "60"))  # attachment links
     
     # File Storage
     UPLOAD_FOLDER: str = os.getenv("UPLOAD_FOLDER", "./uploads")
+    # 'local', 'gcs' or 'memory'; by default gcs in Cloud Run or with USE_CLOUD_STORAGE=true, local otherwise
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "")
+    STORAGE_IO_WORKERS: int = int(os.getenv("STORAGE_IO_WORKERS", "8"))  # concurrent blocking storage calls
+    
+    # Resumable (chunked) map uploads
+    MAP_UPLOAD_CHUNK_SIZE: int = int(os.getenv("MAP_UPLOAD_CHUNK_SIZE", str(5 * 1024 * 1024)))  # 5MB
+    MAX_RESUMABLE_MAP_SIZE: int = int(os.getenv("MAX_RESUMABLE_MAP_SIZE", str(200 * 1024 * 1024)))  # 200MB
+    MAP_UPLOAD_EXPIRE_HOURS: int = int(os.getenv("MAP_UPLOAD_EXPIRE_HOURS", "24"))
+    
+    # Direct uploads: lifetime of the signed upload URL and of the pending upload
+    DIRECT_UPLOAD_EXPIRE_MINUTES: int = int(os.getenv("DIRECT_UPLOAD_EXPIRE_MINUTES", "60"))
+    
+    # Background side effects (history, notifications, emails, thumbnails)
+    SIDE_EFFECT_WORKERS: int = int(os.getenv("SIDE_EFFECT_WORKERS", "2"))
+    
+    # Map tile pyramid generation
+    TILE_WORKERS: int = int(os.getenv("TILE_WORKERS", "1"))
+    
+    # Local disk cache of cloud storage objects processed on the server
+    BLOB_CACHE_DIR: str = os.getenv("BLOB_CACHE_DIR", os.path.join(tempfile.gettempdir(), "blob_cache"))
+    BLOB_CACHE_MAX_BYTES: int = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))  # 1GB
     
     # CORS
     CORS_ORIGINS: List[AnyHttpUrl] = []
@@ -1,5 +1,10 @@
+import hmac
+import time
+import base64
+import hashlib
 from datetime import datetime, timedelta
 from typing import Any, Union, Optional
+from urllib.parse import urlencode
 
 from jose import jwt
 from passlib.context import CryptContext
@@ -37,4 +42,33 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password) 
\ No newline at end of file
+    return pwd_context.hash(password)
+
+
+def _url_signature(path: str, expires: int) -> str:
+    # Separate key from the one signing JWTs, so a URL signature can never pass as a token and vice versa
+    key = hashlib.sha256(f"signed-url:{settings.SECRET_KEY}".encode("utf-8")).digest()
+    digest = hmac.new(key, f"{path}\n{expires}".encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def create_signed_url(path: str, expires_delta: Optional[timedelta] = None) -> str:
+    """
+    Append an expiry time and an HMAC signature to a URL path, so the file it points
+    to can be served without looking up the user.
+
+    The expiry is rounded up to a multiple of the lifetime: URLs signed within the same
+    window are identical, so browsers can cache the files they point to.
+    """
+    lifetime = int((expires_delta or timedelta(minutes=settings.SIGNED_URL_EXPIRE_MINUTES)).total_seconds())
+    lifetime = max(lifetime, 1)
+    expires = (int(time.time()) // lifetime + 2) * lifetime
+    query = urlencode({"expires": expires, "signature": _url_signature(path, expires)})
+    return f"{path}?{query}"
+
+
+def verify_signed_url(path: str, expires: int, signature: str) -> bool:
+    """Check the signature of a URL created with create_signed_url and that it has not expired"""
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(_url_signature(path, expires), signature)
@@ -0,0 +1,194 @@
+"""
+Static file serving for uploaded files.
+
+Uploaded files never change once written: map files and event and comment
+attachments are content-addressed (named after the SHA-256 of their content), their
+thumbnails are named after the original, and map tiles and tile manifests live
+under the content-addressed map name and the tile layout (see services/map_tiles.py).
+A path therefore always refers to the same content, so files are served with a
+long-lived immutable Cache-Control, an ETag (strong, the content
+digest, for content-addressed files; weak, from size and mtime, for the others so
+that no file is hashed while serving it) and support for single byte-range
+requests, so that browsers and proxies can cache them indefinitely and PDF
+viewers can fetch the pages they need.
+
+Event and comment attachments can also be fetched through the image route with a
+signed, expiring URL (see signed_image_url): the signature is checked without any
+database work, so a page showing many photos costs no query per image.
+"""
+import os
+import re
+import time
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+from starlette.types import Scope, Receive, Send
+
+from app.core.config import settings
+from app.core.security import create_signed_url, verify_signed_url
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+RANGE_CHUNK_SIZE = 64 * 1024
+IMAGE_ROUTE = "/api/v1/image"
+
+# <sha256> (maps) or img_<sha256> / pdf_<sha256> (attachments)
+_SHA256_NAME = re.compile(r"^(?:[a-z]+_)?([0-9a-f]{64})$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def content_etag(full_path: str, stat_result: os.stat_result) -> str:
+    """
+    ETag of a file: strong, the SHA-256 of its content, when the file is named after
+    it; otherwise weak, from its size and modification time (nothing is read)
+    """
+    match = _SHA256_NAME.match(os.path.splitext(os.path.basename(full_path))[0])
+    if match:
+        return f'"{match.group(1)}"'
+    return f'W/"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single 'bytes=start-end' range into inclusive offsets.
+    Returns None when the header should be ignored (malformed or multiple ranges)
+    and raises ValueError when the range cannot be satisfied.
+    """
+    match = _RANGE.match(range_header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    start, end = match.group(1), match.group(2)
+    if start and end and int(end) < int(start):
+        # Syntactically invalid (RFC 7233 2.1): ignored
+        return None
+    if size == 0:
+        # No byte range of an empty file can be satisfied
+        raise ValueError("Empty file")
+    if start == "":
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+
+class RangeFileResponse(FileResponse):
+    """206 response with one byte range of a file"""
+
+    def __init__(self, path: str, stat_result: os.stat_result, start: int, end: int, headers: dict, method: str):
+        super().__init__(path, status_code=206, headers=headers, stat_result=stat_result, method=method)
+        self.start = start
+        self.end = end
+        self.headers["content-length"] = str(end - start + 1)
+        self.headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            remaining = self.end - self.start + 1
+            while remaining > 0:
+                chunk = await file.read(min(RANGE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # File shorter than its stat said: terminate the body anyway
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class UploadStaticFiles(StaticFiles):
+    """StaticFiles for uploaded (immutable) files, with content ETags and Range support"""
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        if status_code != 200:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        method = scope["method"]
+        request_headers = Headers(scope=scope)
+        etag = content_etag(full_path, stat_result)
+        headers = {
+            "etag": etag,
+            "cache-control": IMMUTABLE_CACHE_CONTROL,
+            "accept-ranges": "bytes",
+        }
+
+        response = FileResponse(full_path, stat_result=stat_result, method=method, headers=headers)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        # A Range with a stale (or weak, which If-Range cannot use) validator gets the whole file
+        if range_header and (if_range is None or (if_range == etag and not etag.startswith("W/"))):
+            try:
+                byte_range = parse_range(range_header, stat_result.st_size)
+            except ValueError:
+                return Response(
+                    status_code=416,
+                    headers={"content-range": f"bytes */{stat_result.st_size}", **headers}
+                )
+            if byte_range is not None:
+                return RangeFileResponse(full_path, stat_result, byte_range[0], byte_range[1], headers, method)
+        return response
+
+    def is_not_modified(self, response_headers: Headers, request_headers: Headers) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            # Weak comparison over a list of validators, as required for If-None-Match
+            etag = response_headers.get("etag", "").removeprefix("W/")
+            candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+            return "*" in candidates or etag in candidates
+        return super().is_not_modified(response_headers, request_headers)
+
+
+def image_file_path(image_path: str) -> Optional[str]:
+    """
+    Local file behind an image route path: '<name>' for event attachments and
+    'comments/<name>' for comment attachments. None for any other path.
+    """
+    directory, _, name = image_path.rpartition("/")
+    if directory not in ("", "comments") or name in ("", ".", ".."):
+        return None
+    return os.path.join(settings.UPLOAD_FOLDER, directory or "events", name)
+
+
+def signed_image_url(image_url: Optional[str]) -> Optional[str]:
+    """
+    Signed, expiring image route URL of a locally stored attachment.
+    None for Cloud Storage attachments: they are public objects, fetched from their
+    image_url without any header, and signing each one would cost an IAM call.
+    """
+    if not image_url:
+        return None
+    if image_url.startswith("/events/"):
+        image_path = image_url[len("/events/"):]
+    elif image_url.startswith("/comments/"):
+        image_path = "comments/" + image_url[len("/comments/"):]
+    else:
+        return None
+    return create_signed_url(f"{IMAGE_ROUTE}/{image_path}")
+
+
+def signed_image_response(image_path: str, expires: int, signature: str) -> FileResponse:
+    """Serve an attachment requested with a signed URL, without looking up the user"""
+    if not verify_signed_url(f"{IMAGE_ROUTE}/{image_path}", expires, signature):
+        raise HTTPException(status_code=403, detail="Invalid or expired image URL")
+    file_path = image_file_path(image_path)
+    if file_path is None or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="Image not found")
+    # Cacheable by the browser until the URL expires
+    max_age = max(int(expires - time.time()), 0)
+    return FileResponse(file_path, headers={"cache-control": f"private, max-age={max_age}"})
@@ -0,0 +1,34 @@
+"""
+Names and URLs of the thumbnails of image attachments.
+
+A thumbnail is stored next to its original and named after it, e.g.
+img_<uuid>.jpeg -> img_<uuid>_small.jpg, so its URL can be derived from the
+attachment URL. Generation itself lives in services/thumbnails.py.
+"""
+import os
+from typing import Dict, Optional
+
+# Name -> bounding box (longest side in pixels), largest first
+THUMBNAIL_SIZES = {
+    "medium": 800,
+    "small": 240,
+}
+NON_IMAGE_EXTENSIONS = (".pdf",)
+
+
+def thumbnail_filename(filename: str, size: str) -> str:
+    """Name of the thumbnail of a stored file, e.g. img_1.png -> img_1_small.jpg"""
+    stem, _ = os.path.splitext(filename)
+    return f"{stem}_{size}.jpg"
+
+
+def thumbnail_urls(image_url: Optional[str]) -> Optional[Dict[str, str]]:
+    """URLs of the thumbnails of an image attachment (None for missing or non-image attachments)"""
+    if not image_url:
+        return None
+    path = image_url.split("?", 1)[0]
+    if path.lower().endswith(NON_IMAGE_EXTENSIONS):
+        return None
+    base, _, filename = path.rpartition("/")
+    prefix = f"{base}/" if base or path.startswith("/") else ""
+    return {size: f"{prefix}{thumbnail_filename(filename, size)}" for size in THUMBNAIL_SIZES}
@@ -1,12 +1,11 @@
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import os
 import sys
 import traceback
 import logging
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy import text
 from fastapi.responses import JSONResponse
 from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
@@ -14,6 +13,8 @@ from fastapi import Request
 
 from app.api.v1.api import api_router
 from app.db.database import get_db
+from app.core.config import settings
+from app.core.static_files import UploadStaticFiles
 # Import the db_monitoring module to activate SQLAlchemy event listeners
 import app.core.db_monitoring
 
@@ -101,7 +102,7 @@ try:
         allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],  # Explicit methods
         allow_headers=["*"],  # Allow all headers
         expose_headers=["Content-Length", "Content-Range", "Content-Type", "Content-Disposition",
-                        "X-Total-Count", "Access-Control-Allow-Origin"],
+                        "X-Total-Count", "X-Next-Cursor", "Access-Control-Allow-Origin"],
         max_age=600,  # Cache preflight requests for 10 minutes
     )
 
@@ -149,6 +150,16 @@ try:
                 }
             )
 
+    def _side_effect_session_factory():
+        """Session factory bound to the database of the get_db dependency"""
+        provider = app.dependency_overrides.get(get_db, get_db)
+        sessions = provider()
+        try:
+            bind = next(sessions).get_bind()
+        finally:
+            sessions.close()
+        return sessionmaker(autocommit=False, autoflush=False, bind=bind)
+
     # Test database connection before initializing API routes
     @app.on_event("startup")
     async def startup_db_client():
@@ -183,6 +194,14 @@ try:
                         logger.info(f"Admin user exists: {admin_exists > 0}")
                 except Exception as table_error:
                     logger.error(f"Error checking database tables: {str(table_error)}")
+                
+                # Local SQLite databases keep their full-text search index in FTS5 tables
+                try:
+                    from app.db.database import engine
+                    from app.services.event_search import ensure_search_index
+                    ensure_search_index(engine)
+                except Exception as search_error:
+                    logger.error(f"Error setting up the search index: {str(search_error)}")
             else:
                 logger.error("Database connection test returned unexpected result")
         except Exception as e:
@@ -190,12 +209,22 @@ try:
             logger.error(traceback.format_exc())
         finally:
             db.close()
+        
+        # Start the workers that run queued side effects (notification emails, file deletions),
+        # on the same database as the requests (get_db may be overridden, e.g. in tests)
+        from app.services import side_effects
+        side_effects.start_workers(settings.SIDE_EFFECT_WORKERS, _side_effect_session_factory())
+
+    @app.on_event("shutdown")
+    async def stop_side_effect_workers():
+        from app.services import side_effects
+        side_effects.stop_workers()
 
     # Include API router
     app.include_router(api_router, prefix="/api/v1")
 
-    # Mount uploads directory for static files
-    uploads_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads")
+    # Mount uploads directory for static files (the folder the local storage backend writes to)
+    uploads_dir = os.path.abspath(settings.UPLOAD_FOLDER)
     try:
         if not os.path.exists(uploads_dir):
             os.makedirs(uploads_dir)
@@ -207,7 +236,7 @@ try:
     
     # Only mount if the directory exists
     if os.path.exists(uploads_dir):
-        app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+        app.mount("/uploads", UploadStaticFiles(directory=uploads_dir), name="uploads")
     else:
         logger.warning("Uploads directory does not exist. Static file mounting for uploads skipped.")
 
@@ -235,12 +264,12 @@ try:
 
     # Only mount directories that exist
     if os.path.exists(events_dir):
-        app.mount("/events", StaticFiles(directory=events_dir), name="events")
+        app.mount("/events", UploadStaticFiles(directory=events_dir), name="events")
     else:
         logger.warning("Events directory does not exist. Static file mounting for events skipped.")
         
     if os.path.exists(comments_dir):
-        app.mount("/comments", StaticFiles(directory=comments_dir), name="comments")
+        app.mount("/comments", UploadStaticFiles(directory=comments_dir), name="comments")
     else:
         logger.warning("Comments directory does not exist. Static file mounting for comments skipped.")
 
@@ -276,7 +305,7 @@ try:
             headers["Access-Control-Allow-Credentials"] = "true"
             headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS, PATCH"
             headers["Access-Control-Allow-Headers"] = "*"
-            headers["Access-Control-Expose-Headers"] = "Content-Length, Content-Range, Content-Type, Content-Disposition, X-Total-Count"
+            headers["Access-Control-Expose-Headers"] = "Content-Length, Content-Range, Content-Type, Content-Disposition, X-Total-Count, X-Next-Cursor"
             headers["Access-Control-Max-Age"] = "600"  # Cache preflight for 10 minutes
         
         # Always set Vary: Origin
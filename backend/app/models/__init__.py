@@ -3,6 +3,13 @@ from app.models.project import Project, ProjectUser
 from app.models.map import Map
 from app.models.event import Event
 from app.models.event_comment import EventComment
+from app.models.event_tag import EventTag
+from app.models.event_stats import EventStats
+from app.models.event_change import EventChange
+from app.models.side_effect_job import SideEffectJob
+from app.models.stored_file import StoredFile
+from app.models.map_upload import MapUpload
+from app.models.upload_intent import UploadIntent
 from app.models.notification import Notification
 from app.models.user_activity import UserActivity
 from app.models.event_history import EventHistory
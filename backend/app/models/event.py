@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, JSON
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, JSON, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.ext.hybrid import hybrid_property
@@ -9,6 +9,19 @@ from app.db.database import Base
 
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        # Keyset pagination indexes: list queries order by (created_at, id) desc
+        Index("ix_events_project_created_id", "project_id", "created_at", "id"),
+        Index("ix_events_map_created_id", "map_id", "created_at", "id"),
+        # Viewport (bounding box) queries on a map
+        Index("ix_events_map_xy", "map_id", "x_coordinate", "y_coordinate"),
+        # Full-text search over title and description (see services/event_search.py)
+        Index(
+            "ix_events_search",
+            text("to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))"),
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
@@ -18,12 +31,14 @@ class Event(Base):
     description = Column(String, nullable=True)
     image_url = Column(String, nullable=True)  # Renamed to attachment_url for backward compatibility
     file_type = Column(String, nullable=True)  # 'image' or 'pdf'
+    thumbnails_ready = Column(Boolean, nullable=False, default=False, server_default="false")  # Set by services/thumbnails.py
     status = Column(String, default="open", nullable=False)
     state = Column(String, default="green", nullable=False)  # Values: red, yellow, green
     _active_maps = Column(JSON, nullable=True, name="active_maps")  # JSON data of active map layers when event was created
     tags = Column(JSON, nullable=True)  # JSON field for storing tags or mentions
     x_coordinate = Column(Float, nullable=False)
     y_coordinate = Column(Float, nullable=False)
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")  # Maintained by the comment service
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -49,4 +64,5 @@ class Event(Base):
     created_by_user = relationship("User", back_populates="events")
     comments = relationship("EventComment", back_populates="event", cascade="all, delete-orphan")
     notifications = relationship("Notification", back_populates="event")
-    history = relationship("EventHistory", back_populates="event", cascade="all, delete-orphan") 
\ No newline at end of file
+    history = relationship("EventHistory", back_populates="event", cascade="all, delete-orphan")
+    tag_entries = relationship("EventTag", back_populates="event", cascade="all, delete-orphan") 
\ No newline at end of file
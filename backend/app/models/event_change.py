@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
+from sqlalchemy.sql import func
+
+from app.db.database import Base
+
+
+class EventChange(Base):
+    """
+    Append-only log of event writes, used as the changes feed of a project.
+    The id is the monotonic sequence token clients poll with; within a project ids
+    are assigned in commit order (see event_changes.record_change). event_id is not a
+    foreign key so that deletions remain in the log as tombstones.
+    """
+    __tablename__ = "event_changes"
+    __table_args__ = (
+        Index("ix_event_changes_project_id", "project_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    map_id = Column(Integer, nullable=False)
+    event_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)  # 'upsert' or 'delete'
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
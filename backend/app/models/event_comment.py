@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, JSON, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -7,12 +7,21 @@ from app.db.database import Base
 
 class EventComment(Base):
     __tablename__ = "event_comments"
+    __table_args__ = (
+        # Full-text search over comment content (see services/event_search.py)
+        Index(
+            "ix_event_comments_search",
+            text("to_tsvector('simple', coalesce(content, ''))"),
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     content = Column(String, nullable=False)
     image_url = Column(String, nullable=True)
+    thumbnails_ready = Column(Boolean, nullable=False, default=False, server_default="false")  # Set by services/thumbnails.py
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     comment_data = Column(JSON, nullable=True)  # For any additional metadata
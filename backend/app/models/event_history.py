@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -7,6 +7,10 @@ from app.db.database import Base
 
 class EventHistory(Base):
     __tablename__ = "event_history"
+    __table_args__ = (
+        # Closure timeline: status changes to 'closed' within a date range
+        Index("ix_event_history_action_value_created", "action_type", "new_value", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, ForeignKey
+
+from app.db.database import Base
+
+
+class EventStats(Base):
+    """
+    Materialized event counters per project and map.
+    One row per (dimension, value), e.g. ("status", "open") or ("tag", "pipe"),
+    kept up to date by the event service in the same transaction as event writes.
+    """
+    __tablename__ = "event_stats"
+
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    map_id = Column(Integer, ForeignKey("maps.id", ondelete="CASCADE"), primary_key=True)
+    dimension = Column(String, primary_key=True)  # 'status', 'state', 'tag' or 'creator'
+    value = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
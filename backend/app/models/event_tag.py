@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
+from sqlalchemy.orm import relationship
+
+from app.db.database import Base
+
+
+class EventTag(Base):
+    """
+    Normalized (lowercased) tag of an event, mirrored from the JSON Event.tags column for indexed lookups.
+    The label is the tag as written on the event, for display.
+    """
+    __tablename__ = "event_tags"
+    __table_args__ = (
+        Index("ix_event_tags_project_tag", "project_id", "tag"),
+    )
+
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), primary_key=True)
+    tag = Column(String, primary_key=True)
+    label = Column(String, nullable=False)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+
+    # Relationships
+    event = relationship("Event", back_populates="tag_entries")
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON
+from datetime import datetime
+
+from app.db.database import Base
+
+
+class MapUpload(Base):
+    """
+    A resumable map upload in progress. The file is sent in numbered chunks that are
+    stored as they arrive (see services/map_upload.py); the map is created when the
+    upload is completed and the row is then deleted.
+    """
+    __tablename__ = "map_uploads"
+
+    id = Column(String(36), primary_key=True)  # uuid4, used in the chunk storage path
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    map_type = Column(String, nullable=False)
+    name = Column(String, nullable=False)
+    transform_data = Column(JSON, nullable=True)
+    filename = Column(String, nullable=False)
+    total_size = Column(Integer, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=True)  # optional checksum of the whole file
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
@@ -14,6 +14,8 @@ class Notification(Base):
     notification_type = Column(String, nullable=False)  # 'event_interaction', 'comment', 'mention', etc.
     read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Set when the email copy is sent, so a retried job never sends it twice
+    email_sent_at = Column(DateTime, nullable=True)
     
     # Source references
     event_id = Column(Integer, ForeignKey("events.id"), nullable=True)
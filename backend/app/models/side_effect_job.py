@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, Index
+from datetime import datetime
+
+from app.db.database import Base
+
+
+class SideEffectJob(Base):
+    """
+    A queued side effect of a committed write (history, notifications, emails).
+    Jobs are inserted in the same transaction as the write that causes them and
+    run afterwards by the side effect workers (see services/side_effects.py).
+    """
+    __tablename__ = "side_effect_jobs"
+    __table_args__ = (
+        Index("ix_side_effect_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # 'pending', 'running' or 'failed'
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
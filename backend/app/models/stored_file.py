@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+
+from app.db.database import Base
+
+
+class StoredFile(Base):
+    """
+    A content-addressed file in storage, named after the SHA-256 digest of its content
+    (e.g. 'maps/<sha256>.pdf', 'events/img_<sha256>.jpeg'). ref_count is the number of records that use it; the file
+    is deleted once it drops to zero (see services/storage.py).
+    """
+    __tablename__ = "stored_files"
+
+    path = Column(String, primary_key=True)
+    sha256 = Column(String(64), nullable=False)
+    size = Column(Integer, nullable=False)
+    content_type = Column(String, nullable=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON
+from datetime import datetime
+
+from app.db.database import Base
+
+
+class UploadIntent(Base):
+    """
+    A file that the client uploads straight to storage with a signed URL, instead of
+    through the API (see services/direct_upload.py). The row keeps what is needed to
+    create the map or event once the client reports the upload as complete.
+    """
+    __tablename__ = "upload_intents"
+
+    id = Column(String(36), primary_key=True)  # uuid4
+    kind = Column(String, nullable=False)  # 'map' or 'event'
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    object_path = Column(String, nullable=False)  # where the client uploads, within the uploads folder or bucket
+    filename = Column(String, nullable=False)  # original file name
+    content_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)  # announced size in bytes, checked on completion
+    data = Column(JSON, nullable=True)  # fields of the map or event to create
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
@@ -1,7 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, computed_field
 from typing import Optional, List, Any, Dict
 from datetime import datetime
 
+from app.core import static_files
+from app.core import thumbnail_naming
+
 
 class EventBase(BaseModel):
     project_id: int
@@ -20,6 +23,13 @@ class EventCreate(EventBase):
     pass
 
 
+class EventUploadIntentCreate(EventBase):
+    # Attachment uploaded directly to storage
+    filename: str
+    content_type: str
+    size: int  # bytes
+
+
 class EventUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -33,8 +43,22 @@ class Event(EventBase):
     id: int
     created_by_user_id: int
     image_url: Optional[str] = None
+    thumbnails_ready: bool = False
     created_at: datetime
     updated_at: Optional[datetime] = None
+    comment_count: Optional[int] = 0
+    
+    @computed_field
+    def thumbnail_urls(self) -> Optional[Dict[str, str]]:
+        # Stored next to the attachment, named after it; None until they are generated
+        if not self.thumbnails_ready:
+            return None
+        return thumbnail_naming.thumbnail_urls(self.image_url)
+    
+    @computed_field
+    def signed_image_url(self) -> Optional[str]:
+        # Expiring link that is served without a database lookup
+        return static_files.signed_image_url(self.image_url)
     
     class Config:
         orm_mode = True
@@ -42,4 +66,58 @@ class Event(EventBase):
 
 class EventDetail(Event):
     created_by_user_name: str
-    comment_count: Optional[int] = 0 
\ No newline at end of file
+
+
+class EventCluster(BaseModel):
+    x: float
+    y: float
+    count: int
+    red: int = 0
+    yellow: int = 0
+    green: int = 0
+    cell_min_x: float
+    cell_min_y: float
+    cell_size: float
+
+
+class EventClusterList(BaseModel):
+    map_id: int
+    zoom: int
+    clusters: List[EventCluster]
+
+
+class EventSearchResult(BaseModel):
+    id: int
+    project_id: int
+    map_id: int
+    title: str
+    description: Optional[str] = None
+    status: str
+    state: str
+    tags: List[str] = []
+    created_by_user_name: Optional[str] = None
+    created_at: Optional[datetime] = None
+    rank: float
+
+
+class EventChange(BaseModel):
+    sequence: int
+    event_id: int
+    map_id: int
+    action: str  # 'upsert' or 'delete'
+    event: Optional[EventDetail] = None
+
+
+class EventChangeFeed(BaseModel):
+    changes: List[EventChange]
+    next_token: int
+    has_more: bool = False
+
+
+class EventHeatmap(BaseModel):
+    map_id: int
+    zoom: int
+    size: int  # cells per axis
+    max: int
+    total: int
+    counts: List[int]  # size x size counts, row-major, rows are y and columns are x
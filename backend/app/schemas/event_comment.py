@@ -1,7 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, computed_field
 from typing import Optional, Any, Dict
 from datetime import datetime
 
+from app.core import static_files
+from app.core import thumbnail_naming
+
 
 class EventCommentBase(BaseModel):
     event_id: int
@@ -20,10 +23,23 @@ class EventComment(EventCommentBase):
     id: int
     user_id: int
     image_url: Optional[str] = None
+    thumbnails_ready: bool = False
     created_at: datetime
     updated_at: Optional[datetime] = None
     comment_data: Optional[Dict[str, Any]] = None
     
+    @computed_field
+    def thumbnail_urls(self) -> Optional[Dict[str, str]]:
+        # Stored next to the attachment, named after it; None until they are generated
+        if not self.thumbnails_ready:
+            return None
+        return thumbnail_naming.thumbnail_urls(self.image_url)
+    
+    @computed_field
+    def signed_image_url(self) -> Optional[str]:
+        # Expiring link that is served without a database lookup
+        return static_files.signed_image_url(self.image_url)
+    
     class Config:
         orm_mode = True
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, computed_field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 from app.core.config import settings
 import os
@@ -63,4 +63,49 @@ class Map(MapBase):
     
     class Config:
         orm_mode = True
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class MapUploadCreate(BaseModel):
+    project_id: int
+    map_type: str
+    name: str
+    filename: str
+    total_size: int  # bytes
+    transform_data: Optional[Dict[str, Any]] = None
+    sha256: Optional[str] = None  # checksum of the whole file, verified on completion
+
+
+class MapUploadIntentCreate(BaseModel):
+    project_id: int
+    map_type: str
+    name: str
+    filename: str
+    size: int  # bytes
+    transform_data: Optional[Dict[str, Any]] = None
+
+
+class MapUploadStatus(BaseModel):
+    upload_id: str
+    chunk_size: int
+    total_size: int
+    total_chunks: int
+    received_chunks: List[int]
+    expires_at: datetime
+
+
+class MapTileLevel(BaseModel):
+    level: int
+    width: int  # pixels
+    height: int
+    columns: int
+    rows: int
+
+
+class MapTiles(BaseModel):
+    status: str  # 'ready', 'pending', 'failed' or 'unavailable'
+    tile_size: Optional[int] = None
+    max_level: Optional[int] = None
+    width: Optional[int] = None  # pixels at max_level
+    height: Optional[int] = None
+    levels: List[MapTileLevel] = []
+    url_template: Optional[str] = None  # with {z}, {x} and {y} placeholders
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, date
 
 
 class ProjectBase(BaseModel):
@@ -61,4 +61,39 @@ class Project(ProjectBase):
 class ProjectDetail(Project):
     user_count: int = 0
     map_count: int = 0
-    event_count: int = 0 
\ No newline at end of file
+    event_count: int = 0 
+
+class EventStatsBreakdown(BaseModel):
+    total: int = 0
+    by_status: Dict[str, int] = {}
+    by_state: Dict[str, int] = {}
+    by_tag: Dict[str, int] = {}
+    by_creator: Dict[str, int] = {}
+
+
+class ProjectStats(EventStatsBreakdown):
+    project_id: int
+    maps: Dict[int, EventStatsBreakdown] = {}
+
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
+
+class TimelineBucket(BaseModel):
+    start: date
+    created: int = 0
+    closed: int = 0
+    created_by_state: Dict[str, int] = {}
+    closed_by_state: Dict[str, int] = {}
+    created_by_tag: Dict[str, int] = {}
+    closed_by_tag: Dict[str, int] = {}
+
+
+class ProjectTimeline(BaseModel):
+    project_id: int
+    interval: str
+    start_date: date
+    end_date: date
+    buckets: List[TimelineBucket]
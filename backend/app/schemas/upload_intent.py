@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from typing import Dict
+from datetime import datetime
+
+
+class UploadIntent(BaseModel):
+    """Where to upload the file of a direct upload: send it with `method` to `upload_url`, with `headers`"""
+    intent_id: str
+    method: str
+    upload_url: str
+    headers: Dict[str, str]
+    expires_at: datetime
@@ -0,0 +1,257 @@
+"""
+Direct-to-storage uploads of map PDFs and event attachments.
+
+Instead of streaming the file through an API worker, the client:
+1. creates an upload intent (start_intent) with the file's name, type and size and
+   the fields of the map or event to create, and gets back a signed upload URL
+2. PUTs the file to that URL, with the headers returned alongside it
+3. completes the intent (complete_intent), which checks the stored file and creates
+   the map or event row
+
+When the storage backend can sign uploads (Cloud Storage: a V4 signed URL of the
+bucket) the bytes never go through the API. Otherwise a stand-in implements the
+same protocol: the URL points to PUT /api/v1/direct-uploads/{intent id} on this
+API, signed with the same HMAC as attachment URLs, which writes the request body
+to the storage backend (receive_local_upload).
+
+Files are uploaded to incoming/<intent id><ext> and copied on completion to their
+content-addressed name under maps/ or events/ (nothing is copied if that content is
+already stored).
+A signed URL stays valid until it expires, so nothing its holder uploads afterwards
+can replace a file that has been registered, and the stand-in rejects (and removes)
+uploads for intents that no longer exist. The uploaded file is removed by a
+background job queued in the same commit as the map or event, so a failed commit
+leaves the intent and its file in place to be completed again. Intents that are
+not completed expire after DIRECT_UPLOAD_EXPIRE_MINUTES and their files are removed.
+"""
+import logging
+from uuid import uuid4
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from fastapi import HTTPException, Request
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.security import create_signed_url
+from app.models.upload_intent import UploadIntent
+from app.services import storage
+from app.services import side_effects
+from app.services import map as map_service
+from app.services import event as event_service
+
+logger = logging.getLogger("direct_upload")
+
+INCOMING_DIRECTORY = "incoming"
+LOCAL_UPLOAD_ROUTE = "/api/v1/direct-uploads"
+
+
+def _max_size(kind: str) -> int:
+    return settings.MAX_RESUMABLE_MAP_SIZE if kind == "map" else event_service.MAX_ATTACHMENT_SIZE
+
+
+def start_intent(
+    db: Session,
+    kind: str,
+    project_id: int,
+    user_id: int,
+    filename: str,
+    content_type: str,
+    size: int,
+    data: Dict[str, Any]
+) -> UploadIntent:
+    """Register a direct upload of a map ('map') or event attachment ('event')"""
+    if kind == "map":
+        if content_type != "application/pdf" or not filename.lower().endswith(".pdf"):
+            raise HTTPException(400, detail="Only PDF files are allowed")
+    if size <= 0:
+        raise HTTPException(400, detail="File is empty")
+    max_size = _max_size(kind)
+    if size > max_size:
+        max_size_mb = max_size / (1024 * 1024)
+        raise HTTPException(400, detail=f"File size exceeds the limit of {max_size_mb:g}MB")
+
+    purge_expired_intents(db)
+
+    intent_id = str(uuid4())
+    if kind == "map":
+        ext = ".pdf"
+    else:
+        # Checks that the attachment is an image or PDF
+        _, ext = event_service.attachment_name_parts(content_type)
+    object_path = f"{INCOMING_DIRECTORY}/{intent_id}{ext}"
+
+    intent = UploadIntent(
+        id=intent_id,
+        kind=kind,
+        project_id=project_id,
+        user_id=user_id,
+        object_path=object_path,
+        filename=filename,
+        content_type=content_type,
+        size=size,
+        data=data,
+        expires_at=datetime.utcnow() + timedelta(minutes=settings.DIRECT_UPLOAD_EXPIRE_MINUTES)
+    )
+    db.add(intent)
+    db.commit()
+    db.refresh(intent)
+    logger.info(f"Started direct {kind} upload {intent.id} to {object_path} ({size} bytes)")
+    return intent
+
+
+def get_intent(db: Session, intent_id: str, kind: Optional[str] = None) -> Optional[UploadIntent]:
+    """Get a pending upload intent (None if it does not exist or has expired)"""
+    query = db.query(UploadIntent).filter(
+        UploadIntent.id == intent_id,
+        UploadIntent.expires_at > datetime.utcnow()
+    )
+    if kind is not None:
+        query = query.filter(UploadIntent.kind == kind)
+    return query.first()
+
+
+def get_own_intent(db: Session, intent_id: str, kind: str, user) -> UploadIntent:
+    """Pending intent of the given kind started by the user (or any intent, for admins)"""
+    intent = get_intent(db, intent_id, kind)
+    if not intent:
+        raise HTTPException(404, detail="Upload not found or expired")
+    if intent.user_id != user.id and not user.is_admin:
+        raise HTTPException(403, detail="Not enough permissions")
+    return intent
+
+
+def upload_target(intent: UploadIntent) -> Dict[str, Any]:
+    """Where and how the client uploads the file: method, signed URL and the headers to send"""
+    expires_delta = intent.expires_at - datetime.utcnow()
+    target = storage.signed_upload_url(
+        intent.object_path,
+        intent.content_type,
+        _max_size(intent.kind),
+        expires_delta
+    )
+    if target is not None:
+        url, headers = target
+    else:
+        url = create_signed_url(f"{LOCAL_UPLOAD_ROUTE}/{intent.id}", expires_delta)
+        headers = {"Content-Type": intent.content_type}
+    return {
+        "intent_id": intent.id,
+        "method": "PUT",
+        "upload_url": url,
+        "headers": headers,
+        "expires_at": intent.expires_at
+    }
+
+
+async def receive_local_upload(db: Session, intent: UploadIntent, request: Request) -> None:
+    """Stand-in for a signed bucket URL: write the body of a signed PUT to the intent's path"""
+    intent_id, object_path = intent.id, intent.object_path
+    await storage.save_upload(request.stream(), object_path, _max_size(intent.kind), intent.content_type)
+
+    # The intent may have been completed or cancelled while the body was received, and
+    # its file removed already: nothing would ever remove the file written again
+    if get_intent(db, intent_id) is None:
+        await storage.run_io(_remove_object, object_path)
+        raise HTTPException(404, detail="Upload not found or expired")
+
+
+async def complete_intent(db: Session, intent: UploadIntent):
+    """Check the uploaded file and create the map or event of an intent"""
+    # The row is deleted on commit: keep what is needed afterwards
+    intent_id, kind, object_path = intent.id, intent.kind, intent.object_path
+    project_id, user_id, content_type = intent.project_id, intent.user_id, intent.content_type
+    data = intent.data or {}
+
+    # Read server side, from the bucket: the client's connection is not involved
+    stored = await storage.run_io(storage.stored_file_digest, object_path)
+    if stored is None:
+        raise HTTPException(400, detail="The file has not been uploaded yet")
+    size, sha256 = stored
+    if size != intent.size:
+        raise HTTPException(400, detail=f"Uploaded file is {size} bytes, expected {intent.size}")
+
+    # The intent row is deleted and the uploaded file queued for removal in the same
+    # commit as the map or event is created
+    db.delete(intent)
+    side_effects.enqueue(db, "delete_stored_file", path=object_path)
+    try:
+        if kind == "map":
+            filename, file_url = await storage.adopt_file(
+                db, object_path, sha256, size, "maps", content_type
+            )
+            result = map_service.register_map(
+                db,
+                project_id,
+                data["map_type"],
+                data["name"],
+                filename,
+                file_url,
+                data.get("transform_data")
+            )
+        else:
+            # Content-addressed like attachments uploaded through the API
+            prefix, _ = event_service.attachment_name_parts(content_type)
+            name, _ = await storage.adopt_file(
+                db, object_path, sha256, size, "events", content_type, prefix
+            )
+            result = await _create_event(db, name, project_id, user_id, data)
+    except Exception:
+        db.rollback()
+        raise
+
+    logger.info(f"Completed direct {kind} upload {intent_id}")
+    return result
+
+
+async def _create_event(db: Session, name: str, project_id: int, user_id: int, data: Dict[str, Any]):
+    # Same form as attachments saved by save_event_attachment
+    attachment_url = storage.attachment_url("events", name)
+
+    # Thumbnails are scheduled by create_event, as for attachments uploaded through the API
+    return await event_service.create_event(
+        db=db,
+        project_id=project_id,
+        map_id=data["map_id"],
+        created_by_user_id=user_id,
+        title=data["title"],
+        x_coordinate=data["x_coordinate"],
+        y_coordinate=data["y_coordinate"],
+        description=data.get("description"),
+        status=data.get("status") or "open",
+        state=data.get("state") or "green",
+        active_maps=data.get("active_maps"),
+        tags=data.get("tags"),
+        attachment_url=attachment_url
+    )
+
+
+def cancel_intent(db: Session, intent: UploadIntent) -> None:
+    """Discard an upload intent and the file uploaded for it, if any"""
+    object_path = intent.object_path
+    db.delete(intent)
+    db.commit()
+    _remove_object(object_path)
+
+
+def _remove_object(object_path: str) -> None:
+    try:
+        storage.remove_stored_path(object_path)
+    except Exception as e:
+        logger.error(f"Error removing the uploaded file {object_path}: {str(e)}")
+
+
+def purge_expired_intents(db: Session) -> int:
+    """Delete the intents that expired before being completed, with their files; returns how many were removed"""
+    expired = db.query(UploadIntent.id, UploadIntent.object_path).filter(
+        UploadIntent.expires_at <= datetime.utcnow()
+    ).all()
+    if not expired:
+        return 0
+    expired_ids = [intent_id for intent_id, _ in expired]
+    db.query(UploadIntent).filter(UploadIntent.id.in_(expired_ids)).delete(synchronize_session=False)
+    db.commit()
+    for _, object_path in expired:
+        _remove_object(object_path)
+    logger.info(f"Purged {len(expired_ids)} expired upload intents")
+    return len(expired_ids)
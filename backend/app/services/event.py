@@ -1,18 +1,31 @@
-from typing import List, Dict, Optional, Any, Union
+from typing import List, Dict, Optional, Any, Union, Tuple
 import os
+import io
+import csv
 import json
+import base64
 import logging
+import tempfile
 from fastapi import HTTPException, UploadFile
 from sqlalchemy import func, desc, or_, and_
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from uuid import uuid4
 
 from app.core.config import settings
 from app.models.event import Event
 from app.models.user import User
 from app.models.event_comment import EventComment
+from app.models.event_tag import EventTag
+from app.models.map import Map
+from app.models.project import ProjectUser
 from app.services import event_history
+from app.services import event_cluster
+from app.services import event_heatmap
+from app.services import thumbnails
+from app.services import storage
+from app.services import event_stats
+from app.services import event_changes
+from app.services.tag_dictionary import normalize_tag, tag_labels
 from app.services.notification import NotificationService
 
 
@@ -20,17 +33,84 @@ def get_event(db: Session, event_id: int) -> Optional[Event]:
     return db.query(Event).filter(Event.id == event_id).first()
 
 
+def encode_event_cursor(created_at: datetime, event_id: int) -> str:
+    """Encode the (created_at, id) position of an event as an opaque cursor"""
+    payload = json.dumps({"c": created_at.isoformat() if created_at else None, "i": event_id})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_event_cursor(cursor: str):
+    """Decode an opaque cursor back into a (created_at, id) tuple"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        created_at = datetime.fromisoformat(payload["c"]) if payload["c"] else None
+        return created_at, int(payload["i"])
+    except Exception:
+        raise HTTPException(400, detail="Invalid pagination cursor")
+
+
+def get_next_event_cursor(events: List[Any], limit: int) -> Optional[str]:
+    """
+    Get the cursor for the page following `events`.
+    Returns None when the page was not full, i.e. there are no more events.
+    """
+    if not events or len(events) < limit:
+        return None
+    
+    last = events[-1]
+    if isinstance(last, dict):
+        return encode_event_cursor(last.get("created_at"), last["id"])
+    return encode_event_cursor(last.created_at, last.id)
+
+
+def apply_event_pagination(query, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """
+    Order an event query newest first and paginate it.
+    
+    With a cursor the query continues after the (created_at, id) position encoded
+    in it (keyset pagination), so deep pages cost the same as the first one.
+    Without a cursor the legacy skip/offset pagination is used.
+    
+    Events without a creation date come first, as in PostgreSQL's own descending
+    order, so the (created_at, id) indexes still serve the query.
+    """
+    if cursor:
+        cursor_created_at, cursor_id = decode_event_cursor(cursor)
+        if cursor_created_at is None:
+            # Still among the undated events: the rest of them, then every dated one
+            query = query.filter(or_(
+                and_(Event.created_at.is_(None), Event.id < cursor_id),
+                Event.created_at.isnot(None)
+            ))
+        else:
+            # Past the undated events, which the comparisons exclude
+            query = query.filter(or_(
+                Event.created_at < cursor_created_at,
+                and_(Event.created_at == cursor_created_at, Event.id < cursor_id)
+            ))
+    
+    query = query.order_by(Event.created_at.desc().nulls_first(), Event.id.desc())
+    
+    if not cursor and skip:
+        query = query.offset(skip)
+    
+    return query.limit(limit)
+
+
 def get_events(
     db: Session, 
     project_id: int, 
     user_id: Optional[int] = None,
     skip: int = 0, 
     limit: int = 100,
-    include_closed: bool = False
+    include_closed: bool = False,
+    cursor: Optional[str] = None
 ) -> List[Event]:
     """
     Get all events for a project.
     Admin users can see all events, regular users cannot see closed events.
+    Pass the cursor of the previous page to use keyset pagination instead of skip.
     """
     from sqlalchemy.orm import joinedload
     
@@ -45,11 +125,8 @@ def get_events(
     if not include_closed:
         query = query.filter(Event.status != 'closed')
     
-    # Order by most recent first
-    query = query.order_by(Event.created_at.desc())
-    
-    # Get events
-    events = query.offset(skip).limit(limit).all()
+    # Order by most recent first and paginate
+    events = apply_event_pagination(query, skip, limit, cursor).all()
     
     # Add username to each event
     for event in events:
@@ -59,21 +136,54 @@ def get_events(
     return events
 
 
+def get_bbox(
+    min_x: Optional[float] = None,
+    min_y: Optional[float] = None,
+    max_x: Optional[float] = None,
+    max_y: Optional[float] = None
+) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Validate viewport query parameters and return them as a (min_x, min_y, max_x, max_y) tuple.
+    Returns None when no bounding box was requested.
+    """
+    values = (min_x, min_y, max_x, max_y)
+    if all(v is None for v in values):
+        return None
+    if any(v is None for v in values):
+        raise HTTPException(400, detail="min_x, min_y, max_x and max_y must be given together")
+    if min_x > max_x or min_y > max_y:
+        raise HTTPException(400, detail="Bounding box minimum must not exceed its maximum")
+    return values
+
+
 def get_events_by_map(
     db: Session,
     map_id: int,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None
 ) -> List[Event]:
     """
     Get all events for a specific map.
+    Pass the cursor of the previous page to use keyset pagination instead of skip.
+    Pass a (min_x, min_y, max_x, max_y) bbox to only get events inside the visible viewport.
     """
     from sqlalchemy.orm import joinedload
     
     # Use join to get user info
-    events = db.query(Event).options(joinedload(Event.created_by_user)).filter(
+    query = db.query(Event).options(joinedload(Event.created_by_user)).filter(
         Event.map_id == map_id
-    ).order_by(Event.created_at.desc()).offset(skip).limit(limit).all()
+    )
+    
+    # Restrict to the viewport (served by the (map_id, x, y) index)
+    if bbox:
+        min_x, min_y, max_x, max_y = bbox
+        query = query.filter(
+            Event.x_coordinate.between(min_x, max_x),
+            Event.y_coordinate.between(min_y, max_y)
+        )
+    events = apply_event_pagination(query, skip, limit, cursor).all()
     
     # Process each event
     for event in events:
@@ -88,27 +198,35 @@ def get_events_by_map(
     return events
 
 
-def get_event_with_comments_count(db: Session, event_id: int) -> Optional[Dict[str, Any]]:
-    """Get event with comment count"""
-    result = db.query(
+def get_event_detail(db: Session, event_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Load everything the event detail view needs in a single joined query:
+    the event (with its maintained comment count), map name, creator name and
+    whether user_id is a member of the event's project (is_project_member).
+    """
+    row = db.query(
         Event,
-        func.count(EventComment.id).label('comment_count')
+        Map.name.label('map_name'),
+        User.username.label('created_by_user_name'),
+        ProjectUser.user_id.label('member_user_id')
     ).outerjoin(
-        EventComment, 
-        Event.id == EventComment.event_id
-    ).filter(
-        Event.id == event_id
-    ).group_by(
-        Event.id
-    ).first()
+        Map, Map.id == Event.map_id
+    ).outerjoin(
+        User, User.id == Event.created_by_user_id
+    ).outerjoin(
+        ProjectUser,
+        and_(ProjectUser.project_id == Event.project_id, ProjectUser.user_id == user_id)
+    ).filter(Event.id == event_id).first()
     
-    if not result:
+    if not row:
         return None
-        
-    event, comment_count = result
-    # Convert event to dict and add comment count
+    event, map_name, created_by_user_name, member_user_id = row
+    
+    # Convert event to dict (comment_count is a maintained column)
     event_dict = {c.name: getattr(event, c.name) for c in event.__table__.columns}
-    event_dict['comment_count'] = comment_count
+    event_dict['map_name'] = map_name or f"Map ID: {event.map_id}"
+    event_dict['created_by_user_name'] = created_by_user_name or f"User ID: {event.created_by_user_id}"
+    event_dict['is_project_member'] = member_user_id is not None
     
     # Fix for active_maps - convert empty array to empty dict if needed
     if event_dict['active_maps'] == [] or event_dict['active_maps'] is None:
@@ -122,16 +240,13 @@ def get_events_with_comments_count(
     project_id: int,
     user_id: Optional[int] = None, 
     skip: int = 0, 
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None
 ) -> List[Dict[str, Any]]:
     """Get events with comment counts and creator usernames"""
     query = db.query(
         Event,
-        func.count(EventComment.id).label('comment_count'),
         User.username.label('created_by_user_name')
-    ).outerjoin(
-        EventComment, 
-        Event.id == EventComment.event_id
     ).join(
         User,
         Event.created_by_user_id == User.id
@@ -142,18 +257,12 @@ def get_events_with_comments_count(
     if user_id:
         query = query.filter(Event.created_by_user_id == user_id)
     
-    results = query.group_by(
-        Event.id,
-        User.username
-    ).order_by(
-        desc(Event.created_at)
-    ).offset(skip).limit(limit).all()
+    results = apply_event_pagination(query, skip, limit, cursor).all()
     
     events_with_counts = []
-    for event, comment_count, created_by_user_name in results:
-        # Convert event to dict and add comment count
+    for event, created_by_user_name in results:
+        # Convert event to dict (comment_count is a maintained column) and add username
         event_dict = {c.name: getattr(event, c.name) for c in event.__table__.columns}
-        event_dict['comment_count'] = comment_count
         event_dict['created_by_user_name'] = created_by_user_name
         
         # Fix for active_maps - convert empty array to empty dict if needed
@@ -165,97 +274,76 @@ def get_events_with_comments_count(
     return events_with_counts
 
 
-async def save_event_attachment(file: UploadFile) -> str:
-    """Save event attachment (image or PDF) to the upload directory and return the filename with type info"""
-    # Check if file is an image or PDF
-    content_type = file.content_type
-    if not (content_type.startswith("image/") or content_type == "application/pdf"):
-        raise HTTPException(400, detail="Only image and PDF files are allowed")
-    
-    # Check file size limit (10MB)
-    MAX_SIZE = 10 * 1024 * 1024  # 10MB in bytes
-    file_size = 0
-    
-    # Read content to check size and then seek back to start
-    content = await file.read()
-    file_size = len(content)
+def sync_event_tags(db_event: Event) -> None:
+    """
+    Mirror the JSON tags of an event into its indexed event_tags rows.
+    Only the differences are written, so unchanged tags are left alone.
+    """
+    wanted = tag_labels(db_event.tags)
+    
+    existing = {entry.tag: entry for entry in db_event.tag_entries}
+    for tag, entry in existing.items():
+        if tag not in wanted:
+            db_event.tag_entries.remove(entry)
+        elif entry.label != wanted[tag]:
+            entry.label = wanted[tag]
+    for tag in sorted(set(wanted) - set(existing)):
+        db_event.tag_entries.append(EventTag(tag=tag, label=wanted[tag], project_id=db_event.project_id))
+
+
+def rebuild_event_tags(db: Session, project_id: Optional[int] = None) -> int:
+    """Repair the event_tags rows of all events (optionally of one project). Returns the number of events processed."""
+    query = db.query(Event)
+    if project_id:
+        query = query.filter(Event.project_id == project_id)
     
-    if file_size > MAX_SIZE:
-        raise HTTPException(400, detail=f"File size exceeds the limit of 10MB")
+    count = 0
+    for db_event in query.yield_per(500):
+        sync_event_tags(db_event)
+        count += 1
     
-    # Determine file type prefix for the path
-    file_type_prefix = "pdf" if content_type == "application/pdf" else "img"
+    db.commit()
+    return count
+
+
+# File size limit of event attachments (10MB), enforced while the upload is streamed
+MAX_ATTACHMENT_SIZE = 10 * 1024 * 1024
+
+
+def attachment_name_parts(content_type: str) -> Tuple[str, str]:
+    """Prefix and extension of the stored name of an event attachment (image or PDF)"""
+    if not (content_type.startswith("image/") or content_type == "application/pdf"):
+        raise HTTPException(400, detail="Only image and PDF files are allowed")
     
-    # Generate a unique filename with appropriate extension
     if content_type == "application/pdf":
-        ext = ".pdf"
-    else:
-        ext = "." + content_type.split("/")[1]
-    
-    # Create a unique filename
-    unique_filename = f"{file_type_prefix}_{uuid4()}{ext}"
-    
-    # Check if we should use Cloud Storage
-    use_cloud_storage = os.getenv("USE_CLOUD_STORAGE", "false").lower() == "true"
-    in_cloud_run = os.getenv("K_SERVICE") is not None
+        return "pdf_", ".pdf"
+    return "img_", "." + content_type.split("/")[1]
+
+
+async def save_event_attachment(db: Session, file: UploadFile) -> str:
+    """
+    Save event attachment (image or PDF) to the storage backend and return its URL.
+    Attachments are content-addressed (img_<sha256>.<ext>), so a photo that is already
+    stored only gets a new reference, recorded in the caller's transaction.
+    """
+    # Checks that the file is an image or PDF
+    prefix, ext = attachment_name_parts(file.content_type)
     logger = logging.getLogger("event_service")
     
-    if use_cloud_storage or in_cloud_run:
-        try:
-            logger.info("Using Cloud Storage for event attachment")
-            from app.services.storage import upload_file_to_cloud_storage
-            
-            # Set destination path in Cloud Storage
-            destination_blob_name = f"events/{unique_filename}"
-            
-            # Upload to Cloud Storage
-            cloud_storage_bucket = os.getenv("CLOUD_STORAGE_BUCKET", "construction-map-storage-deep-responder-444017-h2")
-            file_url = await upload_file_to_cloud_storage(
-                content, 
-                destination_blob_name, 
-                file.content_type or "application/octet-stream"
-            )
-            
-            logger.info(f"File uploaded to Cloud Storage, URL: {file_url}")
-            return file_url  # Return the full Cloud Storage URL
-        except Exception as cloud_error:
-            logger.error(f"Error using Cloud Storage: {str(cloud_error)}")
-            logger.info("Falling back to local storage")
-            # Continue with local storage as fallback
-    
-    # If not using Cloud Storage or it failed, use local storage
-    # Ensure uploads directory exists
-    attachment_dir = os.path.join(settings.UPLOAD_FOLDER, "events")
-    
+    # Stream the file to storage, enforcing the size limit
     try:
-        os.makedirs(attachment_dir, exist_ok=True)
-    except PermissionError:
-        logger = logging.getLogger("event_service")
-        logger.warning(f"Cannot create event uploads directory (read-only filesystem): {attachment_dir}")
-        # If we're on a read-only filesystem, use a temporary directory for this operation
-        # The file will be later copied to persistent storage through other means
-        attachment_dir = os.path.join("/tmp", "events")
-        os.makedirs(attachment_dir, exist_ok=True)
-    except OSError as e:
-        logger = logging.getLogger("event_service")
-        logger.warning(f"Error creating event uploads directory: {str(e)}")
-        # Fall back to temporary directory
-        attachment_dir = os.path.join("/tmp", "events")
-        os.makedirs(attachment_dir, exist_ok=True)
-    
-    # Write file to disk
-    file_path = os.path.join(attachment_dir, unique_filename)
-    try:
-        with open(file_path, "wb") as f:
-            await file.seek(0)  # Reset file position
-            f.write(content)
+        filename, _ = await storage.save_file(
+            db, file, "events", max_size=MAX_ATTACHMENT_SIZE, prefix=prefix, extension=ext
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        logger = logging.getLogger("event_service")
         logger.error(f"Error saving file: {str(e)}")
         raise HTTPException(500, detail=f"Error saving file: {str(e)}")
+    logger.info(f"Saved event attachment {filename}")
     
-    # Return the relative path to be stored in the database
-    return f"/events/{unique_filename}"
+    # The full Cloud Storage URL, or the relative path served by the /events mount
+    return storage.attachment_url("events", filename)
 
 
 async def create_event(
@@ -271,9 +359,10 @@ async def create_event(
     state: Optional[str] = "green",
     active_maps: Optional[str] = None,
     tags: Optional[List[str]] = None,
-    image: Optional[UploadFile] = None
+    image: Optional[UploadFile] = None,
+    attachment_url: Optional[str] = None
 ) -> Event:
-    """Create a new event"""
+    """Create a new event (with an uploaded image, or the URL of an attachment that is already stored)"""
     # Process tags
     tags_json = None
     if tags:
@@ -316,13 +405,16 @@ async def create_event(
     image_url = None
     file_type = None
     if image:
-        image_url = await save_event_attachment(image)
+        image_url = await save_event_attachment(db, image)
         # Determine file type
         content_type = image.content_type
         if content_type.startswith("image/"):
             file_type = "image"
         elif content_type == "application/pdf":
             file_type = "pdf"
+    elif attachment_url:
+        image_url = attachment_url
+        file_type = "pdf" if attachment_url.lower().endswith(".pdf") else "image"
     
     # Get user for notification
     user = db.query(User).filter(User.id == created_by_user_id).first()
@@ -344,43 +436,23 @@ async def create_event(
         x_coordinate=x_coordinate,
         y_coordinate=y_coordinate
     )
+    sync_event_tags(db_event)
     
     db.add(db_event)
+    if file_type == "image":
+        # Generated next to the original after the commit, without blocking the request
+        thumbnails.schedule_thumbnails(db, "events", image_url.rsplit("/", 1)[-1])
+    # Count the new event in the project statistics (same transaction)
+    event_stats.apply_change(db, None, db_event)
+    event_changes.record_change(db, db_event)
+    # History and notifications are committed together with the event
+    record_event_created(db, db_event, created_by_user_id)
     db.commit()
     db.refresh(db_event)
     
-    # Create event history record for creation (wrapped in try-except)
-    try:
-        event_history.create_event_history(
-            db=db,
-            event_id=db_event.id,
-            user_id=created_by_user_id,
-            action_type="create",
-            new_value=status
-        )
-    except Exception as e:
-        print(f"Error recording event creation history (non-critical): {str(e)}")
-        # This error is non-critical, the event has already been created
-    
-    # Create notifications for mentioned users
-    if description:
-        link = f"/events/{db_event.id}"
-        NotificationService.notify_mentions(
-            db, 
-            description, 
-            created_by_user_id, 
-            event_id=db_event.id, 
-            link=link
-        )
-    
-    # Notify all admins about the new event
-    NotificationService.notify_admins(
-        db, 
-        "created a new event", 
-        created_by_user_id, 
-        event_id=db_event.id, 
-        link=f"/events/{db_event.id}"
-    )
+    # Keep the marker clusters of the map up to date
+    event_cluster.event_saved(db_event)
+    event_heatmap.invalidate(db_event.map_id)
     
     return db_event
 
@@ -401,6 +473,8 @@ def update_event(
     # Store original values before update for history tracking
     original_status = db_event.status
     original_state = db_event.state
+    original_map_id = db_event.map_id
+    stats_before = event_stats.snapshot(db_event)
     
     # Update fields if provided
     update_data = event_update.dict(exclude_unset=True)
@@ -434,135 +508,24 @@ def update_event(
         # Set the attribute first
         setattr(db_event, field, value)
     
-    # First commit the actual changes to ensure they're saved
+    # Keep the indexed tag rows in sync with the JSON tags
+    if 'tags' in update_data:
+        sync_event_tags(db_event)
+    
+    # Move the event between the statistics counters it was and is now part of
+    event_stats.apply_change(db, stats_before, db_event)
+    event_changes.record_change(db, db_event)
+    
+    # History and notifications are committed together with the update
+    record_event_updated(db, db_event, current_user_id, list(update_data.keys()), original_status, original_state)
+    
     try:
-        # Now commit the changes
         db.commit()
         db.refresh(db_event)
-        
-        # After successful commit, try to record history (non-critical)
-        
-        # Track status changes in history (wrapped in try-except)
-        if 'status' in update_data and update_data['status'] != original_status:
-            try:
-                event_history.create_event_history(
-                    db=db,
-                    event_id=event_id,
-                    user_id=current_user_id,
-                    action_type="status_change",
-                    previous_value=original_status,
-                    new_value=update_data['status']
-                )
-            except Exception as e:
-                print(f"Error recording status change history (non-critical): {str(e)}")
-                # This error is non-critical, the update has already been saved
-                # Make sure we don't have a transaction that needs to be rolled back
-                try:
-                    db.rollback()
-                except Exception as rollback_error:
-                    print(f"Error during rollback after history error: {str(rollback_error)}")
-                
-        # Track state/type changes in history (wrapped in try-except)
-        if 'state' in update_data and update_data['state'] != original_state:
-            try:
-                event_history.create_event_history(
-                    db=db,
-                    event_id=event_id,
-                    user_id=current_user_id,
-                    action_type="type_change",
-                    previous_value=original_state,
-                    new_value=update_data['state']
-                )
-            except Exception as e:
-                print(f"Error recording state change history (non-critical): {str(e)}")
-                # This error is non-critical, the update has already been saved
-                # Make sure we don't have a transaction that needs to be rolled back
-                try:
-                    db.rollback()
-                except Exception as rollback_error:
-                    print(f"Error during rollback after history error: {str(rollback_error)}")
-        
-        # Add a general "edit" history entry if fields other than status/state were updated
-        excluded_fields = ["status", "state", "is_admin_request"]
-        other_fields_updated = [f for f in update_data.keys() if f not in excluded_fields]
-        if other_fields_updated:
-            try:
-                event_history.create_event_history(
-                    db=db,
-                    event_id=event_id,
-                    user_id=current_user_id,
-                    action_type="edit",
-                    additional_data={"updated_fields": other_fields_updated}
-                )
-            except Exception as e:
-                print(f"Error recording edit history (non-critical): {str(e)}")
-                # This error is non-critical, the update has already been saved
-                # Make sure we don't have a transaction that needs to be rolled back
-                try:
-                    db.rollback()
-                except Exception as rollback_error:
-                    print(f"Error during rollback after history error: {str(rollback_error)}")
-        
-        # Create notifications for status/state changes
-        link = f"/project/{db_event.project_id}?event={db_event.id}"
-        
-        try:
-            if 'status' in update_data and update_data['status'] != original_status:
-                # Notify event creator if current user is not the creator
-                if db_event.created_by_user_id != current_user_id:
-                    NotificationService.notify_event_interaction(
-                        db, 
-                        event_id, 
-                        current_user_id, 
-                        f"updated the status to '{db_event.status}'", 
-                        link
-                    )
-                    
-            if 'state' in update_data and update_data['state'] != original_state:
-                # Notify event creator if current user is not the creator
-                if db_event.created_by_user_id != current_user_id:
-                    NotificationService.notify_event_interaction(
-                        db, 
-                        event_id, 
-                        current_user_id, 
-                        f"changed the state to '{db_event.state}'", 
-                        link
-                    )
-            
-            # Check for new mentions if description was updated
-            if 'description' in update_data:
-                NotificationService.notify_mentions(
-                    db, 
-                    db_event.description, 
-                    current_user_id, 
-                    event_id=db_event.id, 
-                    link=link
-                )
-                
-            # Notify admins about the update
-            if current_user_id != db_event.created_by_user_id:
-                action = "updated an event"
-                if 'status' in update_data:
-                    action = f"changed event status to '{db_event.status}'"
-                elif 'state' in update_data:
-                    action = f"changed event state to '{db_event.state}'"
-                    
-                NotificationService.notify_admins(
-                    db, 
-                    action, 
-                    current_user_id, 
-                    event_id=db_event.id, 
-                    link=link
-                )
-        except Exception as notif_error:
-            print(f"Error sending notifications (non-critical): {str(notif_error)}")
-            # Notifications are non-critical, the update has already been saved
-            # Make sure we don't have a transaction that needs to be rolled back
-            try:
-                db.rollback()
-            except Exception as rollback_error:
-                print(f"Error during rollback after notification error: {str(rollback_error)}")
-                
+        event_cluster.event_saved(db_event, original_map_id)
+        event_heatmap.invalidate(db_event.map_id)
+        if original_map_id != db_event.map_id:
+            event_heatmap.invalidate(original_map_id)
     except Exception as e:
         # If we fail during the initial commit, roll back and re-raise
         try:
@@ -576,80 +539,261 @@ def update_event(
     return db_event
 
 
+def record_event_created(db: Session, db_event: Event, user_id: int) -> None:
+    """
+    Add the history entry and notifications of a new event to the session,
+    so they are committed in the same transaction as the event.
+    Notification emails are sent afterwards by the side effect workers.
+    """
+    # The entries reference the event by id: make sure it has been assigned
+    db.flush()
+    event_history.create_event_history(
+        db=db,
+        event_id=db_event.id,
+        user_id=user_id,
+        action_type="create",
+        new_value=db_event.status,
+        commit=False
+    )
+    
+    # Create notifications for mentioned users
+    link = f"/events/{db_event.id}"
+    if db_event.description:
+        NotificationService.notify_mentions(
+            db, db_event.description, user_id, event_id=db_event.id, link=link, commit=False
+        )
+    
+    # Notify all admins about the new event
+    NotificationService.notify_admins(
+        db, "created a new event", user_id, event_id=db_event.id, link=link, commit=False
+    )
+
+
+def record_event_updated(
+    db: Session,
+    db_event: Event,
+    user_id: int,
+    updated_fields: List[str],
+    original_status: Optional[str] = None,
+    original_state: Optional[str] = None
+) -> None:
+    """
+    Add the history entries and notifications of an event update to the session,
+    so they are committed in the same transaction as the update.
+    Notification emails are sent afterwards by the side effect workers.
+    """
+    event_id = db_event.id
+    status_changed = 'status' in updated_fields and db_event.status != original_status
+    state_changed = 'state' in updated_fields and db_event.state != original_state
+    
+    # Track status and state/type changes in history
+    if status_changed:
+        event_history.create_event_history(
+            db=db,
+            event_id=event_id,
+            user_id=user_id,
+            action_type="status_change",
+            previous_value=original_status,
+            new_value=db_event.status,
+            commit=False
+        )
+    if state_changed:
+        event_history.create_event_history(
+            db=db,
+            event_id=event_id,
+            user_id=user_id,
+            action_type="type_change",
+            previous_value=original_state,
+            new_value=db_event.state,
+            commit=False
+        )
+    
+    # Add a general "edit" history entry if fields other than status/state were updated
+    excluded_fields = ["status", "state", "is_admin_request"]
+    other_fields_updated = [f for f in updated_fields if f not in excluded_fields]
+    if other_fields_updated:
+        event_history.create_event_history(
+            db=db,
+            event_id=event_id,
+            user_id=user_id,
+            action_type="edit",
+            additional_data={"updated_fields": other_fields_updated},
+            commit=False
+        )
+    
+    # Create notifications for status/state changes
+    link = f"/project/{db_event.project_id}?event={event_id}"
+    
+    # Notify event creator if current user is not the creator
+    if db_event.created_by_user_id != user_id:
+        if status_changed:
+            NotificationService.notify_event_interaction(
+                db, event_id, user_id, f"updated the status to '{db_event.status}'", link, commit=False
+            )
+        if state_changed:
+            NotificationService.notify_event_interaction(
+                db, event_id, user_id, f"changed the state to '{db_event.state}'", link, commit=False
+            )
+    
+    # Check for new mentions if description was updated
+    if 'description' in updated_fields and db_event.description:
+        NotificationService.notify_mentions(
+            db, db_event.description, user_id, event_id=event_id, link=link, commit=False
+        )
+    
+    # Notify admins about the update
+    if user_id != db_event.created_by_user_id:
+        action = "updated an event"
+        if 'status' in updated_fields:
+            action = f"changed event status to '{db_event.status}'"
+        elif 'state' in updated_fields:
+            action = f"changed event state to '{db_event.state}'"
+        NotificationService.notify_admins(db, action, user_id, event_id=event_id, link=link, commit=False)
+
+
 def delete_event(db: Session, event_id: int) -> bool:
     """Delete an event"""
     event = get_event(db, event_id)
     if not event:
         return False
     
-    # Delete image file if exists
-    if event.image_url:
-        try:
-            filepath = os.path.join(settings.UPLOAD_FOLDER, event.image_url)
-            if os.path.exists(filepath):
-                os.remove(filepath)
-        except Exception:
-            pass  # Continue even if file deletion fails
+    # Attachments of the event and of its comments (deleted with it) are removed after commit
+    storage.delete_attachment(db, event.image_url)
+    for comment in event.comments:
+        storage.delete_attachment(db, comment.image_url)
     
+    map_id = event.map_id
+    event_stats.apply_change(db, event_stats.snapshot(event), None)
+    event_changes.record_change(db, event, event_changes.CHANGE_DELETE)
     db.delete(event)
     db.commit()
+    event_cluster.event_deleted(map_id, event_id)
+    event_heatmap.invalidate(map_id)
     return True
 
 
+EXPORT_COLUMNS = [
+    "id", "title", "description", "created_by", "state", "x_coordinate",
+    "y_coordinate", "tags", "created_at", "has_image", "comment_count"
+]
+EXPORT_BATCH_SIZE = 1000
+
+
+def _iter_export_rows(
+    db: Session, 
+    project_id: int,
+    user_id: Optional[int] = None
+):
+    """
+    Yield export rows for the events of a project.
+    Usernames and comment counts come from the same row, and rows are fetched
+    in batches through a server-side cursor so memory stays flat for any project size.
+    """
+    query = db.query(
+        Event.id,
+        Event.title,
+        Event.description,
+        User.username,
+        Event.state,
+        Event.x_coordinate,
+        Event.y_coordinate,
+        Event.tags,
+        Event.created_at,
+        Event.image_url,
+        Event.comment_count
+    ).outerjoin(
+        User,
+        Event.created_by_user_id == User.id
+    ).filter(
+        Event.project_id == project_id,
+        Event.status != 'closed'
+    )
+    
+    if user_id:
+        query = query.filter(Event.created_by_user_id == user_id)
+    
+    query = query.order_by(Event.created_at.desc(), Event.id.desc())
+    query = query.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+    
+    for row in query:
+        yield [
+            row.id,
+            row.title,
+            row.description,
+            row.username,
+            row.state,
+            row.x_coordinate,
+            row.y_coordinate,
+            ', '.join(str(tag) for tag in row.tags) if isinstance(row.tags, list) else "",
+            row.created_at.isoformat() if row.created_at else "",
+            bool(row.image_url),
+            row.comment_count
+        ]
+
+
+def _stream_csv(rows):
+    """Stream rows as CSV, flushing every EXPORT_BATCH_SIZE rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+    
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _stream_xlsx(rows, chunk_size: int = 64 * 1024):
+    """
+    Stream rows as an XLSX workbook.
+    The write-only workbook keeps rows out of memory; the finished file is
+    spooled to a temporary file and then sent in chunks.
+    """
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Events")
+    sheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append(row)
+    
+    with tempfile.TemporaryFile() as tmp:
+        workbook.save(tmp)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
 def export_events(
     db: Session, 
     project_id: int,
     format: str = "csv",
     user_id: Optional[int] = None
-) -> bytes:
-    """Export events to CSV or Excel format"""
-    # Get events
-    events = get_events(db, project_id, user_id, skip=0, limit=1000)
-    
-    # Convert to dataframe
-    data = []
-    for event in events:
-        # Get username
-        username = db.query(db.model.User.username).filter(
-            db.model.User.id == event.created_by_user_id
-        ).scalar()
-        
-        # Count comments
-        comment_count = db.query(func.count(EventComment.id)).filter(
-            EventComment.event_id == event.id
-        ).scalar()
-        
-        data.append({
-            "id": event.id,
-            "title": event.title,
-            "description": event.description,
-            "created_by": username,
-            "state": event.state,
-            "x_coordinate": event.x_coordinate,
-            "y_coordinate": event.y_coordinate,
-            "tags": ', '.join(event.tags) if event.tags else "",
-            "created_at": event.created_at,
-            "has_image": bool(event.image_url),
-            "comment_count": comment_count
-        })
-    
-    df = pd.DataFrame(data)
-    
-    # Export to requested format
-    buffer = io.BytesIO()
+) -> Dict[str, Any]:
+    """
+    Export events to CSV or Excel format.
+    Returns the content as an iterator of bytes chunks, to be sent with a StreamingResponse.
+    """
+    rows = _iter_export_rows(db, project_id, user_id)
     
     if format.lower() == "xlsx":
-        df.to_excel(buffer, index=False, engine="openpyxl")
+        content = _stream_xlsx(rows)
         mime_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         file_ext = "xlsx"
     else:  # Default to CSV
-        df.to_csv(buffer, index=False)
+        content = _stream_csv(rows)
         mime_type = "text/csv"
         file_ext = "csv"
     
-    buffer.seek(0)
     return {
-        "content": buffer.getvalue(),
+        "content": content,
         "media_type": mime_type,
         "filename": f"events-project-{project_id}.{file_ext}"
     }
@@ -665,33 +809,29 @@ def update_event_status(db: Session, event_id: int, new_status: str, user_id: in
     previous_status = db_event.status
     
     # Update status
+    stats_before = event_stats.snapshot(db_event)
     db_event.status = new_status
+    event_stats.apply_change(db, stats_before, db_event)
+    event_changes.record_change(db, db_event)
+    
+    # The change and its history entry are committed together
+    event_history.create_event_history(
+        db=db,
+        event_id=event_id,
+        user_id=user_id,
+        action_type="status_change",
+        previous_value=previous_status,
+        new_value=new_status,
+        commit=False
+    )
     
     try:
-        # Commit the status change first
         db.commit()
         db.refresh(db_event)
-        
-        # Record in history (wrapped in try-except)
-        try:
-            event_history.create_event_history(
-                db=db,
-                event_id=event_id,
-                user_id=user_id,
-                action_type="status_change",
-                previous_value=previous_status,
-                new_value=new_status
-            )
-        except Exception as e:
-            print(f"Error recording status change history (non-critical): {str(e)}")
-            # This error is non-critical, the status has already been updated
-            # Make sure we don't have a transaction that needs to be rolled back
-            try:
-                db.rollback()
-            except Exception as rollback_error:
-                print(f"Error during rollback after history error: {str(rollback_error)}")
+        event_cluster.event_saved(db_event)
+        event_heatmap.invalidate(db_event.map_id)
     except Exception as e:
-        # If we fail during the initial commit, roll back and re-raise
+        # Roll back the whole change and re-raise
         try:
             db.rollback()
         except Exception as rollback_error:
@@ -713,33 +853,29 @@ def update_event_state(db: Session, event_id: int, new_state: str, user_id: int)
     previous_state = db_event.state
     
     # Update state
+    stats_before = event_stats.snapshot(db_event)
     db_event.state = new_state
+    event_stats.apply_change(db, stats_before, db_event)
+    event_changes.record_change(db, db_event)
+    
+    # The change and its history entry are committed together
+    event_history.create_event_history(
+        db=db,
+        event_id=event_id,
+        user_id=user_id,
+        action_type="type_change",
+        previous_value=previous_state,
+        new_value=new_state,
+        commit=False
+    )
     
     try:
-        # Commit the state change first
         db.commit()
         db.refresh(db_event)
-        
-        # Record in history (wrapped in try-except)
-        try:
-            event_history.create_event_history(
-                db=db,
-                event_id=event_id,
-                user_id=user_id,
-                action_type="type_change",
-                previous_value=previous_state,
-                new_value=new_state
-            )
-        except Exception as e:
-            print(f"Error recording state change history (non-critical): {str(e)}")
-            # This error is non-critical, the state has already been updated
-            # Make sure we don't have a transaction that needs to be rolled back
-            try:
-                db.rollback()
-            except Exception as rollback_error:
-                print(f"Error during rollback after history error: {str(rollback_error)}")
+        event_cluster.event_saved(db_event)
+        event_heatmap.invalidate(db_event.map_id)
     except Exception as e:
-        # If we fail during the initial commit, roll back and re-raise
+        # Roll back the whole change and re-raise
         try:
             db.rollback()
         except Exception as rollback_error:
@@ -762,7 +898,8 @@ def get_events_with_filters(
     tags_filter: Optional[List[str]] = None,
     skip: int = 0, 
     limit: int = 100,
-    include_closed: bool = False
+    include_closed: bool = False,
+    cursor: Optional[str] = None
 ) -> List[Dict[str, Any]]:
     """
     Get events with filtering options and comment counts
@@ -779,6 +916,7 @@ def get_events_with_filters(
     - skip: Number of records to skip for pagination
     - limit: Maximum number of records to return
     - include_closed: Whether to include closed events
+    - cursor: Opaque cursor of the previous page for keyset pagination (overrides skip)
     """
     from sqlalchemy.orm import joinedload
     from sqlalchemy import and_, func, or_, cast, Date
@@ -787,11 +925,7 @@ def get_events_with_filters(
     # Start with base query
     query = db.query(
         Event,
-        func.count(EventComment.id).label('comment_count'),
         User.username.label('created_by_user_name')
-    ).outerjoin(
-        EventComment, 
-        Event.id == EventComment.event_id
     ).join(
         User,
         Event.created_by_user_id == User.id
@@ -832,42 +966,26 @@ def get_events_with_filters(
             # Invalid date format, ignore this filter
             pass
     
-    # Filter by tags if specified
-    if tags_filter and len(tags_filter) > 0:
-        # For each tag, check if it exists in the tags array
-        tag_conditions = []
-        for tag in tags_filter:
-            # This was using PostgreSQL's array containment operator which may not work as expected with JSON
-            # Use a more compatible approach with JSON data
-            # Try various match approaches to ensure tags are found
-            tag_str = str(tag).strip().lower()
-            if tag_str:
-                # Check if tag exists in the array using JSON containment
-                # This works with most SQL backends supporting JSON
-                tag_conditions.append(func.lower(func.cast(Event.tags, db.String)).contains(tag_str))
-        
-        # Join conditions with OR (event has any of the specified tags)
-        if tag_conditions:
-            query = query.filter(or_(*tag_conditions))
-    
-    # Group by necessary fields
-    query = query.group_by(
-        Event.id,
-        User.username
-    )
-    
-    # Order by newest first
-    query = query.order_by(desc(Event.created_at))
+    # Filter by tags if specified (event has any of the specified tags)
+    if tags_filter:
+        tag_values = {normalize_tag(tag) for tag in tags_filter}
+        tag_values.discard("")
+        if tag_values:
+            # Exact match through the (project_id, tag) index of event_tags
+            tagged_event_ids = db.query(EventTag.event_id).filter(
+                EventTag.project_id == project_id,
+                EventTag.tag.in_(tag_values)
+            )
+            query = query.filter(Event.id.in_(tagged_event_ids))
     
-    # Apply pagination
-    results = query.offset(skip).limit(limit).all()
+    # Order by newest first and apply pagination
+    results = apply_event_pagination(query, skip, limit, cursor).all()
     
     # Process results
     events_with_counts = []
-    for event, comment_count, created_by_user_name in results:
-        # Convert event to dict and add comment count
+    for event, created_by_user_name in results:
+        # Convert event to dict (comment_count is a maintained column) and add username
         event_dict = {c.name: getattr(event, c.name) for c in event.__table__.columns}
-        event_dict['comment_count'] = comment_count
         event_dict['created_by_user_name'] = created_by_user_name
         
         # Fix for active_maps - convert empty array to empty dict if needed
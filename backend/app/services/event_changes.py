@@ -0,0 +1,106 @@
+from typing import Dict, Any, Optional
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from app.models.event import Event
+from app.models.user import User
+from app.models.event_change import EventChange
+
+CHANGE_UPSERT = "upsert"
+CHANGE_DELETE = "delete"
+
+# First key of the advisory locks that order the changes of each project
+FEED_LOCK_NAMESPACE = 1001
+
+
+def _lock_project_feed(db: Session, project_id: int) -> None:
+    """
+    Serialize the writers of a project's changes feed until they commit.
+    
+    Sequence ids are assigned at insert time but become visible at commit time: if
+    two transactions could append concurrently, a client could read id N+1, move its
+    token past it and never see id N once it commits. Holding a transaction-level
+    lock from the insert to the commit makes the ids of a project commit-ordered.
+    SQLite already allows a single writer at a time.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(:namespace, :project_id)"),
+            {"namespace": FEED_LOCK_NAMESPACE, "project_id": project_id}
+        )
+
+
+def record_change(db: Session, event: Event, action: str = CHANGE_UPSERT) -> None:
+    """
+    Append an event write to the changes feed, in the caller's transaction.
+    New events are flushed first so they have an id.
+    """
+    if event.id is None:
+        db.flush()
+    _lock_project_feed(db, event.project_id)
+    db.add(EventChange(
+        project_id=event.project_id,
+        map_id=event.map_id,
+        event_id=event.id,
+        action=action
+    ))
+
+
+def get_latest_token(db: Session, project_id: int) -> int:
+    """Get the sequence token of the latest change of a project (0 if none)"""
+    return db.query(func.max(EventChange.id)).filter(EventChange.project_id == project_id).scalar() or 0
+
+
+def get_changes(
+    db: Session,
+    project_id: int,
+    since: int = 0,
+    limit: int = 500,
+    include_closed: bool = False
+) -> Dict[str, Any]:
+    """
+    Get the events of a project changed after the since token.
+    
+    Each changed event appears once, with its current data ('upsert') or as a
+    tombstone ('delete'). Events closed after the token are tombstones for users
+    who cannot see closed events. Pass next_token back as since to continue;
+    has_more is true when the page was cut at limit.
+    """
+    log = db.query(EventChange.id, EventChange.event_id, EventChange.map_id, EventChange.action).filter(
+        EventChange.project_id == project_id,
+        EventChange.id > since
+    ).order_by(EventChange.id).limit(limit + 1).all()
+    
+    has_more = len(log) > limit
+    log = log[:limit]
+    if not log:
+        return {"changes": [], "next_token": since, "has_more": False}
+    
+    # Only the latest change of each event matters
+    latest = {}
+    for sequence, event_id, map_id, action in log:
+        latest[event_id] = (sequence, map_id, action)
+    
+    upserted_ids = [event_id for event_id, (_, _, action) in latest.items() if action == CHANGE_UPSERT]
+    events = {}
+    if upserted_ids:
+        rows = db.query(Event, User.username).outerjoin(
+            User, Event.created_by_user_id == User.id
+        ).filter(Event.id.in_(upserted_ids)).all()
+        for event, created_by_user_name in rows:
+            event_dict = {c.name: getattr(event, c.name) for c in event.__table__.columns}
+            event_dict['created_by_user_name'] = created_by_user_name
+            if event_dict['active_maps'] == [] or event_dict['active_maps'] is None:
+                event_dict['active_maps'] = {}
+            events[event.id] = event_dict
+    
+    changes = []
+    for event_id, (sequence, map_id, action) in sorted(latest.items(), key=lambda item: item[1][0]):
+        event_dict: Optional[Dict[str, Any]] = events.get(event_id)
+        hidden = event_dict is not None and event_dict["status"] == "closed" and not include_closed
+        if action == CHANGE_DELETE or event_dict is None or hidden:
+            changes.append({"sequence": sequence, "event_id": event_id, "map_id": map_id, "action": CHANGE_DELETE, "event": None})
+        else:
+            changes.append({"sequence": sequence, "event_id": event_id, "map_id": map_id, "action": CHANGE_UPSERT, "event": event_dict})
+    
+    return {"changes": changes, "next_token": log[-1][0], "has_more": has_more}
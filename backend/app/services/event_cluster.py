@@ -0,0 +1,177 @@
+"""
+In-process zoom-level clustering of event markers.
+
+Event coordinates are percentages (0-100) of the map size. For every zoom level z
+the map is divided into a grid of 2^z x 2^z cells and each cell keeps the number of
+events in it, the sum of their coordinates (to place the cluster at the centroid)
+and the counts per state (red/yellow/green).
+
+The grids of a map are built once from the database on first use and then kept up
+to date incrementally by the event service whenever an event is created, updated or
+deleted, so panning and zooming never trigger a full recomputation. Indexes expire
+after CLUSTER_INDEX_TTL seconds so that instances also pick up writes made by other
+instances.
+"""
+import threading
+import time
+import logging
+from typing import Dict, List, Optional, Tuple, Any
+
+from sqlalchemy.orm import Session
+
+from app.models.event import Event
+
+logger = logging.getLogger("event_cluster")
+
+MAX_CLUSTER_ZOOM = 8  # 256 x 256 cells at the deepest level
+CLUSTER_INDEX_TTL = 300  # seconds
+MAP_SIZE = 100.0  # coordinates are percentages of the map size
+STATES = ("red", "yellow", "green")
+
+
+def _clamp(value: float) -> float:
+    return min(max(value, 0.0), MAP_SIZE)
+
+
+def _cell(x: float, y: float, zoom: int) -> Tuple[int, int]:
+    cells_per_axis = 2 ** zoom
+    cell_size = MAP_SIZE / cells_per_axis
+    col = min(int(_clamp(x) / cell_size), cells_per_axis - 1)
+    row = min(int(_clamp(y) / cell_size), cells_per_axis - 1)
+    return col, row
+
+
+class MapClusterIndex:
+    """Cluster grids for every zoom level of a single map"""
+
+    def __init__(self, map_id: int):
+        self.map_id = map_id
+        self.built_at = time.time()
+        # event_id -> (x, y, state, is_closed)
+        self.events: Dict[int, Tuple[float, float, str, bool]] = {}
+        # grids[include_closed][zoom][(col, row)] -> cell stats
+        self.grids: Dict[bool, List[Dict[Tuple[int, int], Dict[str, float]]]] = {
+            True: [{} for _ in range(MAX_CLUSTER_ZOOM + 1)],
+            False: [{} for _ in range(MAX_CLUSTER_ZOOM + 1)],
+        }
+
+    def _apply(self, x: float, y: float, state: str, is_closed: bool, sign: int):
+        for include_closed in (True, False):
+            if is_closed and not include_closed:
+                continue
+            for zoom, grid in enumerate(self.grids[include_closed]):
+                key = _cell(x, y, zoom)
+                cell = grid.get(key)
+                if cell is None:
+                    cell = grid[key] = {"count": 0, "sum_x": 0.0, "sum_y": 0.0, "red": 0, "yellow": 0, "green": 0}
+                cell["count"] += sign
+                cell["sum_x"] += sign * x
+                cell["sum_y"] += sign * y
+                if state in STATES:
+                    cell[state] += sign
+                if cell["count"] <= 0:
+                    del grid[key]
+
+    def add(self, event_id: int, x: float, y: float, state: str, is_closed: bool):
+        if event_id in self.events:
+            self.remove(event_id)
+        self.events[event_id] = (x, y, state, is_closed)
+        self._apply(x, y, state, is_closed, 1)
+
+    def remove(self, event_id: int):
+        record = self.events.pop(event_id, None)
+        if record:
+            self._apply(*record, -1)
+
+    def clusters(
+        self,
+        zoom: int,
+        include_closed: bool,
+        bbox: Optional[Tuple[float, float, float, float]] = None
+    ) -> List[Dict[str, Any]]:
+        cell_size = MAP_SIZE / (2 ** zoom)
+        result = []
+        for (col, row), cell in self.grids[include_closed][zoom].items():
+            cell_min_x, cell_min_y = col * cell_size, row * cell_size
+            if bbox:
+                min_x, min_y, max_x, max_y = bbox
+                if (cell_min_x > max_x or cell_min_x + cell_size < min_x or
+                        cell_min_y > max_y or cell_min_y + cell_size < min_y):
+                    continue
+            count = cell["count"]
+            result.append({
+                "x": cell["sum_x"] / count,
+                "y": cell["sum_y"] / count,
+                "count": count,
+                "red": cell["red"],
+                "yellow": cell["yellow"],
+                "green": cell["green"],
+                "cell_min_x": cell_min_x,
+                "cell_min_y": cell_min_y,
+                "cell_size": cell_size,
+            })
+        return result
+
+
+_indexes: Dict[int, MapClusterIndex] = {}
+_lock = threading.Lock()
+
+
+def _build_index(db: Session, map_id: int) -> MapClusterIndex:
+    """Build the cluster grids of a map from a compact column pull"""
+    index = MapClusterIndex(map_id)
+    rows = db.query(
+        Event.id, Event.x_coordinate, Event.y_coordinate, Event.state, Event.status
+    ).filter(Event.map_id == map_id).all()
+    for event_id, x, y, state, status in rows:
+        index.add(event_id, x, y, state, status == "closed")
+    logger.info(f"Built cluster index for map {map_id} with {len(rows)} events")
+    return index
+
+
+def get_clusters(
+    db: Session,
+    map_id: int,
+    zoom: int,
+    include_closed: bool = False,
+    bbox: Optional[Tuple[float, float, float, float]] = None
+) -> List[Dict[str, Any]]:
+    """Get the event clusters of a map at a zoom level, optionally restricted to a viewport"""
+    zoom = min(max(zoom, 0), MAX_CLUSTER_ZOOM)
+    with _lock:
+        index = _indexes.get(map_id)
+        if index is None or time.time() - index.built_at > CLUSTER_INDEX_TTL:
+            index = _indexes[map_id] = _build_index(db, map_id)
+        return index.clusters(zoom, include_closed, bbox)
+
+
+def event_saved(event: Event, previous_map_id: Optional[int] = None):
+    """
+    Add or move an event in the cluster index of its map (no-op if the map is not indexed).
+    previous_map_id is the map the event was on before the save, if it was moved.
+    """
+    with _lock:
+        if previous_map_id is not None and previous_map_id != event.map_id:
+            previous_index = _indexes.get(previous_map_id)
+            if previous_index is not None:
+                previous_index.remove(event.id)
+        index = _indexes.get(event.map_id)
+        if index is not None:
+            index.add(event.id, event.x_coordinate, event.y_coordinate, event.state, event.status == "closed")
+
+
+def event_deleted(map_id: int, event_id: int):
+    """Remove an event from the cluster index of its map"""
+    with _lock:
+        index = _indexes.get(map_id)
+        if index is not None:
+            index.remove(event_id)
+
+
+def invalidate(map_id: Optional[int] = None):
+    """Drop the cluster index of a map (or of all maps) so it is rebuilt on next use"""
+    with _lock:
+        if map_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(map_id, None)
@@ -1,16 +1,18 @@
-import os
-import uuid
 from typing import List, Optional, Dict, Any
 from fastapi import UploadFile, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, func
 
 from app.models.event_comment import EventComment
 from app.models.event import Event
 from app.models.user import User
-from app.core.config import settings
 from app.services.notification import NotificationService
 from app.services import event_history
+from app.services import thumbnails
+from app.services import storage
+
+# File size limit of comment attachments (10MB, as for event attachments)
+COMMENT_ATTACHMENT_MAX_SIZE = 10 * 1024 * 1024
 
 
 def get_comment(db: Session, comment_id: int) -> Optional[EventComment]:
@@ -38,6 +40,33 @@ def get_comment_count_for_event(db: Session, event_id: int) -> int:
     return db.query(EventComment).filter(EventComment.event_id == event_id).count()
 
 
+def _adjust_comment_count(db: Session, event_id: int, delta: int) -> None:
+    """Atomically adjust the denormalized comment counter of an event (in the caller's transaction)"""
+    db.query(Event).filter(Event.id == event_id).update(
+        {Event.comment_count: Event.comment_count + delta},
+        synchronize_session=False
+    )
+
+
+def recount_comments(db: Session, event_id: Optional[int] = None) -> int:
+    """
+    Repair the denormalized comment counters from the event_comments table.
+    Recounts a single event, or every event when no event_id is given.
+    Returns the number of events updated.
+    """
+    counted = db.query(func.count(EventComment.id)).filter(
+        EventComment.event_id == Event.id
+    ).correlate(Event).scalar_subquery()
+    
+    query = db.query(Event)
+    if event_id:
+        query = query.filter(Event.id == event_id)
+    
+    updated = query.update({Event.comment_count: counted}, synchronize_session=False)
+    db.commit()
+    return updated
+
+
 async def create_comment(
     db: Session,
     event_id: int,
@@ -69,6 +98,7 @@ async def create_comment(
         project_id = event.project_id
         
         # Handle file upload if provided
+        thumbnail_source = None
         if image:
             try:
                 print(f"Processing file upload: {image.filename}")
@@ -83,101 +113,32 @@ async def create_comment(
                     print("Detected image file")
                     file_prefix = "img_"
                 
-                # Generate unique filename with appropriate prefix
-                file_extension = os.path.splitext(image.filename)[1]
-                unique_filename = f"{file_prefix}{uuid.uuid4()}{file_extension}"
-                
-                # Check if we should use Cloud Storage
-                use_cloud_storage = os.getenv("USE_CLOUD_STORAGE", "false").lower() == "true"
-                in_cloud_run = os.getenv("K_SERVICE") is not None
+                # Stream the file to the storage backend, named after its content with
+                # the appropriate prefix (a file that is already stored gets a new reference)
+                unique_filename, _ = await storage.save_file(
+                    db,
+                    image,
+                    "comments",
+                    max_size=COMMENT_ATTACHMENT_MAX_SIZE,
+                    prefix=file_prefix
+                )
                 
-                if use_cloud_storage or in_cloud_run:
-                    try:
-                        print("Using Cloud Storage for comment attachment")
-                        from app.services.storage import upload_file_to_cloud_storage
-                        
-                        # Read file content
-                        content = await image.read()
-                        
-                        # Set destination path in Cloud Storage
-                        destination_blob_name = f"comments/{unique_filename}"
-                        
-                        # Upload to Cloud Storage
-                        cloud_storage_bucket = os.getenv("CLOUD_STORAGE_BUCKET", "construction-map-storage-deep-responder-444017-h2")
-                        file_url = await upload_file_to_cloud_storage(
-                            content, 
-                            destination_blob_name, 
-                            image.content_type or "application/octet-stream"
-                        )
-                        
-                        # Store the full Cloud Storage URL
-                        db_comment.image_url = file_url
-                        db_comment.file_type = "pdf" if is_pdf else "image"
-                        print(f"File uploaded to Cloud Storage, URL set to: {file_url}")
-                    except Exception as cloud_error:
-                        print(f"Error using Cloud Storage: {str(cloud_error)}")
-                        print("Falling back to local storage")
-                        # Continue with local storage as fallback
-                        use_cloud_storage = False
+                # Set image URL and file type in database: the full Cloud Storage URL,
+                # or /comments/{filename} - FastAPI serves this from the uploads directory
+                db_comment.image_url = storage.attachment_url("comments", unique_filename)
+                db_comment.file_type = "pdf" if is_pdf else "image"
+                print(f"File saved, URL set to: {db_comment.image_url}, type: {db_comment.file_type}")
                 
-                # If not using Cloud Storage or it failed, use local storage
-                if not use_cloud_storage and not in_cloud_run:
-                    # Create uploads directory if it doesn't exist
-                    upload_dir = os.path.join(settings.UPLOAD_FOLDER, "comments")
-                    try:
-                        os.makedirs(upload_dir, exist_ok=True)
-                    except PermissionError:
-                        print(f"Cannot create comments uploads directory (read-only filesystem): {upload_dir}")
-                        # If we're on a read-only filesystem, use a temporary directory for this operation
-                        upload_dir = os.path.join("/tmp", "comments")
-                        os.makedirs(upload_dir, exist_ok=True)
-                    except OSError as e:
-                        print(f"Error creating comments uploads directory: {str(e)}")
-                        # Fall back to temporary directory
-                        upload_dir = os.path.join("/tmp", "comments")
-                        os.makedirs(upload_dir, exist_ok=True)
-                    
-                    file_path = os.path.join(upload_dir, unique_filename)
-                    print(f"Saving file to: {file_path}")
-                    
-                    # Save the file
-                    try:
-                        with open(file_path, "wb") as buffer:
-                            # If we already read the content for Cloud Storage attempt
-                            if 'content' in locals() and content:
-                                buffer.write(content)
-                            else:  
-                                content = await image.read()
-                                if not content:
-                                    print("Warning: File content is empty")
-                                buffer.write(content)
-                    except (PermissionError, OSError) as e:
-                        print(f"Error writing comment attachment file: {str(e)}")
-                        # If we're in the normal directory path and encounter an error, try the tmp path
-                        if not upload_dir.startswith("/tmp"):
-                            upload_dir = os.path.join("/tmp", "comments")
-                            os.makedirs(upload_dir, exist_ok=True)
-                            file_path = os.path.join(upload_dir, unique_filename)
-                            with open(file_path, "wb") as buffer:
-                                buffer.write(content)
-                            print(f"Successfully saved file to fallback location: {file_path}")
-                        else:
-                            # If we're already using the tmp directory and still have an error, raise it
-                            raise Exception(f"Could not save file due to filesystem error: {str(e)}")
-                    
-                    # Set image URL and file type in database
-                    # Store as /comments/{filename} - FastAPI serves this from the uploads directory
-                    relative_path = f"/comments/{unique_filename}"
-                    db_comment.image_url = relative_path
-                    db_comment.file_type = "pdf" if is_pdf else "image"
-                    print(f"File saved, URL set to: {relative_path}, type: {db_comment.file_type}")
+                if not is_pdf:
+                    thumbnail_source = unique_filename
             except Exception as img_error:
                 print(f"Error processing file: {str(img_error)}")
                 # Continue without image if there's an error
                 # This ensures the comment gets created even if file upload fails
         
-        # Add comment to database (but don't commit yet)
+        # Add comment to database (but don't commit yet) and bump the event's comment counter
         db.add(db_comment)
+        _adjust_comment_count(db, event_id, 1)
         
         # First try to flush the changes to get an ID
         try:
@@ -187,22 +148,25 @@ async def create_comment(
             # Try to record comment creation in event history (before commit)
             # If this fails, we can still continue and commit the comment
             try:
-                event_history.create_event_history(
-                    db=db,
-                    event_id=event_id,
-                    user_id=user_id,
-                    action_type="comment",
-                    new_value=content[:50] + ("..." if len(content) > 50 else ""),  # Truncate content for history
-                    additional_data={"comment_id": db_comment.id}
-                )
+                # In a savepoint: a failure rolls back just this part, keeping the
+                # comment, its counter update and its attachment reference
+                with db.begin_nested():
+                    event_history.create_event_history(
+                        db=db,
+                        event_id=event_id,
+                        user_id=user_id,
+                        action_type="comment",
+                        new_value=content[:50] + ("..." if len(content) > 50 else ""),  # Truncate content for history
+                        additional_data={"comment_id": db_comment.id},
+                        commit=False
+                    )
             except Exception as history_error:
                 print(f"Error recording comment history (non-critical): {str(history_error)}")
-                # This error is non-critical, so we'll roll back just this part
-                # but still proceed with the comment creation
-                db.rollback()
-                
-                # Re-add the comment to the session after rollback
-                db.add(db_comment)
+            
+            # Thumbnails are generated next to the original after the commit,
+            # without blocking the request
+            if thumbnail_source:
+                thumbnails.schedule_thumbnails(db, "comments", thumbnail_source)
             
             # Now we can finally commit the comment
             db.commit()
@@ -338,18 +302,12 @@ def delete_comment(db: Session, comment_id: int) -> bool:
     if not db_comment:
         return False
     
-    # Delete image file if exists
-    if db_comment.image_url:
-        file_path = os.path.join(settings.UPLOAD_FOLDER, db_comment.image_url)
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except OSError:
-                # Log error but continue with deletion
-                pass
+    # The attachment is removed from storage after commit
+    storage.delete_attachment(db, db_comment.image_url)
     
-    # Delete from database
+    # Delete from database, decrementing the event's comment counter in the same transaction
     db.delete(db_comment)
+    _adjust_comment_count(db, db_comment.event_id, -1)
     db.commit()
     
     return True 
\ No newline at end of file
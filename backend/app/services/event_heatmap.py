@@ -0,0 +1,163 @@
+"""
+Event density heatmaps per map.
+
+A heatmap is a 2D histogram of the event coordinates of a map (percentages,
+0-100) computed with NumPy from a compact (x, y) column pull. At zoom level z
+the map is divided into a grid of HEATMAP_BASE_SIZE * 2^z cells per axis.
+
+Grids are cached per (map, include_closed, state, tag, zoom) and the cache of a
+map is dropped whenever one of its events is written. Entries also expire after
+HEATMAP_CACHE_TTL seconds so that instances pick up writes made by other
+instances, and at most HEATMAP_CACHE_MAX_ENTRIES grids are kept (least recently
+used first out).
+"""
+import io
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Any
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.event import Event
+from app.models.event_tag import EventTag
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    logging.warning("Pillow not installed. Heatmap PNG rendering will not be available.")
+
+logger = logging.getLogger("event_heatmap")
+
+HEATMAP_BASE_SIZE = 16  # cells per axis at zoom 0
+MAX_HEATMAP_ZOOM = 4  # 256 x 256 cells at the deepest level
+HEATMAP_CACHE_TTL = 300  # seconds
+HEATMAP_CACHE_MAX_ENTRIES = 256  # grids, 256 KB each at most (MAX_HEATMAP_ZOOM)
+MAP_SIZE = 100.0  # coordinates are percentages of the map size
+
+HeatmapKey = Tuple[int, bool, Optional[str], Optional[str], int]
+
+# key -> (computed at, grid), least recently used first
+_cache: "OrderedDict[HeatmapKey, Tuple[float, np.ndarray]]" = OrderedDict()
+# Bumped on every invalidation so a grid computed during a write is not cached:
+# per map, and globally when the cache of every map is dropped
+_generations: Dict[int, int] = {}
+_global_generation = 0
+_lock = threading.Lock()
+
+
+def grid_size(zoom: int) -> int:
+    return HEATMAP_BASE_SIZE * 2 ** zoom
+
+
+def _compute(
+    db: Session,
+    map_id: int,
+    zoom: int,
+    include_closed: bool,
+    state: Optional[str],
+    tag: Optional[str]
+) -> np.ndarray:
+    query = db.query(Event.x_coordinate, Event.y_coordinate).filter(Event.map_id == map_id)
+    if not include_closed:
+        query = query.filter(Event.status != "closed")
+    if state:
+        query = query.filter(Event.state == state)
+    if tag:
+        query = query.join(EventTag, EventTag.event_id == Event.id).filter(EventTag.tag == tag)
+
+    rows = query.all()
+    size = grid_size(zoom)
+    if not rows:
+        return np.zeros((size, size), dtype=np.int32)
+
+    coordinates = np.asarray(rows, dtype=np.float64)
+    np.clip(coordinates, 0.0, MAP_SIZE, out=coordinates)
+    # Rows are y, columns are x, so the grid reads like the map image
+    counts, _, _ = np.histogram2d(
+        coordinates[:, 1],
+        coordinates[:, 0],
+        bins=size,
+        range=[[0.0, MAP_SIZE], [0.0, MAP_SIZE]]
+    )
+    return counts.astype(np.int32)
+
+
+def get_heatmap(
+    db: Session,
+    map_id: int,
+    zoom: int = 0,
+    include_closed: bool = False,
+    state: Optional[str] = None,
+    tag: Optional[str] = None
+) -> np.ndarray:
+    """Get the event count grid of a map at a zoom level (rows = y, columns = x)"""
+    zoom = min(max(zoom, 0), MAX_HEATMAP_ZOOM)
+    tag = tag.strip().lower() if tag else None
+    key = (map_id, include_closed, state, tag, zoom)
+
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            if time.time() - cached[0] <= HEATMAP_CACHE_TTL:
+                _cache.move_to_end(key)
+                return cached[1]
+            del _cache[key]
+        generation = (_global_generation, _generations.get(map_id, 0))
+
+    grid = _compute(db, map_id, zoom, include_closed, state, tag)
+    with _lock:
+        if (_global_generation, _generations.get(map_id, 0)) == generation:
+            _cache[key] = (time.time(), grid)
+            _cache.move_to_end(key)
+            while len(_cache) > HEATMAP_CACHE_MAX_ENTRIES:
+                _cache.popitem(last=False)
+    return grid
+
+
+def heatmap_summary(grid: np.ndarray) -> Dict[str, Any]:
+    """Compact JSON form of a grid: row-major counts plus the maximum, for client-side rendering"""
+    return {
+        "size": int(grid.shape[0]),
+        "max": int(grid.max()) if grid.size else 0,
+        "total": int(grid.sum()),
+        "counts": grid.ravel().tolist(),
+    }
+
+
+def render_png(grid: np.ndarray) -> bytes:
+    """
+    Render a grid as a transparent PNG overlay, one pixel per cell: empty cells are
+    transparent, dense cells go from yellow to red and become more opaque.
+    """
+    if not PIL_AVAILABLE:
+        raise RuntimeError("Pillow is not installed")
+
+    peak = grid.max()
+    # Square root scaling keeps sparse areas visible next to hotspots
+    intensity = np.sqrt(grid / peak) if peak else np.zeros(grid.shape)
+    rgba = np.zeros(grid.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = 255
+    rgba[..., 1] = (255 * (1.0 - intensity)).astype(np.uint8)
+    rgba[..., 3] = np.where(grid > 0, 80 + 175 * intensity, 0).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def invalidate(map_id: Optional[int] = None):
+    """Drop the cached heatmaps of a map (or of all maps)"""
+    global _global_generation
+    with _lock:
+        if map_id is None:
+            _cache.clear()
+            _global_generation += 1
+            return
+        _generations[map_id] = _generations.get(map_id, 0) + 1
+        for key in [key for key in _cache if key[0] == map_id]:
+            del _cache[key]
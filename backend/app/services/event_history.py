@@ -14,7 +14,8 @@ def create_event_history(
     action_type: str,
     previous_value: Optional[str] = None,
     new_value: Optional[str] = None,
-    additional_data: Optional[Dict[str, Any]] = None
+    additional_data: Optional[Dict[str, Any]] = None,
+    commit: bool = True
 ) -> EventHistory:
     """
     Create a new event history record.
@@ -27,6 +28,8 @@ def create_event_history(
     - previous_value: Previous value (for changes)
     - new_value: New value (for changes)
     - additional_data: Any additional data as a JSON object
+    - commit: If False, the record is only added to the session so it is committed
+      together with the caller's changes
     
     Returns:
     - The created event history record
@@ -41,8 +44,9 @@ def create_event_history(
     )
     
     db.add(db_history)
-    db.commit()
-    db.refresh(db_history)
+    if commit:
+        db.commit()
+        db.refresh(db_history)
     return db_history
 
 
@@ -90,9 +94,9 @@ def get_event_history(
         )
         
         if newest_first:
-            query = query.order_by(desc(EventHistory.created_at))
+            query = query.order_by(desc(EventHistory.created_at), desc(EventHistory.id))
         else:
-            query = query.order_by(asc(EventHistory.created_at))
+            query = query.order_by(asc(EventHistory.created_at), asc(EventHistory.id))
         
         results = query.offset(skip).limit(limit).all()
         
@@ -168,9 +172,9 @@ def get_all_event_history(
             query = query.filter(Event.project_id == project_id)
         
         if newest_first:
-            query = query.order_by(desc(EventHistory.created_at))
+            query = query.order_by(desc(EventHistory.created_at), desc(EventHistory.id))
         else:
-            query = query.order_by(asc(EventHistory.created_at))
+            query = query.order_by(asc(EventHistory.created_at), asc(EventHistory.id))
         
         results = query.offset(skip).limit(limit).all()
         
@@ -0,0 +1,213 @@
+"""
+Full-text search over event titles, descriptions and comments.
+
+On PostgreSQL the search uses tsvector expressions backed by GIN indexes on
+events (title + description) and event_comments (content). The expressions in
+the queries below must stay identical to the indexed ones for the indexes to be
+used. On SQLite (local development, tests) the same data is mirrored into FTS5
+tables that are kept in sync by triggers; they are created together with the
+other tables (Base.metadata.create_all) and checked again at startup.
+
+Matches in the title/description of an event weigh more than matches in its
+comments; an event's rank is the sum of the ranks of all its matches.
+"""
+import re
+import logging
+from typing import List, Dict, Any
+
+from sqlalchemy import text, event as sa_event
+from sqlalchemy.orm import Session
+
+from app.db.database import Base
+from app.models.event import Event
+from app.models.user import User
+
+logger = logging.getLogger("event_search")
+
+# Relative weight of a match in the event itself compared to a match in one of its comments
+EVENT_MATCH_WEIGHT = 2.0
+
+# 'simple' configuration: no stemming, since the content is multilingual
+EVENT_DOCUMENT = "to_tsvector('simple', coalesce(e.title, '') || ' ' || coalesce(e.description, ''))"
+COMMENT_DOCUMENT = "to_tsvector('simple', coalesce(c.content, ''))"
+
+POSTGRES_SEARCH = f"""
+WITH q AS (SELECT websearch_to_tsquery('simple', :query) AS query),
+hits AS (
+    SELECT e.id AS event_id, ts_rank({EVENT_DOCUMENT}, q.query) * :event_weight AS rank
+    FROM events e, q
+    WHERE e.project_id = :project_id
+      AND {EVENT_DOCUMENT} @@ q.query
+    UNION ALL
+    SELECT c.event_id, ts_rank({COMMENT_DOCUMENT}, q.query) AS rank
+    FROM event_comments c
+    JOIN events e ON e.id = c.event_id, q
+    WHERE e.project_id = :project_id
+      AND {COMMENT_DOCUMENT} @@ q.query
+)
+SELECT event_id, SUM(rank) AS rank
+FROM hits
+GROUP BY event_id
+ORDER BY rank DESC, event_id DESC
+LIMIT :limit
+"""
+
+SQLITE_SEARCH = """
+SELECT event_id, SUM(rank) AS rank
+FROM (
+    SELECT rowid AS event_id, -bm25(event_search_fts, 2.0, 1.0, 0.0) * :event_weight AS rank
+    FROM event_search_fts
+    WHERE event_search_fts MATCH :query AND project_id = :project_id
+    UNION ALL
+    SELECT event_id, -bm25(comment_search_fts) AS rank
+    FROM comment_search_fts
+    WHERE comment_search_fts MATCH :query AND project_id = :project_id
+)
+GROUP BY event_id
+ORDER BY rank DESC, event_id DESC
+LIMIT :limit
+"""
+
+SQLITE_SETUP = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS event_search_fts USING fts5(
+        title, description, project_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS comment_search_fts USING fts5(
+        content, event_id UNINDEXED, project_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS events_search_insert AFTER INSERT ON events BEGIN
+        INSERT INTO event_search_fts (rowid, title, description, project_id)
+        VALUES (new.id, new.title, coalesce(new.description, ''), new.project_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS events_search_update AFTER UPDATE OF title, description, project_id ON events BEGIN
+        DELETE FROM event_search_fts WHERE rowid = old.id;
+        INSERT INTO event_search_fts (rowid, title, description, project_id)
+        VALUES (new.id, new.title, coalesce(new.description, ''), new.project_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS events_search_delete AFTER DELETE ON events BEGIN
+        DELETE FROM event_search_fts WHERE rowid = old.id;
+        DELETE FROM comment_search_fts WHERE event_id = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_search_insert AFTER INSERT ON event_comments BEGIN
+        INSERT INTO comment_search_fts (rowid, content, event_id, project_id)
+        SELECT new.id, new.content, new.event_id, project_id FROM events WHERE id = new.event_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_search_update AFTER UPDATE OF content ON event_comments BEGIN
+        DELETE FROM comment_search_fts WHERE rowid = old.id;
+        INSERT INTO comment_search_fts (rowid, content, event_id, project_id)
+        SELECT new.id, new.content, new.event_id, project_id FROM events WHERE id = new.event_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_search_delete AFTER DELETE ON event_comments BEGIN
+        DELETE FROM comment_search_fts WHERE rowid = old.id;
+    END""",
+]
+
+SQLITE_REBUILD = [
+    "DELETE FROM event_search_fts",
+    "DELETE FROM comment_search_fts",
+    """INSERT INTO event_search_fts (rowid, title, description, project_id)
+       SELECT id, title, coalesce(description, ''), project_id FROM events""",
+    """INSERT INTO comment_search_fts (rowid, content, event_id, project_id)
+       SELECT c.id, c.content, c.event_id, e.project_id
+       FROM event_comments c JOIN events e ON e.id = c.event_id""",
+]
+
+
+def ensure_search_index(engine) -> None:
+    """
+    Create the SQLite FTS5 tables and triggers if they are missing (no-op on PostgreSQL,
+    where the GIN indexes are part of the models and sql_fixes/add_event_search_indexes.sql).
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        _setup_sqlite(conn)
+    logger.info("SQLite full-text search index ready")
+
+
+def _setup_sqlite(conn) -> None:
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'event_search_fts'"
+    )).scalar()
+    for statement in SQLITE_SETUP:
+        conn.execute(text(statement))
+    if not exists:
+        # Index the events and comments that existed before the triggers
+        for statement in SQLITE_REBUILD:
+            conn.execute(text(statement))
+
+
+@sa_event.listens_for(Base.metadata, "after_create")
+def _create_search_index(target, connection, **kw):
+    """Create the FTS5 tables and triggers with the schema, for databases not set up by startup"""
+    if connection.dialect.name == "sqlite":
+        _setup_sqlite(connection)
+
+
+@sa_event.listens_for(Base.metadata, "after_drop")
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS event_search_fts"))
+        connection.execute(text("DROP TABLE IF EXISTS comment_search_fts"))
+
+
+def _fts5_query(query: str) -> str:
+    """Turn free text into an FTS5 query of quoted terms (all must match), so user input can't inject syntax"""
+    terms = re.findall(r"\w+", query, flags=re.UNICODE)
+    return " ".join(f'"{term}"' for term in terms)
+
+
+def search_events(
+    db: Session,
+    project_id: int,
+    query: str,
+    include_closed: bool = False,
+    limit: int = 50
+) -> List[Dict[str, Any]]:
+    """
+    Search the events of a project by title, description and comment content,
+    best matches first.
+    """
+    query = (query or "").strip()
+    params = {"project_id": project_id, "event_weight": EVENT_MATCH_WEIGHT}
+
+    if db.get_bind().dialect.name == "sqlite":
+        params["query"] = _fts5_query(query)
+        statement = SQLITE_SEARCH
+    else:
+        params["query"] = query
+        statement = POSTGRES_SEARCH
+    if not params["query"]:
+        return []
+
+    # Over-fetch a little so that hiding closed events still fills the page
+    params["limit"] = limit if include_closed else limit * 2
+    ranked = db.execute(text(statement), params).all()
+    if not ranked:
+        return []
+    ranks = {event_id: float(rank) for event_id, rank in ranked}
+
+    events_query = db.query(Event, User.username).outerjoin(
+        User, Event.created_by_user_id == User.id
+    ).filter(Event.id.in_(ranks.keys()))
+    if not include_closed:
+        events_query = events_query.filter(Event.status != "closed")
+
+    results = []
+    for event, created_by_user_name in events_query.all():
+        results.append({
+            "id": event.id,
+            "project_id": event.project_id,
+            "map_id": event.map_id,
+            "title": event.title,
+            "description": event.description,
+            "status": event.status,
+            "state": event.state,
+            "tags": event.tags or [],
+            "created_by_user_name": created_by_user_name,
+            "created_at": event.created_at,
+            "rank": ranks[event.id],
+        })
+
+    results.sort(key=lambda result: (result["rank"], result["id"]), reverse=True)
+    return results[:limit]
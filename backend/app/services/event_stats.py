@@ -0,0 +1,161 @@
+from typing import List, Optional, Dict, Any, Tuple
+from collections import Counter
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+
+from app.models.event import Event
+from app.models.event_tag import EventTag
+from app.models.event_stats import EventStats
+from app.services import tag_dictionary
+from app.services.tag_dictionary import tag_labels
+
+STAT_DIMENSIONS = ("status", "state", "tag", "creator")
+
+
+def event_stat_keys(event: Event) -> List[Tuple[str, str]]:
+    """Get the (dimension, value) counters an event contributes to"""
+    keys = [
+        ("status", event.status or "open"),
+        ("state", event.state or "green"),
+        ("creator", str(event.created_by_user_id)),
+    ]
+    # Tags are counted as written (matching ignores case, see tag_dictionary)
+    keys.extend(("tag", label) for label in sorted(tag_labels(event.tags).values()))
+    return keys
+
+
+def snapshot(event: Event) -> Dict[str, Any]:
+    """Capture the stats-relevant state of an event before it is modified"""
+    return {
+        "project_id": event.project_id,
+        "map_id": event.map_id,
+        "keys": event_stat_keys(event),
+    }
+
+
+def _upsert(db: Session, project_id: int, map_id: int, dimension: str, value: str, delta: int) -> None:
+    """Atomically add delta to a counter row, creating it if needed"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        insert = None
+    
+    if insert is not None:
+        stmt = insert(EventStats).values(
+            project_id=project_id, map_id=map_id, dimension=dimension, value=value, count=delta
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["project_id", "map_id", "dimension", "value"],
+            set_={"count": EventStats.count + delta}
+        )
+        db.execute(stmt)
+        return
+    
+    # Generic fallback for other databases
+    updated = db.query(EventStats).filter(
+        EventStats.project_id == project_id,
+        EventStats.map_id == map_id,
+        EventStats.dimension == dimension,
+        EventStats.value == value
+    ).update({EventStats.count: EventStats.count + delta}, synchronize_session=False)
+    if not updated:
+        db.add(EventStats(project_id=project_id, map_id=map_id, dimension=dimension, value=value, count=delta))
+        db.flush()
+
+
+def apply_change(db: Session, before: Optional[Dict[str, Any]], event: Optional[Event]) -> None:
+    """
+    Update the counters for an event write, in the caller's transaction.
+    
+    Parameters:
+    - before: snapshot() of the event before the write (None for a new event)
+    - event: the event after the write (None for a deleted event)
+    """
+    deltas = Counter()
+    if before:
+        for dimension, value in before["keys"]:
+            deltas[(before["project_id"], before["map_id"], dimension, value)] -= 1
+    if event is not None:
+        for dimension, value in event_stat_keys(event):
+            deltas[(event.project_id, event.map_id, dimension, value)] += 1
+    
+    # Rows are updated (and locked) in key order, so that concurrent writes moving
+    # events in opposite directions (e.g. red -> green and green -> red) cannot deadlock
+    tag_deltas: Dict[int, Counter] = {}
+    for (project_id, map_id, dimension, value), delta in sorted(deltas.items()):
+        if delta:
+            _upsert(db, project_id, map_id, dimension, value, delta)
+            if dimension == "tag":
+                tag_deltas.setdefault(project_id, Counter())[value] += delta
+    
+    # Keep the cached tag dictionaries in step once this transaction commits
+    for project_id, tags in tag_deltas.items():
+        tag_dictionary.record_tag_deltas(db, project_id, tags)
+
+
+def get_project_stats(db: Session, project_id: int) -> Dict[str, Any]:
+    """Read the materialized counters of a project, overall and per map, without touching events"""
+    rows = db.query(
+        EventStats.map_id, EventStats.dimension, EventStats.value, EventStats.count
+    ).filter(
+        EventStats.project_id == project_id,
+        EventStats.count > 0
+    ).all()
+    
+    def empty():
+        return {"total": 0, **{f"by_{dimension}": {} for dimension in STAT_DIMENSIONS}}
+    
+    project_stats = empty()
+    map_stats: Dict[int, Dict[str, Any]] = {}
+    for map_id, dimension, value, count in rows:
+        per_map = map_stats.setdefault(map_id, empty())
+        for stats in (project_stats, per_map):
+            bucket = stats[f"by_{dimension}"]
+            bucket[value] = bucket.get(value, 0) + count
+            # Every event has exactly one status, so status counters add up to the total
+            if dimension == "status":
+                stats["total"] += count
+    
+    return {"project_id": project_id, **project_stats, "maps": map_stats}
+
+
+def rebuild_stats(db: Session, project_id: Optional[int] = None) -> int:
+    """
+    Recompute the counters from the events table (repair/backfill job).
+    Returns the number of counter rows written.
+    """
+    delete_query = db.query(EventStats)
+    if project_id:
+        delete_query = delete_query.filter(EventStats.project_id == project_id)
+    delete_query.delete(synchronize_session=False)
+    
+    columns = {
+        "status": func.coalesce(Event.status, "open"),
+        "state": func.coalesce(Event.state, "green"),
+        "creator": func.cast(Event.created_by_user_id, EventStats.value.type),
+    }
+    
+    written = 0
+    for dimension, column in columns.items():
+        query = db.query(Event.project_id, Event.map_id, column, func.count(Event.id))
+        if project_id:
+            query = query.filter(Event.project_id == project_id)
+        for row_project_id, map_id, value, count in query.group_by(Event.project_id, Event.map_id, column):
+            db.add(EventStats(project_id=row_project_id, map_id=map_id, dimension=dimension, value=str(value), count=count))
+            written += 1
+    
+    tag_query = db.query(
+        Event.project_id, Event.map_id, EventTag.label, func.count(EventTag.event_id)
+    ).join(EventTag, EventTag.event_id == Event.id)
+    if project_id:
+        tag_query = tag_query.filter(Event.project_id == project_id)
+    for row_project_id, map_id, tag, count in tag_query.group_by(Event.project_id, Event.map_id, EventTag.label):
+        db.add(EventStats(project_id=row_project_id, map_id=map_id, dimension="tag", value=tag, count=count))
+        written += 1
+    
+    db.commit()
+    tag_dictionary.invalidate(project_id)
+    return written
@@ -8,7 +8,11 @@ import logging
 
 from app.models.map import Map
 from app.core.config import settings
-from app.services.storage import save_file, delete_file, get_file_url
+from app.services.storage import save_file, delete_file, get_file_url as storage_get_file_url
+from app.services import map_tiles
+
+# Limit of single-request map uploads (larger files use the resumable upload, see services/map_upload.py)
+MAX_MAP_SIZE = 20 * 1024 * 1024  # 20MB
 
 
 def get_map(db: Session, map_id: int) -> Optional[Map]:
@@ -156,7 +160,8 @@ async def create_map(
     map_type: str, 
     name: str, 
     file: UploadFile,
-    transform_data: Optional[Dict[str, Any]] = None
+    transform_data: Optional[Dict[str, Any]] = None,
+    max_size: int = MAX_MAP_SIZE
 ) -> Map:
     # Validate file type
     if file.content_type != "application/pdf":
@@ -164,12 +169,25 @@ async def create_map(
     
     # Use the storage service to save the file
     filename, file_url = await save_file(
+        db,
         upload_file=file,
         directory="maps",
         allowed_types=["application/pdf"],
-        max_size=20 * 1024 * 1024  # 20MB limit for maps
+        max_size=max_size
     )
-    
+    return register_map(db, project_id, map_type, name, filename, file_url, transform_data)
+
+
+def register_map(
+    db: Session,
+    project_id: int,
+    map_type: str,
+    name: str,
+    filename: str,
+    file_url: str,
+    transform_data: Optional[Dict[str, Any]] = None
+) -> Map:
+    """Create the map row for a file that is already stored (and referenced in this transaction)"""
     # Create map object with required fields first
     map_obj = Map(
         project_id=project_id,
@@ -191,6 +209,9 @@ async def create_map(
     db.add(map_obj)
     db.commit()
     db.refresh(map_obj)
+    
+    # Rasterize the PDF into zoomable tiles in the background
+    map_tiles.schedule_tiles(map_obj.filename)
     return map_obj
 
 
@@ -222,9 +243,9 @@ def delete_map(db: Session, map_id: int) -> bool:
     if not map_obj:
         return False
     
-    # Delete file from storage system
+    # Release the file in the storage system (deleted after commit if no other map uses it)
     try:
-        delete_file(map_obj.filename, directory="maps")
+        delete_file(db, map_obj.filename, directory="maps")
     except Exception as e:
         # Log error but continue
         print(f"Error deleting file {map_obj.filename}: {str(e)}")
@@ -245,38 +266,5 @@ def get_file_url(filename: str, directory: str = "maps") -> str:
     Returns:
         Full URL to the file in cloud storage or server
     """
-    logger = logging.getLogger("map_service")
-    
-    try:
-        # Check if running in Cloud Run environment
-        import os
-        in_cloud_run = os.getenv("K_SERVICE") is not None
-        
-        # Always use the storage service if available
-        from app.services.storage import get_file_url as storage_get_file_url
-        return storage_get_file_url(filename, directory)
-    except Exception as e:
-        logger.error(f"Error getting file URL from storage service for {filename}: {str(e)}")
-        
-        # Fallback to constructing the URL directly
-        from app.core.config import settings
-        import os
-        
-        # Check if we're using cloud storage or in Cloud Run
-        in_cloud_run = os.getenv("K_SERVICE") is not None
-        use_cloud_storage = in_cloud_run or os.getenv("USE_CLOUD_STORAGE", "false").lower() == "true"
-        cloud_storage_bucket = os.getenv("CLOUD_STORAGE_BUCKET", "servitec-map-storage")
-        
-        if use_cloud_storage or in_cloud_run:
-            # Force cloud storage in production
-            full_path = f"{directory}/{filename}" if directory else filename
-            full_path = full_path.strip("/")
-            logger.info(f"Using cloud storage URL for {filename} in bucket {cloud_storage_bucket}")
-            return f"https://storage.googleapis.com/{cloud_storage_bucket}/{full_path}"
-        else:
-            # Only use local URL in development
-            logger.info(f"Using local URL for {filename}")
-            if directory:
-                return f"/uploads/{directory}/{filename}"
-            else:
-                return f"/uploads/{filename}" 
\ No newline at end of file
+    # The storage backend decides between its public URL and this server's /uploads
+    return storage_get_file_url(filename, directory) 
\ No newline at end of file
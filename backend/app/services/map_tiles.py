@@ -0,0 +1,223 @@
+"""
+Deep-zoom tile pyramids of map PDFs.
+
+After a map is uploaded its first page is rasterized in a background thread into
+TILE_SIZE x TILE_SIZE PNG tiles: at level z the page is scaled so that its longest
+side is TILE_SIZE * 2^z pixels, from a single tile at level 0 up to the level that
+reaches MAX_TILE_DPI. The viewer can show level 0 right away and load sharper tiles
+for the visible area only, instead of downloading and rendering the whole PDF.
+
+Tiles are written through the storage service under tiles/<map file stem>/<layout>/:
+  <z>/<x>/<y>.png and manifest.json (written last)
+Map files are content-addressed, so identical uploads share their tiles. The layout
+(TILE_LAYOUT) names the rendering settings, so a given tile or manifest path always
+has the same content and can be cached as immutable; changing the rendering writes
+new paths instead of replacing files that clients may have cached. The
+manifest of a pyramid marks it as complete; pyramids that are missing (older maps,
+or a process that stopped mid-way) are generated again on first request. A failed
+generation is retried on a later request, with exponential backoff, up to
+TILE_MAX_ATTEMPTS times per process.
+"""
+import os
+import json
+import math
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Any, Callable, Set, Tuple
+
+from app.core.config import settings
+from app.services import storage
+
+try:
+    import fitz  # PyMuPDF
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+    logging.warning("PyMuPDF not installed. Map tiles will not be generated.")
+
+logger = logging.getLogger("map_tiles")
+
+TILE_SIZE = 256
+MAX_TILE_DPI = 200  # resolution of the deepest level
+MAX_TILE_LEVEL = 7  # 32768 px on the longest side
+TILES_DIRECTORY = "tiles"
+# Part of every tile path: change the version whenever the rendering changes
+TILE_LAYOUT = f"v1-{TILE_SIZE}px-{MAX_TILE_DPI}dpi-z{MAX_TILE_LEVEL}"
+MANIFEST_NAME = "manifest.json"
+TILE_MAX_ATTEMPTS = 5
+TILE_RETRY_BASE_DELAY = 30  # seconds, doubled after every failed attempt
+
+_executor: Optional[ThreadPoolExecutor] = None
+_manifests: Dict[str, Dict[str, Any]] = {}  # stem -> manifest of a complete pyramid
+_pending: Set[str] = set()  # stems being generated
+_failures: Dict[str, Tuple[int, float]] = {}  # stem -> (failed attempts, monotonic time of the next retry)
+_lock = threading.Lock()
+
+
+def _stem(map_filename: str) -> str:
+    return os.path.splitext(map_filename)[0]
+
+
+def tile_directory(map_filename: str) -> str:
+    """Directory of the tile pyramid of a map file within storage"""
+    return f"{TILES_DIRECTORY}/{_stem(map_filename)}/{TILE_LAYOUT}"
+
+
+def tile_path(map_filename: str, level: int, x: int, y: int) -> str:
+    return f"{tile_directory(map_filename)}/{level}/{x}/{y}.png"
+
+
+def render_pyramid(pdf_path: str, write_tile: Callable[[int, int, int, bytes], None]) -> Dict[str, Any]:
+    """Rasterize the first page of a PDF into tiles; returns the manifest of the pyramid"""
+    document = fitz.open(pdf_path)
+    try:
+        page = document[0]
+        page_rect = page.rect
+        longest = max(page_rect.width, page_rect.height)
+        # Levels until the longest side reaches MAX_TILE_DPI (PDF units are 1/72 inch)
+        full_size = longest * MAX_TILE_DPI / 72
+        max_level = min(max(math.ceil(math.log2(full_size / TILE_SIZE)), 0), MAX_TILE_LEVEL)
+        # Interpret the page once and render every tile from the display list
+        display_list = page.get_displaylist()
+
+        levels = []
+        for level in range(max_level + 1):
+            scale = TILE_SIZE * 2 ** level / longest
+            width = math.ceil(page_rect.width * scale)
+            height = math.ceil(page_rect.height * scale)
+            columns = math.ceil(width / TILE_SIZE)
+            rows = math.ceil(height / TILE_SIZE)
+            matrix = fitz.Matrix(scale, scale)
+            tile_extent = TILE_SIZE / scale  # tile size in page units
+            for y in range(rows):
+                for x in range(columns):
+                    clip = fitz.Rect(
+                        page_rect.x0 + x * tile_extent,
+                        page_rect.y0 + y * tile_extent,
+                        page_rect.x0 + (x + 1) * tile_extent,
+                        page_rect.y0 + (y + 1) * tile_extent
+                    ) & page_rect
+                    pixmap = display_list.get_pixmap(matrix=matrix, clip=clip, alpha=False)
+                    write_tile(level, x, y, pixmap.tobytes("png"))
+            levels.append({"level": level, "width": width, "height": height, "columns": columns, "rows": rows})
+    finally:
+        document.close()
+
+    return {
+        "tile_size": TILE_SIZE,
+        "max_level": max_level,
+        "width": levels[-1]["width"],
+        "height": levels[-1]["height"],
+        "levels": levels,
+    }
+
+
+def _generate(map_filename: str) -> None:
+    stem = _stem(map_filename)
+    manifest_path = f"{tile_directory(map_filename)}/{MANIFEST_NAME}"
+    try:
+        existing = storage.read_stored_bytes(manifest_path)
+        if existing is not None:
+            # Same file uploaded again: its tiles already exist
+            with _lock:
+                _manifests[stem] = json.loads(existing)
+                _pending.discard(stem)
+                _failures.pop(stem, None)
+            return
+
+        def write_tile(level: int, x: int, y: int, data: bytes) -> None:
+            storage.store_bytes(tile_path(map_filename, level, x, y), data, "image/png")
+
+        with storage.local_file(f"maps/{map_filename}") as pdf_path:
+            manifest = render_pyramid(pdf_path, write_tile)
+        storage.store_bytes(
+            manifest_path,
+            json.dumps(manifest).encode("utf-8"),
+            "application/json"
+        )
+        with _lock:
+            _manifests[stem] = manifest
+            _pending.discard(stem)
+            _failures.pop(stem, None)
+        logger.info(f"Generated tile pyramid for {map_filename} ({manifest['max_level'] + 1} levels)")
+    except Exception as e:
+        with _lock:
+            attempts = _failures.get(stem, (0, 0.0))[0] + 1
+            _failures[stem] = (attempts, time.monotonic() + TILE_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+            _pending.discard(stem)
+        logger.error(f"Error generating tiles for {map_filename} (attempt {attempts}): {str(e)}")
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(settings.TILE_WORKERS, 1),
+                thread_name_prefix="map-tiles"
+            )
+        return _executor
+
+
+def schedule_tiles(map_filename: str) -> bool:
+    """
+    Generate the tile pyramid of a map file in the background, unless it is ready,
+    already being generated, or failed recently or too often in this process.
+    Returns True if a job was started.
+    """
+    if not PYMUPDF_AVAILABLE or not map_filename.lower().endswith(".pdf"):
+        return False
+    stem = _stem(map_filename)
+    with _lock:
+        if stem in _manifests or stem in _pending:
+            return False
+        if stem in _failures:
+            attempts, retry_at = _failures[stem]
+            if attempts >= TILE_MAX_ATTEMPTS or time.monotonic() < retry_at:
+                return False
+        _pending.add(stem)
+    _get_executor().submit(_generate, map_filename)
+    return True
+
+
+def get_manifest(map_filename: str) -> Optional[Dict[str, Any]]:
+    """Manifest of the complete tile pyramid of a map file, or None if it is not ready"""
+    stem = _stem(map_filename)
+    with _lock:
+        manifest = _manifests.get(stem)
+        if manifest is not None or stem in _pending:
+            return manifest
+    # Generated by another instance or before a restart
+    data = storage.read_stored_bytes(f"{tile_directory(map_filename)}/{MANIFEST_NAME}")
+    if data is None:
+        return None
+    manifest = json.loads(data)
+    with _lock:
+        _manifests[stem] = manifest
+    return manifest
+
+
+def get_tiles_status(map_filename: str) -> str:
+    """
+    'ready', 'pending' (also while a failed generation waits to be retried), 'failed'
+    (no attempts left) or 'unavailable' (no PDF renderer installed)
+    """
+    if get_manifest(map_filename) is not None:
+        return "ready"
+    if not PYMUPDF_AVAILABLE:
+        return "unavailable"
+    with _lock:
+        attempts, _ = _failures.get(_stem(map_filename), (0, 0.0))
+    return "failed" if attempts >= TILE_MAX_ATTEMPTS else "pending"
+
+
+def remove_tiles(map_filename: str) -> None:
+    """Delete the tile pyramids (of every layout) of a map file (called when the file itself is deleted)"""
+    stem = _stem(map_filename)
+    with _lock:
+        _manifests.pop(stem, None)
+        _pending.discard(stem)
+        _failures.pop(stem, None)
+    storage.delete_stored_prefix(f"{TILES_DIRECTORY}/{stem}")
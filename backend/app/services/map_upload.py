@@ -0,0 +1,230 @@
+"""
+Resumable (chunked) map uploads.
+
+Large map PDFs can be uploaded in pieces so that a dropped connection only costs
+the chunk in flight:
+1. start_upload registers the upload with the total file size; the client splits
+   the file into chunks of upload.chunk_size bytes (the last one may be shorter)
+2. every chunk is sent with save_chunk and stored as soon as it arrives under
+   chunks/<upload id>/ in the uploads folder or bucket. Sending a chunk again
+   replaces it once the new copy is complete, and get_received_chunks tells a
+   reconnecting client which chunks the server already has
+3. complete_upload assembles the chunks in order, checks the size (and the
+   SHA-256 checksum if one was given) and creates the map from the result
+
+Uploads that are not completed expire after MAP_UPLOAD_EXPIRE_HOURS.
+"""
+import os
+import hashlib
+import logging
+import tempfile
+from uuid import uuid4
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+
+from app.core.config import settings
+from app.models.map import Map
+from app.models.map_upload import MapUpload
+from app.services import storage
+from app.services import map as map_service
+
+logger = logging.getLogger("map_upload")
+
+CHUNKS_DIRECTORY = "chunks"
+
+
+def total_chunks(upload: MapUpload) -> int:
+    return -(-upload.total_size // upload.chunk_size)
+
+
+def _expected_size(upload: MapUpload, index: int) -> int:
+    if index == total_chunks(upload) - 1:
+        return upload.total_size - index * upload.chunk_size
+    return upload.chunk_size
+
+
+def _chunk_name(index: int) -> str:
+    # Zero-padded so that listing the chunks returns them in order
+    return f"{index:05d}"
+
+
+def _chunk_prefix(upload_id: str) -> str:
+    return f"{CHUNKS_DIRECTORY}/{upload_id}/"
+
+
+def _chunk_path(upload_id: str, index: int) -> str:
+    return _chunk_prefix(upload_id) + _chunk_name(index)
+
+
+def start_upload(
+    db: Session,
+    project_id: int,
+    user_id: int,
+    map_type: str,
+    name: str,
+    filename: str,
+    total_size: int,
+    transform_data: Optional[Dict[str, Any]] = None,
+    sha256: Optional[str] = None
+) -> MapUpload:
+    """Register a new resumable map upload"""
+    if not filename.lower().endswith(".pdf"):
+        raise HTTPException(400, detail="Only PDF files are allowed")
+    if total_size <= 0:
+        raise HTTPException(400, detail="File is empty")
+    if total_size > settings.MAX_RESUMABLE_MAP_SIZE:
+        max_size_mb = settings.MAX_RESUMABLE_MAP_SIZE / (1024 * 1024)
+        raise HTTPException(400, detail=f"File size exceeds the limit of {max_size_mb:g}MB")
+
+    purge_expired_uploads(db)
+
+    upload = MapUpload(
+        id=str(uuid4()),
+        project_id=project_id,
+        user_id=user_id,
+        map_type=map_type,
+        name=name,
+        transform_data=transform_data,
+        filename=filename,
+        total_size=total_size,
+        chunk_size=settings.MAP_UPLOAD_CHUNK_SIZE,
+        sha256=sha256.lower() if sha256 else None,
+        expires_at=datetime.utcnow() + timedelta(hours=settings.MAP_UPLOAD_EXPIRE_HOURS)
+    )
+    db.add(upload)
+    db.commit()
+    db.refresh(upload)
+    logger.info(f"Started map upload {upload.id} ({total_size} bytes in {total_chunks(upload)} chunks)")
+    return upload
+
+
+def get_upload(db: Session, upload_id: str) -> Optional[MapUpload]:
+    """Get an upload in progress (None if it does not exist or has expired)"""
+    return db.query(MapUpload).filter(
+        MapUpload.id == upload_id,
+        MapUpload.expires_at > datetime.utcnow()
+    ).first()
+
+
+def get_received_chunks(upload: MapUpload) -> List[int]:
+    """Indexes of the chunks of an upload that have been stored"""
+    paths = storage.get_backend().list(_chunk_prefix(upload.id))
+    names = [path.rsplit("/", 1)[-1] for path in paths]
+    return sorted(int(name) for name in names if name.isdigit())
+
+
+async def save_chunk(upload: MapUpload, index: int, chunk: UploadFile) -> None:
+    """Store chunk number `index` of an upload, replacing it if it was already sent"""
+    count = total_chunks(upload)
+    if not 0 <= index < count:
+        raise HTTPException(400, detail=f"Chunk index must be between 0 and {count - 1}")
+    expected = _expected_size(upload, index)
+
+    # Longer chunks are rejected while they are read. The chunk is received under a
+    # temporary name (not listed as received) and only replaces a copy sent before
+    # once its size is right, so a failed resend never loses a stored chunk
+    path = _chunk_path(upload.id, index)
+    temp_path = f"{path}.{uuid4().hex}.part"
+    size, _ = await storage.save_upload(chunk, temp_path, expected, "application/octet-stream")
+    if size != expected:
+        await storage.run_io(storage.remove_stored_path, temp_path)
+        raise HTTPException(400, detail=f"Chunk {index} must be {expected} bytes, got {size}")
+    await storage.run_io(storage.move_stored_file, temp_path, path)
+
+
+def _assemble(upload: MapUpload, destination: str) -> str:
+    """Concatenate the chunks of an upload into a file; returns the SHA-256 digest of the result"""
+    digest = hashlib.sha256()
+    backend = storage.get_backend()
+    with open(destination, "wb") as out:
+        for index in range(total_chunks(upload)):
+            with backend.open_read(_chunk_path(upload.id, index)) as source:
+                while True:
+                    block = source.read(storage.UPLOAD_CHUNK_SIZE)
+                    if not block:
+                        break
+                    digest.update(block)
+                    out.write(block)
+    return digest.hexdigest()
+
+
+def _remove_chunks(upload_id: str) -> None:
+    try:
+        storage.delete_stored_prefix(_chunk_prefix(upload_id))
+    except Exception as e:
+        logger.error(f"Error removing the chunks of map upload {upload_id}: {str(e)}")
+
+
+async def complete_upload(db: Session, upload: MapUpload) -> Map:
+    """Assemble the chunks of an upload and create its map"""
+    upload_id = upload.id
+    received = set(await storage.run_io(get_received_chunks, upload))
+    missing = [index for index in range(total_chunks(upload)) if index not in received]
+    if missing:
+        raise HTTPException(400, detail=f"Missing chunks: {', '.join(str(index) for index in missing[:20])}")
+
+    fd, assembled_path = tempfile.mkstemp(suffix=".pdf", prefix="map_upload_")
+    os.close(fd)
+    try:
+        sha256 = await storage.run_io(_assemble, upload, assembled_path)
+        if os.path.getsize(assembled_path) != upload.total_size:
+            raise HTTPException(400, detail="Assembled file size does not match the upload size")
+        if upload.sha256 and sha256 != upload.sha256:
+            # No way to tell which chunk is corrupt: the upload has to start over
+            db.delete(upload)
+            db.commit()
+            await storage.run_io(_remove_chunks, upload_id)
+            raise HTTPException(400, detail="Checksum mismatch, please upload the file again")
+
+        # The upload row is deleted in the same commit as the map is created
+        db.delete(upload)
+        with open(assembled_path, "rb") as assembled:
+            file = UploadFile(
+                assembled,
+                filename=upload.filename,
+                headers=Headers({"content-type": "application/pdf"})
+            )
+            map_obj = await map_service.create_map(
+                db,
+                upload.project_id,
+                upload.map_type,
+                upload.name,
+                file,
+                upload.transform_data,
+                max_size=settings.MAX_RESUMABLE_MAP_SIZE
+            )
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        os.remove(assembled_path)
+
+    await storage.run_io(_remove_chunks, upload_id)
+    logger.info(f"Completed map upload {upload_id} as map {map_obj.id}")
+    return map_obj
+
+
+def cancel_upload(db: Session, upload: MapUpload) -> None:
+    """Discard an upload and its chunks"""
+    upload_id = upload.id
+    db.delete(upload)
+    db.commit()
+    _remove_chunks(upload_id)
+
+
+def purge_expired_uploads(db: Session) -> int:
+    """Delete the uploads that expired before being completed; returns how many were removed"""
+    expired = db.query(MapUpload.id).filter(MapUpload.expires_at <= datetime.utcnow()).all()
+    if not expired:
+        return 0
+    expired_ids = [upload_id for upload_id, in expired]
+    db.query(MapUpload).filter(MapUpload.id.in_(expired_ids)).delete(synchronize_session=False)
+    db.commit()
+    for upload_id in expired_ids:
+        _remove_chunks(upload_id)
+    logger.info(f"Purged {len(expired_ids)} expired map uploads")
+    return len(expired_ids)
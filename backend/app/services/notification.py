@@ -1,6 +1,7 @@
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
 import re
+from datetime import datetime
 
 from app.models.notification import Notification
 from app.models.user import User
@@ -8,12 +9,16 @@ from app.models.event import Event
 from app.models.user_preference import UserPreference
 from app.schemas.notification import NotificationCreate, NotificationUpdate
 from app.services.email_service import EmailService
+from app.services import side_effects
 
 
 class NotificationService:
     @staticmethod
-    def create_notification(db: Session, notification: NotificationCreate) -> Notification:
-        """Create a new notification"""
+    def create_notification(db: Session, notification: NotificationCreate, commit: bool = True) -> Notification:
+        """
+        Create a new notification.
+        With commit=False it is only added to the session, to be committed with the caller's changes.
+        """
         db_notification = Notification(
             user_id=notification.user_id,
             message=notification.message,
@@ -24,17 +29,23 @@ class NotificationService:
             read=False
         )
         db.add(db_notification)
-        db.commit()
-        db.refresh(db_notification)
+        db.flush()
         
-        # Send email notification if enabled for user
-        NotificationService.send_email_if_enabled(
-            db, 
-            notification.user_id, 
-            notification.message, 
-            notification.link
+        # Send the email notification (if enabled for the user) in the background,
+        # so a slow mail provider never holds up the request
+        side_effects.enqueue(
+            db,
+            "notification_email",
+            notification_id=db_notification.id,
+            user_id=notification.user_id,
+            message=notification.message,
+            link=notification.link
         )
         
+        if commit:
+            db.commit()
+            db.refresh(db_notification)
+        
         return db_notification
     
     @staticmethod
@@ -52,6 +63,37 @@ class NotificationService:
             Notification.read == False
         ).count()
     
+    @staticmethod
+    def email_recipient(db: Session, user_id: int) -> Optional[User]:
+        """The user, if they have an email address and email notifications enabled (the default)"""
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user or not user.email:
+            print(f"[DEBUG] User {user_id} not found or has no email address")
+            return None
+        
+        print(f"[DEBUG] User found: {user.username}, email: {user.email}")
+        
+        # Check if user has preferences set
+        preferences = db.query(UserPreference).filter(
+            UserPreference.user_id == user_id
+        ).first()
+        
+        # Create preferences if they don't exist
+        if not preferences:
+            print(f"[DEBUG] No preferences found for user {user_id}, creating default with email_notifications=True")
+            preferences = UserPreference(user_id=user_id, email_notifications=True)
+            db.add(preferences)
+            db.commit()
+            db.refresh(preferences)
+        
+        # Check if email notifications are enabled
+        if not preferences.email_notifications:
+            print(f"[DEBUG] Email notifications are disabled for user {user_id}")
+            return None
+        
+        print(f"[DEBUG] Email notifications are enabled for user {user_id}")
+        return user
+    
     @staticmethod
     def send_email_if_enabled(db: Session, user_id: int, message: str, link: str) -> bool:
         """
@@ -69,34 +111,11 @@ class NotificationService:
         try:
             print(f"[DEBUG] Attempting to send email notification to user {user_id}")
             
-            # Get user
-            user = db.query(User).filter(User.id == user_id).first()
-            if not user or not user.email:
-                print(f"[DEBUG] User {user_id} not found or has no email address")
-                return False
-            
-            print(f"[DEBUG] User found: {user.username}, email: {user.email}")
-            
-            # Check if user has preferences set
-            preferences = db.query(UserPreference).filter(
-                UserPreference.user_id == user_id
-            ).first()
-            
-            # Create preferences if they don't exist
-            if not preferences:
-                print(f"[DEBUG] No preferences found for user {user_id}, creating default with email_notifications=True")
-                preferences = UserPreference(user_id=user_id, email_notifications=True)
-                db.add(preferences)
-                db.commit()
-                db.refresh(preferences)
-            
-            # Check if email notifications are enabled
-            if not preferences.email_notifications:
-                print(f"[DEBUG] Email notifications are disabled for user {user_id}")
+            # Get user, if they want emails
+            user = NotificationService.email_recipient(db, user_id)
+            if not user:
                 return False
             
-            print(f"[DEBUG] Email notifications are enabled for user {user_id}")
-            
             # Construct full link URL
             base_url = "http://localhost:3000"  # This should come from config
             full_link = f"{base_url}{link}" if not link.startswith("http") else link
@@ -327,7 +346,8 @@ class NotificationService:
         event_id: int, 
         actor_id: int, 
         action: str, 
-        link: str
+        link: str,
+        commit: bool = True
     ) -> Optional[Notification]:
         """Notify event creator about an interaction with their event"""
         event = db.query(Event).filter(Event.id == event_id).first()
@@ -346,7 +366,7 @@ class NotificationService:
             event_id=event_id
         )
         
-        return NotificationService.create_notification(db, notification_data)
+        return NotificationService.create_notification(db, notification_data, commit)
     
     @staticmethod
     def notify_comment(
@@ -355,7 +375,8 @@ class NotificationService:
         comment_id: int, 
         commenter_id: int, 
         event_creator_id: int,
-        link: str
+        link: str,
+        commit: bool = True
     ) -> Optional[Notification]:
         """Notify event creator about a new comment"""
         if commenter_id == event_creator_id:
@@ -377,7 +398,7 @@ class NotificationService:
             comment_id=comment_id
         )
         
-        return NotificationService.create_notification(db, notification_data)
+        return NotificationService.create_notification(db, notification_data, commit)
     
     @staticmethod
     def extract_mentions(text: str) -> List[str]:
@@ -396,7 +417,8 @@ class NotificationService:
         author_id: int, 
         event_id: Optional[int] = None,
         comment_id: Optional[int] = None,
-        link: str = ""
+        link: str = "",
+        commit: bool = True
     ) -> List[Notification]:
         """Create notifications for all users mentioned in the text"""
         print(f"[DEBUG] Checking for mentions in text: '{text}'")
@@ -444,7 +466,7 @@ class NotificationService:
             
             print(f"[DEBUG] Calling create_notification with message: {message}")
             
-            notification = NotificationService.create_notification(db, notification_data)
+            notification = NotificationService.create_notification(db, notification_data, commit)
             notifications.append(notification)
             
         return notifications
@@ -456,7 +478,8 @@ class NotificationService:
         actor_id: int, 
         event_id: Optional[int] = None,
         comment_id: Optional[int] = None,
-        link: str = ""
+        link: str = "",
+        commit: bool = True
     ) -> List[Notification]:
         """Notify all admin users about an action"""
         # Skip notifying the actor if they are an admin
@@ -486,7 +509,45 @@ class NotificationService:
                 comment_id=comment_id
             )
             
-            notification = NotificationService.create_notification(db, notification_data)
+            notification = NotificationService.create_notification(db, notification_data, commit)
             notifications.append(notification)
             
-        return notifications 
\ No newline at end of file
+        return notifications
+
+
+@side_effects.handler("notification_email")
+def send_notification_email(
+    db: Session,
+    user_id: int,
+    message: str,
+    link: str,
+    notification_id: Optional[int] = None
+) -> None:
+    """
+    Background job: send the email copy of a notification.
+    The send is claimed (email_sent_at) and committed before the email goes out, so
+    a retry of the job never emails the user twice. If the email cannot be sent the
+    claim is released and the job fails, to be retried.
+    """
+    if NotificationService.email_recipient(db, user_id) is None:
+        return
+    claimed_at = None
+    if notification_id is not None:
+        claimed_at = datetime.utcnow()
+        claimed = db.query(Notification).filter(
+            Notification.id == notification_id,
+            Notification.email_sent_at.is_(None)
+        ).update({Notification.email_sent_at: claimed_at}, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            # Already sent, or the notification was deleted
+            return
+    if NotificationService.send_email_if_enabled(db, user_id, message, link):
+        return
+    if claimed_at is not None:
+        db.query(Notification).filter(
+            Notification.id == notification_id,
+            Notification.email_sent_at == claimed_at
+        ).update({Notification.email_sent_at: None}, synchronize_session=False)
+        db.commit()
+    raise RuntimeError(f"Could not send the notification email to user {user_id}")
@@ -1,6 +1,6 @@
 from typing import List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 from datetime import datetime
 
 from app.models.project import Project, ProjectUser
@@ -81,13 +81,13 @@ def delete_project(db: Session, project_id: int) -> bool:
         
         # Check for any other potential tables with project_id foreign keys
         # that might not be explicitly defined in our model relationships
-        check_query = """
-            SELECT table_name, column_name 
-            FROM information_schema.columns 
-            WHERE column_name = 'project_id' 
-            AND table_schema = 'public'
-        """
-        dependent_tables = connection.execute(text(check_query)).fetchall()
+        # (through the dialect's inspector rather than PostgreSQL's information_schema)
+        inspector = inspect(connection)
+        dependent_tables = [
+            (table_name, "project_id")
+            for table_name in inspector.get_table_names()
+            if any(column["name"] == "project_id" for column in inspector.get_columns(table_name))
+        ]
         print(f"Found dependent tables: {[table[0] for table in dependent_tables]}")
         
         # Execute DELETE statements in the correct order to maintain referential integrity
@@ -0,0 +1,218 @@
+"""
+Post-commit side effect dispatcher.
+
+Side effects of a write that the user does not have to wait for (event history,
+notifications, notification emails) are queued as rows of side_effect_jobs in the
+same transaction as the write, so they are durable exactly when the write is.
+After the commit a pool of worker threads picks them up and runs the registered
+handler of each job in its own session. Failed jobs are retried with exponential
+backoff; jobs left 'running' by a crashed process are taken over after a lease.
+
+A job runs at least once: it runs again if its process dies before the job is
+removed, so handlers must be safe to re-run. Workers use the session factory given
+to start_workers (the application passes one bound to the database of get_db).
+"""
+import logging
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Any
+
+from sqlalchemy import event as sa_event, or_, and_
+from sqlalchemy.orm import Session
+
+from app.models.side_effect_job import SideEffectJob
+
+logger = logging.getLogger("side_effects")
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 10  # seconds, doubled on every attempt
+JOB_LEASE = 300  # seconds before a 'running' job is considered abandoned
+POLL_INTERVAL = 5  # seconds between queue checks when no wake-up is received
+CLAIM_BATCH = 10
+
+_ENQUEUED_KEY = "side_effects_enqueued"
+
+_handlers: Dict[str, Callable[..., Any]] = {}
+_workers: List[threading.Thread] = []
+_wake = threading.Event()
+_stop = threading.Event()
+_session_factory: Optional[Callable[[], Session]] = None
+
+
+def handler(kind: str):
+    """Register the function that runs the jobs of a kind: fn(db, **payload)"""
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(db: Session, kind: str, **payload) -> SideEffectJob:
+    """
+    Queue a side effect in the caller's transaction. It runs after the transaction
+    commits and is discarded with it on rollback.
+    """
+    job = SideEffectJob(kind=kind, payload=payload, status="pending", attempts=0, run_after=datetime.utcnow())
+    db.add(job)
+    db.info[_ENQUEUED_KEY] = True
+    return job
+
+
+def enqueue_detached(kind: str, delay: float = 0, **payload) -> None:
+    """
+    Queue a side effect in a transaction of its own, to run in `delay` seconds at
+    the earliest. For work that must happen whatever the caller's transaction does,
+    e.g. cleaning up after it rolled back.
+    """
+    db = _get_session_factory()()
+    try:
+        job = enqueue(db, kind, **payload)
+        job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+        db.commit()
+    finally:
+        db.close()
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _wake_workers(session: Session):
+    if session.info.pop(_ENQUEUED_KEY, False):
+        _wake.set()
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _forget_enqueued(session: Session):
+    session.info.pop(_ENQUEUED_KEY, None)
+
+
+def _claim(db: Session) -> List[SideEffectJob]:
+    """Atomically mark a batch of due jobs as running and return them"""
+    now = datetime.utcnow()
+    due = or_(
+        and_(SideEffectJob.status == "pending", SideEffectJob.run_after <= now),
+        and_(SideEffectJob.status == "running", SideEffectJob.locked_at < now - timedelta(seconds=JOB_LEASE))
+    )
+    candidates = db.query(SideEffectJob.id, SideEffectJob.status).filter(due).order_by(SideEffectJob.id).limit(CLAIM_BATCH).all()
+    
+    claimed_ids = []
+    for job_id, status in candidates:
+        # Compare-and-set on the status so concurrent workers never run the same job
+        updated = db.query(SideEffectJob).filter(
+            SideEffectJob.id == job_id,
+            SideEffectJob.status == status,
+            due
+        ).update({
+            SideEffectJob.status: "running",
+            SideEffectJob.locked_at: now,
+            SideEffectJob.attempts: SideEffectJob.attempts + 1
+        }, synchronize_session=False)
+        if updated:
+            claimed_ids.append(job_id)
+    db.commit()
+    
+    if not claimed_ids:
+        return []
+    return db.query(SideEffectJob).filter(SideEffectJob.id.in_(claimed_ids)).order_by(SideEffectJob.id).all()
+
+
+def _run(session_factory: Callable[[], Session], job: SideEffectJob) -> bool:
+    """Run one claimed job in its own session; returns True if it succeeded"""
+    fn = _handlers.get(job.kind)
+    db = session_factory()
+    try:
+        if fn is None:
+            raise RuntimeError(f"No side effect handler registered for '{job.kind}'")
+        fn(db, **(job.payload or {}))
+        db.commit()
+        succeeded, error = True, None
+    except Exception as e:
+        db.rollback()
+        succeeded, error = False, f"{e}\n{traceback.format_exc()}"
+        logger.error(f"Side effect job {job.id} ({job.kind}) failed on attempt {job.attempts}: {e}")
+    finally:
+        db.close()
+    
+    db = session_factory()
+    try:
+        query = db.query(SideEffectJob).filter(SideEffectJob.id == job.id)
+        if succeeded:
+            query.delete(synchronize_session=False)
+        elif job.attempts >= MAX_ATTEMPTS:
+            query.update({SideEffectJob.status: "failed", SideEffectJob.last_error: error}, synchronize_session=False)
+        else:
+            delay = RETRY_BASE_DELAY * 2 ** (job.attempts - 1)
+            query.update({
+                SideEffectJob.status: "pending",
+                SideEffectJob.run_after: datetime.utcnow() + timedelta(seconds=delay),
+                SideEffectJob.last_error: error
+            }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    return succeeded
+
+
+def run_pending(session_factory: Optional[Callable[[], Session]] = None, max_jobs: Optional[int] = None) -> int:
+    """
+    Run due jobs in the calling thread until the queue is empty (or max_jobs ran).
+    Returns the number of jobs run. Used by the workers and by maintenance scripts.
+    """
+    session_factory = session_factory or _get_session_factory()
+    ran = 0
+    while max_jobs is None or ran < max_jobs:
+        db = session_factory()
+        try:
+            jobs = _claim(db)
+            db.expunge_all()
+        finally:
+            db.close()
+        if not jobs:
+            break
+        for job in jobs:
+            _run(session_factory, job)
+            ran += 1
+    return ran
+
+
+def _get_session_factory() -> Callable[[], Session]:
+    if _session_factory is not None:
+        return _session_factory
+    from app.db.database import SessionLocal
+    return SessionLocal
+
+
+def _worker_loop():
+    session_factory = _get_session_factory()
+    while not _stop.is_set():
+        # Clear before looking at the queue so a wake-up during the run is not lost
+        _wake.clear()
+        try:
+            ran = run_pending(session_factory, max_jobs=CLAIM_BATCH)
+        except Exception as e:
+            logger.error(f"Side effect worker error: {e}")
+            ran = 0
+        if not ran:
+            _wake.wait(POLL_INTERVAL)
+
+
+def start_workers(count: int = 2, session_factory: Optional[Callable[[], Session]] = None) -> None:
+    """Start the side effect worker threads (idempotent)"""
+    global _session_factory
+    if _workers:
+        return
+    _session_factory = session_factory
+    _stop.clear()
+    for i in range(count):
+        worker = threading.Thread(target=_worker_loop, name=f"side-effects-{i}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+    logger.info(f"Started {count} side effect workers")
+
+
+def stop_workers(timeout: float = 5.0) -> None:
+    """Stop the worker threads; unfinished jobs stay queued for the next start"""
+    _stop.set()
+    _wake.set()
+    for worker in _workers:
+        worker.join(timeout)
+    _workers.clear()
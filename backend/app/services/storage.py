@@ -1,11 +1,27 @@
 import os
+import asyncio
 import logging
-import uuid
-from typing import Optional, Tuple, BinaryIO
+import hashlib
+import tempfile
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Optional, Tuple, BinaryIO, Dict, Iterator, Any, AsyncIterator, Callable, Union
 from fastapi import UploadFile, HTTPException
-from google.cloud import storage
-from google.cloud.exceptions import GoogleCloudError
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session, SessionTransaction
 from app.core.config import settings
+from app.models.stored_file import StoredFile
+from app.services import side_effects
+from app.services.storage_backends import (
+    StorageBackend,
+    LocalStorageBackend,
+    GCSStorageBackend,
+    InMemoryStorageBackend,
+)
 
 # Initialize logger
 logger = logging.getLogger("storage_service")
@@ -13,79 +29,537 @@ logger = logging.getLogger("storage_service")
 # Check if running in Cloud Run environment
 in_cloud_run = os.getenv("K_SERVICE") is not None
 
-# Force cloud storage in Cloud Run, otherwise use environment variable
-USE_CLOUD_STORAGE = in_cloud_run or os.getenv("USE_CLOUD_STORAGE", "false").lower() == "true"
-
 # Get bucket name from environment
 CLOUD_STORAGE_BUCKET = os.getenv("CLOUD_STORAGE_BUCKET", "servitec-map-storage")
 
-logger.info(f"Storage configuration: Cloud Storage {'ENABLED' if USE_CLOUD_STORAGE else 'DISABLED'}, Bucket: {CLOUD_STORAGE_BUCKET}")
+# Uploads are copied in chunks of this size, so only one chunk per upload is held in memory
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# Storage backend, chosen once (see services/storage_backends.py)
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+# Files stored for a transaction that rolls back are deleted after this delay, unless
+# they are referenced by then (a concurrent upload of the same content may have
+# stored the same file and not committed yet)
+UNCOMMITTED_FILE_CLEANUP_DELAY = 300  # seconds
+
+_NEW_FILES_KEY = "storage_new_files"
+
+# Bounded pool for blocking storage calls made from async code
+_io_executor: Optional[ThreadPoolExecutor] = None
+_io_executor_lock = threading.Lock()
+
+def _create_backend() -> StorageBackend:
+    name = settings.STORAGE_BACKEND.lower()
+    if not name:
+        # Force cloud storage in Cloud Run, otherwise use environment variable
+        use_cloud_storage = in_cloud_run or os.getenv("USE_CLOUD_STORAGE", "false").lower() == "true"
+        name = "gcs" if use_cloud_storage else "local"
+    
+    if name == "gcs":
+        backend = GCSStorageBackend(CLOUD_STORAGE_BUCKET)
+    elif name == "local":
+        backend = LocalStorageBackend(settings.UPLOAD_FOLDER)
+    elif name == "memory":
+        backend = InMemoryStorageBackend()
+    else:
+        raise ValueError(f"Unknown storage backend: {name}")
+    
+    logger.info(f"Storage configuration: backend {backend.name}" + (f", bucket: {CLOUD_STORAGE_BUCKET}" if name == "gcs" else ""))
+    return backend
+
+def get_backend() -> StorageBackend:
+    """Get or initialize the storage backend (STORAGE_BACKEND: 'local', 'gcs' or 'memory')"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = _create_backend()
+        return _backend
+
+def set_backend(backend: StorageBackend) -> None:
+    """Replace the storage backend, e.g. with an InMemoryStorageBackend in tests"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
 
-# Initialize storage client (only if cloud storage is enabled)
-_storage_client = None
+def _get_io_executor() -> ThreadPoolExecutor:
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(
+                max_workers=max(settings.STORAGE_IO_WORKERS, 1),
+                thread_name_prefix="storage-io"
+            )
+        return _io_executor
 
-def get_storage_client():
-    """Get or initialize the storage client"""
-    global _storage_client
-    if USE_CLOUD_STORAGE and _storage_client is None:
+async def run_io(func: Callable, *args, **kwargs) -> Any:
+    """
+    Run a blocking storage call in the storage I/O pool. The event loop keeps serving
+    other requests meanwhile, and the pool bounds how many uploads run at once.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_io_executor(), functools.partial(func, *args, **kwargs))
+
+class BlobDiskCache:
+    """
+    Read-through cache of stored files on local disk, for server-side processing
+    (tile rendering, thumbnails...) with backends that do not keep files on disk,
+    without downloading them again.
+    
+    - The cache holds at most max_bytes; the least recently used files are evicted
+      first, except files that are in use (see open_local).
+    - Concurrent misses for the same object download it once: other callers wait
+      for that download (single flight).
+    - Objects are keyed by path. Stored files are never rewritten in place (they
+      are content-addressed or uniquely named), so entries do not go stale; they
+      are dropped when the file is deleted through this service.
+    - Files are kept in a private subdirectory of `directory`, created for this
+      cache, so a shared directory (or other workers' caches) is never touched.
+    """
+    
+    def __init__(self, directory: str, max_bytes: int):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="blob_cache_", dir=directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # path -> (local file, size), least recently used first
+        self._entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._pins: Dict[str, int] = {}  # local file -> number of callers using it
+        self._orphans = set()  # local files of dropped entries, removed when no longer in use
+        self._inflight: Dict[str, threading.Event] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    def _fetch(self, path: str) -> Tuple[str, int]:
+        # Every download gets its own file, so a new copy never replaces one in use
+        name = hashlib.sha256(path.encode("utf-8")).hexdigest()
+        fd, local_path = tempfile.mkstemp(prefix=f"{name}_", dir=self.directory)
+        os.close(fd)
         try:
-            _storage_client = storage.Client()
-            logger.info(f"Initialized Google Cloud Storage client")
-        except Exception as e:
-            logger.error(f"Failed to initialize Cloud Storage client: {e}")
+            get_backend().download_to(path, local_path)
+        except BaseException:
+            os.remove(local_path)
             raise
-    return _storage_client
+        return local_path, os.path.getsize(local_path)
+    
+    @staticmethod
+    def _remove(local_path: str) -> None:
+        try:
+            os.remove(local_path)
+        except OSError:
+            pass
+    
+    def _evict(self) -> None:
+        """Drop least recently used files until the cache fits its budget (lock held)"""
+        for path, (local_path, size) in list(self._entries.items()):
+            if self._size <= self.max_bytes:
+                break
+            if self._pins.get(local_path):
+                continue
+            del self._entries[path]
+            self._size -= size
+            self.evictions += 1
+            self._remove(local_path)
+    
+    def _acquire(self, path: str) -> str:
+        """Return the local copy of a file, downloading it if needed, and pin it"""
+        while True:
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry is not None:
+                    self._entries.move_to_end(path)
+                    self._pins[entry[0]] = self._pins.get(entry[0], 0) + 1
+                    self.hits += 1
+                    return entry[0]
+                flight = self._inflight.get(path)
+                if flight is None:
+                    flight = self._inflight[path] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another caller is downloading it: wait and look again
+            flight.wait()
+        
+        try:
+            local_path, size = self._fetch(path)
+            with self._lock:
+                self._entries[path] = (local_path, size)
+                self._size += size
+                self._pins[local_path] = 1
+                self._evict()
+            return local_path
+        finally:
+            with self._lock:
+                self._inflight.pop(path, None)
+            flight.set()
+    
+    def _release(self, local_path: str) -> None:
+        with self._lock:
+            count = self._pins.get(local_path, 0) - 1
+            if count > 0:
+                self._pins[local_path] = count
+                return
+            self._pins.pop(local_path, None)
+            if local_path in self._orphans:
+                self._orphans.discard(local_path)
+                self._remove(local_path)
+            self._evict()
+    
+    @contextmanager
+    def open_local(self, path: str) -> Iterator[str]:
+        """Local path of a stored file, valid (never evicted) inside the with block"""
+        local_path = self._acquire(path)
+        try:
+            yield local_path
+        finally:
+            self._release(local_path)
+    
+    def invalidate(self, path: str) -> None:
+        """Forget a cached object and every object under it (when it is deleted)"""
+        with self._lock:
+            prefix = f"{path.rstrip('/')}/"
+            for cached_path in [p for p in self._entries if p == path or p.startswith(prefix)]:
+                local_path, size = self._entries.pop(cached_path)
+                self._size -= size
+                if self._pins.get(local_path):
+                    # Removed by the last caller using it
+                    self._orphans.add(local_path)
+                else:
+                    self._remove(local_path)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_blob_cache: Optional[BlobDiskCache] = None
+_blob_cache_lock = threading.Lock()
+
+def get_blob_cache() -> BlobDiskCache:
+    """Get or initialize the local disk cache of stored files"""
+    global _blob_cache
+    with _blob_cache_lock:
+        if _blob_cache is None:
+            _blob_cache = BlobDiskCache(settings.BLOB_CACHE_DIR, settings.BLOB_CACHE_MAX_BYTES)
+        return _blob_cache
+
+def uses_blob_cache() -> bool:
+    """Whether stored files are processed through the disk cache (backends without local files)"""
+    return get_backend().local_path("") is None
 
-async def upload_file_to_cloud_storage(
-    file_content: bytes, 
-    destination_blob_name: str, 
-    content_type: str
-) -> str:
+def _invalidate_cached(path: str) -> None:
+    if _blob_cache is not None:
+        _blob_cache.invalidate(path)
+
+@contextmanager
+def local_file(path: str) -> Iterator[str]:
+    """
+    Local path of a stored file, for processing it on the server. With backends that
+    do not keep files on disk the file comes from the read-through disk cache; the
+    path is only valid inside the with block.
+    """
+    local_path = get_backend().local_path(path)
+    if local_path is not None:
+        yield local_path
+    else:
+        with get_blob_cache().open_local(path) as cached_path:
+            yield cached_path
+
+async def _read_chunks(upload_file: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+async def stream_upload(
+    upload: Union[UploadFile, AsyncIterator[bytes]], 
+    destination: BinaryIO, 
+    max_size: int
+) -> Tuple[int, str]:
+    """
+    Copy an upload (an UploadFile or a stream of chunks, e.g. a request body) into a
+    file chunk by chunk, hashing it on the way.
+    Raises a 400 as soon as more than max_size bytes have been read.
+    
+    Returns:
+        Tuple of (size in bytes, SHA-256 hex digest)
     """
-    Uploads a file to the cloud storage bucket.
-    Returns the public URL of the uploaded file.
+    chunks = _read_chunks(upload) if hasattr(upload, "read") else upload
+    digest = hashlib.sha256()
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > max_size:
+            max_size_mb = max_size / (1024 * 1024)
+            raise HTTPException(400, detail=f"File size exceeds the limit of {max_size_mb:g}MB")
+        digest.update(chunk)
+        destination.write(chunk)
+    return size, digest.hexdigest()
+
+async def save_upload_locally(
+    upload: Union[UploadFile, AsyncIterator[bytes]], 
+    file_path: str, 
+    max_size: int
+) -> Tuple[int, str]:
     """
-    if not USE_CLOUD_STORAGE:
-        raise ValueError("Cloud storage is not enabled")
+    Stream an upload to a local file. The data is written to a .part file of its own
+    that is renamed once complete, so a rejected or failed upload never leaves a
+    partial file and concurrent uploads to the same path never mix.
     
+    Returns:
+        Tuple of (size in bytes, SHA-256 hex digest)
+    """
+    fd, partial_path = tempfile.mkstemp(suffix=".part", dir=os.path.dirname(file_path) or None)
     try:
-        # Get the storage client
-        client = get_storage_client()
-        bucket = client.bucket(CLOUD_STORAGE_BUCKET)
-        
-        # Create a new blob and upload the file's content
-        blob = bucket.blob(destination_blob_name)
-        blob.content_type = content_type
-        
-        # Upload the file
-        blob.upload_from_string(file_content, content_type=content_type)
-        
-        logger.info(f"File {destination_blob_name} uploaded to {CLOUD_STORAGE_BUCKET}")
-        
-        # Return the public URL
-        return f"https://storage.googleapis.com/{CLOUD_STORAGE_BUCKET}/{destination_blob_name}"
+        with os.fdopen(fd, "wb") as buffer:
+            size, sha256 = await stream_upload(upload, buffer, max_size)
+        os.chmod(partial_path, 0o644)
+        os.replace(partial_path, file_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return size, sha256
+
+async def spool_upload(
+    upload: Union[UploadFile, AsyncIterator[bytes]], 
+    max_size: int, 
+    suffix: str = "",
+    directory: Optional[str] = None
+) -> Tuple[str, int, str]:
+    """
+    Stream an upload to a temporary file, e.g. before sending it to the storage backend.
+    The caller owns the temporary file and must remove (or move) it.
+    
+    Returns:
+        Tuple of (temporary file path, size in bytes, SHA-256 hex digest)
+    """
+    fd, temp_path = tempfile.mkstemp(suffix=suffix, prefix="upload_", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            size, sha256 = await stream_upload(upload, buffer, max_size)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, size, sha256
+
+async def save_upload(
+    upload: Union[UploadFile, AsyncIterator[bytes]],
+    path: str,
+    max_size: int,
+    content_type: Optional[str] = None
+) -> Tuple[int, str]:
+    """
+    Stream an upload to a path in storage, enforcing the size limit while it is read.
+    Backends with local files get it written in place; others get it from a temporary
+    file, uploaded in the storage I/O pool.
+    
+    Returns:
+        Tuple of (size in bytes, SHA-256 hex digest)
+    """
+    backend = get_backend()
+    content_type = content_type or getattr(upload, "content_type", None) or "application/octet-stream"
+    local_path = backend.local_path(path)
+    if local_path is not None:
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        return await save_upload_locally(upload, local_path, max_size)
+    
+    temp_path, size, sha256 = await spool_upload(upload, max_size, os.path.splitext(path)[1])
+    try:
+        await run_io(backend.write_file, path, temp_path, content_type, move=True)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return size, sha256
+
+def attachment_url(directory: str, filename: str) -> str:
+    """
+    URL stored for an event or comment attachment: the public URL of remote backends,
+    otherwise /<directory>/<filename> (served by the /events and /comments mounts)
+    """
+    backend = get_backend()
+    if backend.remote:
+        return backend.public_url(_storage_path(filename, directory))
+    return f"/{directory.strip('/')}/{filename}"
+
+def attachment_path(image_url: Optional[str]) -> Optional[str]:
+    """
+    Storage path of an event or comment attachment from its stored URL (as returned
+    by attachment_url, or a legacy 'events/<name>'), None if it is not in storage
+    """
+    if not image_url:
+        return None
+    url = image_url.split("?", 1)[0]
+    backend = get_backend()
+    remote_prefix = backend.public_url("")
+    if backend.remote and url.startswith(remote_prefix):
+        path = url[len(remote_prefix):]
+    else:
+        path = url.lstrip("/")
+    directory, _, name = path.rpartition("/")
+    if directory not in ("events", "comments") or name in ("", ".", ".."):
+        return None
+    return path
+
+def delete_attachment(db: Session, image_url: Optional[str]) -> None:
+    """
+    Release the reference of an event or comment to its attachment (in the caller's
+    transaction); the last one deletes the attachment and its thumbnails, as delete_file
+    """
+    path = attachment_path(image_url)
+    if path is None:
+        return
+    directory, _, filename = path.rpartition("/")
+    delete_file(db, filename, directory)
+
+def store_bytes(path: str, data: bytes, content_type: str) -> None:
+    """Write generated content (thumbnails, tiles...) to a path in storage (blocking)"""
+    get_backend().write_bytes(path, data, content_type)
+
+def read_stored_bytes(path: str) -> Optional[bytes]:
+    """Read a file from storage (blocking); None if it does not exist"""
+    return get_backend().read_bytes(path)
+
+def delete_stored_prefix(prefix: str) -> None:
+    """Delete every file under a directory of storage (blocking)"""
+    prefix = prefix.strip("/")
+    get_backend().delete_prefix(prefix)
+    _invalidate_cached(prefix)
+
+def signed_upload_url(
+    path: str, content_type: str, max_size: int, expires_delta: timedelta
+) -> Optional[Tuple[str, Dict[str, str]]]:
+    """
+    Signed URL with which a client can PUT a file straight to the backend (blocking),
+    with the headers it must send. None if the backend does not support it.
+    """
+    return get_backend().signed_upload_url(path, content_type, max_size, expires_delta)
+
+def stored_file_digest(path: str) -> Optional[Tuple[int, str]]:
+    """Size and SHA-256 hex digest of a file in storage (blocking); None if it does not exist"""
+    try:
+        source = get_backend().open_read(path)
+    except FileNotFoundError:
+        return None
+    
+    digest = hashlib.sha256()
+    size = 0
+    with source:
+        for block in iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(block)
+            size += len(block)
+    return size, digest.hexdigest()
+
+def copy_stored_file(source_path: str, destination_path: str) -> None:
+    """Copy a file within storage (blocking); remote backends copy it server side"""
+    get_backend().copy(source_path, destination_path)
+    _invalidate_cached(destination_path)
+
+def move_stored_file(source_path: str, destination_path: str) -> None:
+    """Rename a file within storage, replacing the destination (blocking)"""
+    get_backend().move(source_path, destination_path)
+    _invalidate_cached(source_path)
+    _invalidate_cached(destination_path)
+
+def remove_stored_path(path: str) -> None:
+    """Delete a file from storage if it exists (blocking)"""
+    get_backend().delete(path)
+    _invalidate_cached(path)
+
+def _storage_path(filename: str, directory: str = "") -> str:
+    """Path of a file within the uploads folder or bucket, without leading/trailing slashes"""
+    directory = directory.strip("/")
+    return f"{directory}/{filename}" if directory else filename
+
+def _is_stored(db: Session, path: str) -> bool:
+    """Whether a content-addressed file is already stored and referenced"""
+    ref_count = db.query(StoredFile.ref_count).filter(StoredFile.path == path).with_for_update().scalar()
+    return bool(ref_count)
+
+def _track_new_file(db: Session, path: str) -> None:
+    """Remember a file stored for the caller's transaction, so that it is removed if the transaction rolls back"""
+    db.info.setdefault(_NEW_FILES_KEY, set()).add(path)
+
+@sa_event.listens_for(Session, "after_commit")
+def _keep_new_files(session: Session):
+    session.info.pop(_NEW_FILES_KEY, None)
+
+@sa_event.listens_for(Session, "after_transaction_end")
+def _remove_uncommitted_files(session: Session, transaction: SessionTransaction):
+    # Only the outermost transaction; after a commit the files were already kept
+    if transaction.parent is not None:
+        return
+    for path in session.info.pop(_NEW_FILES_KEY, ()):
+        try:
+            side_effects.enqueue_detached("delete_stored_file", UNCOMMITTED_FILE_CLEANUP_DELAY, path=path)
+        except Exception as e:
+            logger.error(f"Could not schedule the removal of uncommitted file {path}: {e}")
+
+def _add_reference(db: Session, path: str, sha256: str, size: int, content_type: str) -> None:
+    """Atomically add a reference to a stored file, creating its row if needed (in the caller's transaction)"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        insert = None
+    
+    if insert is not None:
+        stmt = insert(StoredFile).values(
+            path=path, sha256=sha256, size=size, content_type=content_type, ref_count=1
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["path"],
+            set_={"ref_count": StoredFile.ref_count + 1}
+        )
+        db.execute(stmt)
+        return
     
-    except GoogleCloudError as e:
-        logger.error(f"Google Cloud Storage error: {e}")
-        raise HTTPException(status_code=500, detail=f"Cloud storage error: {str(e)}")
-    except Exception as e:
-        logger.error(f"Unexpected error uploading to cloud storage: {e}")
-        raise HTTPException(status_code=500, detail=f"Upload error: {str(e)}")
+    # Generic fallback for other databases
+    stored = db.query(StoredFile).filter(StoredFile.path == path).with_for_update().first()
+    if stored is None:
+        db.add(StoredFile(path=path, sha256=sha256, size=size, content_type=content_type, ref_count=1))
+    else:
+        stored.ref_count += 1
 
 async def save_file(
+    db: Session,
     upload_file: UploadFile, 
     directory: str = "", 
     allowed_types: Optional[list] = None,
-    max_size: int = 10 * 1024 * 1024  # 10MB default
+    max_size: int = 10 * 1024 * 1024,  # 10MB default
+    prefix: str = "",
+    extension: Optional[str] = None
 ) -> Tuple[str, str]:
     """
-    Save a file to either local filesystem or cloud storage.
+    Save a file to the storage backend.
+    
+    Files are content-addressed: they are named after the SHA-256 digest of their
+    content, so uploading a file that is already stored only adds a reference to it
+    (in the caller's transaction) instead of storing a second copy. A file stored
+    for a transaction that rolls back is deleted again in the background.
     
     Args:
+        db: Session in which the reference to the file is recorded
         upload_file: The uploaded file
         directory: Subdirectory within the uploads folder or cloud storage bucket
         allowed_types: List of allowed content types (e.g., ['application/pdf', 'image/jpeg'])
         max_size: Maximum file size in bytes
+        prefix: Prepended to the digest in the file name (e.g. 'img_' for attachments)
+        extension: File extension, by default from the original file name or content type
     
     Returns:
         Tuple of (filename, file_url)
@@ -95,17 +569,9 @@ async def save_file(
         allowed_types_str = ", ".join(allowed_types)
         raise HTTPException(400, detail=f"Only {allowed_types_str} files are allowed")
     
-    # Read file content
-    content = await upload_file.read()
-    
-    # Check file size
-    if len(content) > max_size:
-        max_size_mb = max_size / (1024 * 1024)
-        raise HTTPException(400, detail=f"File size exceeds the limit of {max_size_mb}MB")
-    
-    # Generate a unique filename with proper extension
+    # Determine the file extension
     original_filename = upload_file.filename
-    ext = os.path.splitext(original_filename)[1] if original_filename else ""
+    ext = extension or (os.path.splitext(original_filename)[1].lower() if original_filename else "")
     if not ext and upload_file.content_type:
         # Try to get extension from content type
         if upload_file.content_type == "application/pdf":
@@ -118,112 +584,125 @@ async def save_file(
     if not ext:
         ext = ".bin"
     
-    # Create unique filename
-    unique_id = str(uuid.uuid4())
-    filename = f"{unique_id}{ext}"
-    
-    # Add directory prefix if provided
-    if directory:
-        # Ensure directory doesn't have leading/trailing slashes for cloud storage
-        directory = directory.strip("/")
-        full_filename = f"{directory}/{filename}" if directory else filename
-    else:
-        full_filename = filename
-    
-    # Reset file position to start for reading again if needed
-    await upload_file.seek(0)
+    directory = directory.strip("/")
+    content_type = upload_file.content_type or "application/octet-stream"
+    backend = get_backend()
     
-    if USE_CLOUD_STORAGE:
-        logger.info(f"Uploading file {filename} to cloud storage")
-        try:
-            # Upload to Cloud Storage
-            file_url = await upload_file_to_cloud_storage(
-                content,
-                full_filename,
-                upload_file.content_type or "application/octet-stream"
-            )
-            return filename, file_url
-        except Exception as e:
-            logger.error(f"Cloud storage upload failed, falling back to local: {e}")
-            # Fall back to local storage if cloud storage fails
+    try:
+        # The size limit is enforced while spooling, before anything is stored. The spool
+        # file is private (never in the served uploads folder) until it is complete
+        temp_path, size, sha256 = await spool_upload(upload_file, max_size, ".part")
+    except (PermissionError, OSError) as e:
+        logger.error(f"Error saving file: {e}")
+        raise HTTPException(500, detail=f"Could not save file: {str(e)}")
     
-    # Local storage fallback or primary method if cloud storage is disabled
+    filename = f"{prefix}{sha256}{ext}"
+    full_filename = _storage_path(filename, directory)
     try:
-        # Ensure the upload directory exists
-        upload_dir = os.path.join(settings.UPLOAD_FOLDER, directory)
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Local file path
-        filepath = os.path.join(upload_dir, filename)
-        
-        # Write the file
-        with open(filepath, "wb") as buffer:
-            buffer.write(content)
-        
-        logger.info(f"File saved locally at {filepath}")
-        
-        # For local storage, construct a URL based on the filename
-        if directory:
-            # Include directory in the path
-            file_url = f"/uploads/{directory}/{filename}"
+        if _is_stored(db, full_filename) and await run_io(backend.exists, full_filename):
+            logger.info(f"File {full_filename} is already stored, adding a reference")
         else:
-            file_url = f"/uploads/{filename}"
-        
-        return filename, file_url
-    
+            await run_io(backend.write_file, full_filename, temp_path, content_type, move=True)
+            _track_new_file(db, full_filename)
+            logger.info(f"File {full_filename} stored ({size} bytes)")
+        _add_reference(db, full_filename, sha256, size, content_type)
     except (PermissionError, OSError) as e:
-        logger.error(f"Error saving file locally: {e}")
+        logger.error(f"Error saving file: {e}")
         raise HTTPException(500, detail=f"Could not save file: {str(e)}")
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    
+    return filename, backend.public_url(full_filename)
 
-async def delete_file(filename: str, directory: str = ""):
-    """Delete a file from storage"""
-    if USE_CLOUD_STORAGE:
-        try:
-            # Delete from Cloud Storage
-            client = get_storage_client()
-            bucket = client.bucket(CLOUD_STORAGE_BUCKET)
-            
-            # Combine directory and filename
-            full_path = f"{directory}/{filename}" if directory else filename
-            blob = bucket.blob(full_path.strip("/"))
-            
-            # Check if the blob exists
-            if blob.exists():
-                blob.delete()
-                logger.info(f"Deleted file {full_path} from cloud storage")
-            else:
-                logger.warning(f"File {full_path} not found in cloud storage")
-        except Exception as e:
-            logger.error(f"Error deleting file from cloud storage: {e}")
+async def adopt_file(
+    db: Session,
+    path: str,
+    sha256: str,
+    size: int,
+    directory: str,
+    content_type: str,
+    prefix: str = ""
+) -> Tuple[str, str]:
+    """
+    Copy a file that was uploaded straight to storage to its content-addressed name in
+    `directory`, after `prefix` (unless that content is already stored) and add a reference to it in
+    the caller's transaction, as save_file does for uploads received by the API. Only the
+    copy runs in the I/O threadpool; the session is used on the calling thread.
+    The uploaded file is left in place: the caller removes it once the transaction
+    has committed, so that a failed commit can be retried.
+    
+    Returns:
+        Tuple of (filename, file_url)
+    """
+    directory = directory.strip("/")
+    ext = os.path.splitext(path)[1].lower() or ".bin"
+    filename = f"{prefix}{sha256}{ext}"
+    full_filename = _storage_path(filename, directory)
+    
+    if _is_stored(db, full_filename):
+        logger.info(f"File {full_filename} is already stored, adding a reference")
     else:
-        # Delete from local filesystem
-        try:
-            local_path = os.path.join(settings.UPLOAD_FOLDER, directory, filename)
-            if os.path.exists(local_path):
-                os.remove(local_path)
-                logger.info(f"Deleted local file {local_path}")
-            else:
-                logger.warning(f"Local file {local_path} not found")
-        except Exception as e:
-            logger.error(f"Error deleting local file: {e}")
+        await run_io(copy_stored_file, path, full_filename)
+        _track_new_file(db, full_filename)
+    _add_reference(db, full_filename, sha256, size, content_type)
+    return filename, get_backend().public_url(full_filename)
+
+def delete_file(db: Session, filename: str, directory: str = ""):
+    """
+    Release a reference to a stored file (in the caller's transaction). Once no
+    reference is left, the file itself is deleted in the background after commit.
+    """
+    path = _storage_path(filename, directory)
+    stored = db.query(StoredFile).filter(StoredFile.path == path).with_for_update().first()
+    if stored is not None:
+        stored.ref_count -= 1
+        if stored.ref_count > 0:
+            logger.info(f"File {path} is still referenced {stored.ref_count} time(s), keeping it")
+            return
+    # Files without a row predate content addressing and have a single owner
+    side_effects.enqueue(db, "delete_stored_file", path=path)
+
+def _remove_stored_file(path: str):
+    if get_backend().delete(path):
+        logger.info(f"Deleted file {path}")
+    else:
+        logger.warning(f"File {path} not found in storage")
+    _invalidate_cached(path)
+
+@side_effects.handler("delete_stored_file")
+def delete_stored_file(db: Session, path: str) -> None:
+    """Background job: delete a file whose last reference was released"""
+    stored = db.query(StoredFile).filter(StoredFile.path == path).with_for_update().first()
+    if stored is not None:
+        if stored.ref_count > 0:
+            # Uploaded again since the job was queued
+            return
+        db.delete(stored)
+        db.flush()
+    _remove_stored_file(path)
+    if path.startswith("maps/"):
+        # Derived tile pyramid (see services/map_tiles.py)
+        from app.services import map_tiles
+        map_tiles.remove_tiles(path[len("maps/"):])
+    elif path.startswith(("events/", "comments/")):
+        # Derived thumbnails (see services/thumbnails.py)
+        from app.services import thumbnails
+        for thumbnail_path in thumbnails.thumbnail_paths(path):
+            remove_stored_path(thumbnail_path)
 
 def get_file_url(filename: str, directory: str = ""):
-    """Get the URL for a file, either from cloud storage or local filesystem"""
+    """Get the URL for a file, either from the remote storage backend or this server"""
     if not filename:
         return None
     
-    # Cloud storage for production or if explicitly enabled
-    if USE_CLOUD_STORAGE:
-        # Combine directory and filename, ensuring no double slashes
-        full_path = f"{directory}/{filename}" if directory else filename
-        full_path = full_path.strip("/")
-        # Always use HTTPS for cloud storage
-        return f"https://storage.googleapis.com/{CLOUD_STORAGE_BUCKET}/{full_path}"
+    # Remote backends (cloud storage) serve files from their public URL
+    backend = get_backend()
+    if backend.remote:
+        return backend.public_url(_storage_path(filename, directory))
     else:
         # Local development environment
         # For local URLs, check if we have a full backend URL configured
-        from app.core.config import settings
-        
         # If we have BACKEND_URL set and it's a full URL, use it as base
         if hasattr(settings, 'BACKEND_URL') and settings.BACKEND_URL and '://' in settings.BACKEND_URL:
             base_url = settings.BACKEND_URL
@@ -0,0 +1,356 @@
+"""
+Storage backends: where uploaded and generated files are kept.
+
+Every backend stores files by path ("maps/<sha256>.pdf", "events/img_<uuid>.jpeg",
+"tiles/<stem>/0/0/0.png"...) and implements the same blocking interface. The
+storage service (services/storage.py) picks one backend at startup and runs these
+calls in its bounded I/O thread pool, so they never block the event loop.
+
+- LocalStorageBackend: files under a directory (the uploads folder, which the API
+  serves under /uploads)
+- GCSStorageBackend: objects in a Google Cloud Storage bucket, served from their
+  public URL
+- InMemoryStorageBackend: a dict, for tests and for running without any storage.
+  Its files are not served: the URLs returned for them (/uploads/..., /events/...)
+  do not resolve
+"""
+import io
+import os
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from google.cloud import storage as gcs
+    from google.cloud.exceptions import NotFound
+    GCS_AVAILABLE = True
+except ImportError:
+    GCS_AVAILABLE = False
+    logging.warning("google-cloud-storage not installed. Only local and in-memory storage are available.")
+
+logger = logging.getLogger("storage_service")
+
+COPY_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class StorageBackend:
+    """Blocking interface of a storage backend; paths never start with a slash"""
+
+    name = "base"
+    # Files are served from their public URL rather than by this API
+    remote = False
+    # Clients can upload straight to the backend (see signed_upload_url)
+    signed_uploads = False
+
+    def write_bytes(self, path: str, data: bytes, content_type: str) -> None:
+        raise NotImplementedError
+
+    def write_file(self, path: str, source_path: str, content_type: str, move: bool = False) -> None:
+        """Store a local file; with move=True the source file may be consumed"""
+        raise NotImplementedError
+
+    def open_read(self, path: str) -> BinaryIO:
+        """Open a stored file for reading; raises FileNotFoundError if it does not exist"""
+        raise NotImplementedError
+
+    def read_bytes(self, path: str) -> Optional[bytes]:
+        """Content of a stored file, None if it does not exist"""
+        try:
+            with self.open_read(path) as source:
+                return source.read()
+        except FileNotFoundError:
+            return None
+
+    def download_to(self, path: str, destination: str) -> None:
+        """Copy a stored file to a local file"""
+        with self.open_read(path) as source, open(destination, "wb") as out:
+            shutil.copyfileobj(source, out, COPY_CHUNK_SIZE)
+
+    def exists(self, path: str) -> bool:
+        raise NotImplementedError
+
+    def list(self, prefix: str) -> List[str]:
+        """Paths of the files under a directory"""
+        raise NotImplementedError
+
+    def delete(self, path: str) -> bool:
+        """Delete a file; returns False if it did not exist"""
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str) -> None:
+        """Delete every file under a directory"""
+        for path in self.list(prefix):
+            self.delete(path)
+
+    def copy(self, source: str, destination: str) -> None:
+        raise NotImplementedError
+
+    def move(self, source: str, destination: str) -> None:
+        """Rename a file, replacing the destination; raises FileNotFoundError if the source does not exist"""
+        self.copy(source, destination)
+        self.delete(source)
+
+    def local_path(self, path: str) -> Optional[str]:
+        """Path of the file on local disk, None if the backend does not keep files on disk"""
+        return None
+
+    def public_url(self, path: str) -> str:
+        return f"/uploads/{path}"
+
+    def signed_upload_url(
+        self, path: str, content_type: str, max_size: int, expires_delta: timedelta
+    ) -> Optional[Tuple[str, Dict[str, str]]]:
+        """URL and headers with which a client can PUT a file directly, None if not supported"""
+        return None
+
+
+class LocalStorageBackend(StorageBackend):
+    """Files in a local directory. Writes go through a .part file, so readers never see a partial file"""
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def local_path(self, path: str) -> str:
+        return os.path.join(self.root, path)
+
+    def _prepare(self, path: str) -> str:
+        local_path = self.local_path(path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        return local_path
+
+    @contextmanager
+    def _partial(self, path: str) -> Iterator[str]:
+        """
+        Yield a .part file to write, renamed to the path once the block completes.
+        Each write gets its own .part file, so concurrent writes of a path never mix.
+        """
+        local_path = self._prepare(path)
+        fd, partial_path = tempfile.mkstemp(suffix=".part", dir=os.path.dirname(local_path))
+        os.close(fd)
+        try:
+            yield partial_path
+            # mkstemp creates the file readable by its owner only
+            os.chmod(partial_path, 0o644)
+            os.replace(partial_path, local_path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+    def write_bytes(self, path: str, data: bytes, content_type: str) -> None:
+        with self._partial(path) as partial_path:
+            with open(partial_path, "wb") as f:
+                f.write(data)
+
+    def write_file(self, path: str, source_path: str, content_type: str, move: bool = False) -> None:
+        with self._partial(path) as partial_path:
+            if move:
+                shutil.move(source_path, partial_path)
+            else:
+                shutil.copyfile(source_path, partial_path)
+
+    def open_read(self, path: str) -> BinaryIO:
+        local_path = self.local_path(path)
+        if not os.path.isfile(local_path):
+            raise FileNotFoundError(path)
+        return open(local_path, "rb")
+
+    def exists(self, path: str) -> bool:
+        return os.path.isfile(self.local_path(path))
+
+    def list(self, prefix: str) -> List[str]:
+        prefix = prefix.strip("/")
+        directory = self.local_path(prefix)
+        paths = []
+        for dirpath, _, filenames in os.walk(directory):
+            relative = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            # In-progress writes are not listed
+            paths.extend(f"{relative}/{name}" for name in filenames if not name.endswith(".part"))
+        return sorted(paths)
+
+    def delete(self, path: str) -> bool:
+        try:
+            os.remove(self.local_path(path))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def delete_prefix(self, prefix: str) -> None:
+        shutil.rmtree(self.local_path(prefix.strip("/")), ignore_errors=True)
+
+    def copy(self, source: str, destination: str) -> None:
+        with self._partial(destination) as partial_path:
+            shutil.copyfile(self.local_path(source), partial_path)
+
+    def move(self, source: str, destination: str) -> None:
+        # Atomic: readers see either the old or the new destination file
+        os.replace(self.local_path(source), self._prepare(destination))
+
+
+class GCSStorageBackend(StorageBackend):
+    """Objects in a Google Cloud Storage bucket"""
+
+    name = "gcs"
+    remote = True
+    signed_uploads = True
+
+    def __init__(self, bucket_name: str):
+        if not GCS_AVAILABLE:
+            raise RuntimeError("google-cloud-storage is not installed")
+        self.bucket_name = bucket_name
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = gcs.Client()
+                logger.info("Initialized Google Cloud Storage client")
+            return self._client
+
+    @property
+    def bucket(self):
+        return self.client.bucket(self.bucket_name)
+
+    def write_bytes(self, path: str, data: bytes, content_type: str) -> None:
+        self.bucket.blob(path).upload_from_string(data, content_type=content_type)
+        logger.info(f"File {path} uploaded to {self.bucket_name}")
+
+    def write_file(self, path: str, source_path: str, content_type: str, move: bool = False) -> None:
+        # Files above the client's chunk threshold are sent as a resumable upload in chunks
+        self.bucket.blob(path).upload_from_filename(source_path, content_type=content_type)
+        logger.info(f"File {path} uploaded to {self.bucket_name}")
+        if move:
+            os.remove(source_path)
+
+    def open_read(self, path: str) -> BinaryIO:
+        blob = self.bucket.blob(path)
+        try:
+            blob.reload()
+        except NotFound:
+            raise FileNotFoundError(path)
+        return blob.open("rb")
+
+    def read_bytes(self, path: str) -> Optional[bytes]:
+        try:
+            return self.bucket.blob(path).download_as_bytes()
+        except NotFound:
+            return None
+
+    def download_to(self, path: str, destination: str) -> None:
+        try:
+            self.bucket.blob(path).download_to_filename(destination)
+        except NotFound:
+            raise FileNotFoundError(path)
+
+    def exists(self, path: str) -> bool:
+        return self.bucket.blob(path).exists()
+
+    def list(self, prefix: str) -> List[str]:
+        return [blob.name for blob in self.client.list_blobs(self.bucket_name, prefix=f"{prefix.strip('/')}/")]
+
+    def delete(self, path: str) -> bool:
+        try:
+            self.bucket.blob(path).delete()
+            return True
+        except NotFound:
+            return False
+
+    def delete_prefix(self, prefix: str) -> None:
+        blobs = list(self.client.list_blobs(self.bucket_name, prefix=f"{prefix.strip('/')}/"))
+        if blobs:
+            self.bucket.delete_blobs(blobs)
+
+    def copy(self, source: str, destination: str) -> None:
+        # Copied server side, the data does not go through this process
+        bucket = self.bucket
+        try:
+            bucket.copy_blob(bucket.blob(source), bucket, destination)
+        except NotFound:
+            raise FileNotFoundError(source)
+
+    def public_url(self, path: str) -> str:
+        return f"https://storage.googleapis.com/{self.bucket_name}/{path}"
+
+    def signed_upload_url(
+        self, path: str, content_type: str, max_size: int, expires_delta: timedelta
+    ) -> Tuple[str, Dict[str, str]]:
+        client = self.client
+        # Enforced by Cloud Storage: larger uploads are rejected before reaching the bucket
+        headers = {"x-goog-content-length-range": f"0,{max_size}"}
+
+        kwargs = {}
+        credentials = client._credentials
+        if not hasattr(credentials, "sign_bytes"):
+            # Cloud Run credentials have no private key: sign through the IAM API instead
+            import google.auth.transport.requests
+            credentials.refresh(google.auth.transport.requests.Request())
+            kwargs = {"service_account_email": credentials.service_account_email, "access_token": credentials.token}
+
+        url = client.bucket(self.bucket_name).blob(path).generate_signed_url(
+            version="v4",
+            expiration=expires_delta,
+            method="PUT",
+            content_type=content_type,
+            headers=headers,
+            **kwargs
+        )
+        return url, {"Content-Type": content_type, **headers}
+
+
+class InMemoryStorageBackend(StorageBackend):
+    """Files kept in memory (lost on restart), for tests. Nothing serves them, so their URLs 404"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._files: Dict[str, Tuple[bytes, str]] = {}  # path -> (content, content type)
+        self._lock = threading.Lock()
+
+    def write_bytes(self, path: str, data: bytes, content_type: str) -> None:
+        with self._lock:
+            self._files[path] = (bytes(data), content_type)
+
+    def write_file(self, path: str, source_path: str, content_type: str, move: bool = False) -> None:
+        with open(source_path, "rb") as f:
+            self.write_bytes(path, f.read(), content_type)
+        if move:
+            os.remove(source_path)
+
+    def open_read(self, path: str) -> BinaryIO:
+        with self._lock:
+            if path not in self._files:
+                raise FileNotFoundError(path)
+            return io.BytesIO(self._files[path][0])
+
+    def exists(self, path: str) -> bool:
+        with self._lock:
+            return path in self._files
+
+    def list(self, prefix: str) -> List[str]:
+        prefix = f"{prefix.strip('/')}/"
+        with self._lock:
+            return sorted(path for path in self._files if path.startswith(prefix))
+
+    def delete(self, path: str) -> bool:
+        with self._lock:
+            return self._files.pop(path, None) is not None
+
+    def copy(self, source: str, destination: str) -> None:
+        with self._lock:
+            if source not in self._files:
+                raise FileNotFoundError(source)
+            self._files[destination] = self._files[source]
+
+    def move(self, source: str, destination: str) -> None:
+        with self._lock:
+            if source not in self._files:
+                raise FileNotFoundError(source)
+            self._files[destination] = self._files.pop(source)
@@ -0,0 +1,142 @@
+"""
+In-process dictionary of the tags used in each project, with usage counts.
+
+The dictionary of a project is loaded once from the materialized event_stats
+counters and then updated incrementally: the event stats service reports tag
+count changes on the session, and they are applied here only once the
+transaction commits. Tags are kept in a case-insensitively sorted list so prefix
+lookups for autocomplete are a binary search instead of a scan of the events table.
+
+Tags are listed as written on the events; matching (filters, prefixes) ignores
+case, through normalize_tag.
+Dictionaries expire after TAG_DICTIONARY_TTL seconds so that instances also
+pick up writes made by other instances.
+"""
+import bisect
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event as sa_event, func
+from sqlalchemy.orm import Session
+
+from app.models.event_stats import EventStats
+
+TAG_DICTIONARY_TTL = 300  # seconds
+_PENDING_KEY = "pending_tag_deltas"
+
+
+def normalize_tag(tag: Any) -> str:
+    """Normalize a tag for exact, case-insensitive matching"""
+    return str(tag).strip().lower()
+
+
+def tag_labels(tags: Optional[Iterable[Any]]) -> Dict[str, str]:
+    """
+    Map the normalized tags of an event to the tag as written (the first spelling
+    when the same tag appears with different cases)
+    """
+    labels = {}
+    for tag in tags or []:
+        if tag is None:
+            continue
+        label = str(tag).strip()
+        if label:
+            labels.setdefault(label.lower(), label)
+    return labels
+
+
+def _sort_key(tag: str) -> Tuple[str, str]:
+    return (tag.lower(), tag)
+
+
+class ProjectTagDictionary:
+    """Sorted tags of a single project with their usage counts"""
+
+    def __init__(self, project_id: int, counts: Dict[str, int]):
+        self.project_id = project_id
+        self.built_at = time.time()
+        self.counts = {tag: count for tag, count in counts.items() if count > 0}
+        # (normalized tag, tag), so that prefixes match regardless of case
+        self.keys = sorted(_sort_key(tag) for tag in self.counts)
+
+    def apply(self, tag: str, delta: int):
+        count = self.counts.get(tag, 0) + delta
+        if count > 0:
+            if tag not in self.counts:
+                bisect.insort(self.keys, _sort_key(tag))
+            self.counts[tag] = count
+        elif tag in self.counts:
+            del self.counts[tag]
+            self.keys.pop(bisect.bisect_left(self.keys, _sort_key(tag)))
+
+    def lookup(self, prefix: Optional[str] = None, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Tags starting with a (normalized) prefix"""
+        if prefix:
+            start = bisect.bisect_left(self.keys, (prefix,))
+            end = bisect.bisect_left(self.keys, (prefix + "\uffff",))
+            keys = self.keys[start:end]
+        else:
+            keys = self.keys
+        if limit is not None:
+            keys = keys[:limit]
+        return [(tag, self.counts[tag]) for _, tag in keys]
+
+
+_dictionaries: Dict[int, ProjectTagDictionary] = {}
+_lock = threading.Lock()
+
+
+def _load(db: Session, project_id: int) -> ProjectTagDictionary:
+    rows = db.query(EventStats.value, func.sum(EventStats.count)).filter(
+        EventStats.project_id == project_id,
+        EventStats.dimension == "tag"
+    ).group_by(EventStats.value).all()
+    return ProjectTagDictionary(project_id, {tag: int(count or 0) for tag, count in rows})
+
+
+def get_tags(
+    db: Session,
+    project_id: int,
+    prefix: Optional[str] = None,
+    limit: Optional[int] = None
+) -> List[Tuple[str, int]]:
+    """Get the (tag, count) pairs of a project, alphabetically, optionally matching a prefix"""
+    prefix = normalize_tag(prefix) if prefix else None
+    with _lock:
+        dictionary = _dictionaries.get(project_id)
+        if dictionary is None or time.time() - dictionary.built_at > TAG_DICTIONARY_TTL:
+            dictionary = _dictionaries[project_id] = _load(db, project_id)
+        return dictionary.lookup(prefix, limit)
+
+
+def record_tag_deltas(db: Session, project_id: int, deltas: Dict[str, int]):
+    """Queue tag count changes of a project, to be applied when the session commits"""
+    pending = db.info.setdefault(_PENDING_KEY, [])
+    pending.extend((project_id, tag, delta) for tag, delta in deltas.items() if delta)
+
+
+def invalidate(project_id: Optional[int] = None):
+    """Drop the tag dictionary of a project (or of all projects) so it is reloaded on next use"""
+    with _lock:
+        if project_id is None:
+            _dictionaries.clear()
+        else:
+            _dictionaries.pop(project_id, None)
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _apply_pending(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    with _lock:
+        for project_id, tag, delta in pending:
+            dictionary = _dictionaries.get(project_id)
+            if dictionary is not None:
+                dictionary.apply(tag, delta)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,105 @@
+"""
+Thumbnails of image attachments (events and comments).
+
+When an image is uploaded, a generate_thumbnails side effect job is queued with
+the attachment, so thumbnails in THUMBNAIL_SIZES are generated by the side effect
+workers after the commit and the request does not wait for the resize. A failed
+generation is retried with the job. Each thumbnail is a JPEG stored next to the
+original (same directory in the storage backend) and named after it (see
+core/thumbnail_naming.py); thumbnails_ready is set on the event or comment once
+they are all stored, so their URLs are only advertised when they exist.
+"""
+import io
+import logging
+from typing import Dict, List, Union
+
+from sqlalchemy.orm import Session
+
+from app.core.thumbnail_naming import THUMBNAIL_SIZES, NON_IMAGE_EXTENSIONS, thumbnail_filename
+from app.models.event import Event
+from app.models.event_comment import EventComment
+from app.services import side_effects
+from app.services import storage
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    logging.warning("Pillow not installed. Image thumbnails will not be generated.")
+
+logger = logging.getLogger("thumbnails")
+
+THUMBNAIL_QUALITY = 80
+
+# Attachment directory -> model whose thumbnails_ready is set
+_ATTACHMENT_MODELS = {
+    "events": Event,
+    "comments": EventComment,
+}
+
+
+def thumbnail_paths(path: str) -> List[str]:
+    """Storage paths of the thumbnails of a stored attachment (none for non-image attachments)"""
+    if path.lower().endswith(NON_IMAGE_EXTENSIONS):
+        return []
+    directory, _, filename = path.rpartition("/")
+    return [f"{directory}/{thumbnail_filename(filename, size)}" for size in THUMBNAIL_SIZES]
+
+
+def render_thumbnails(source: Union[bytes, str]) -> Dict[str, bytes]:
+    """Resize an image (bytes or file path) to every thumbnail size; returns JPEG bytes per size name"""
+    image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    # Let the JPEG decoder downscale while decoding (much cheaper for large photos)
+    largest = max(THUMBNAIL_SIZES.values())
+    image.draft("RGB", (largest, largest))
+    # Phone photos are often stored rotated with an EXIF orientation tag
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    thumbnails = {}
+    # Largest first, each size is resized from the previous one
+    for size, box in sorted(THUMBNAIL_SIZES.items(), key=lambda item: -item[1]):
+        image.thumbnail((box, box), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+        thumbnails[size] = buffer.getvalue()
+    return thumbnails
+
+
+@side_effects.handler("generate_thumbnails")
+def generate_thumbnails(db: Session, directory: str, filename: str) -> None:
+    """Side effect job: store the thumbnails of an attachment and mark them ready"""
+    model = _ATTACHMENT_MODELS[directory]
+    attachments = db.query(model).filter(model.image_url == storage.attachment_url(directory, filename))
+    if not attachments.count():
+        # Deleted (with its attachment) before the job ran
+        return
+    
+    # Attachments are content-addressed: the same photo attached again already has them
+    path = f"{directory}/{filename}"
+    backend = storage.get_backend()
+    if not all(backend.exists(thumbnail_path) for thumbnail_path in thumbnail_paths(path)):
+        # Read through the storage backend (from the disk cache for remote backends)
+        with storage.local_file(path) as source:
+            thumbnails = render_thumbnails(source)
+        for size, data in thumbnails.items():
+            storage.store_bytes(f"{directory}/{thumbnail_filename(filename, size)}", data, "image/jpeg")
+        logger.info(f"Generated {len(thumbnails)} thumbnails for {path}")
+    attachments.update({model.thumbnails_ready: True}, synchronize_session=False)
+
+
+def schedule_thumbnails(db: Session, directory: str, filename: str) -> bool:
+    """
+    Queue the generation of the thumbnails of an uploaded image in the caller's
+    transaction; returns False when no thumbnails are generated for the file.
+
+    Parameters:
+    - directory: folder of the original in storage ('events' or 'comments')
+    - filename: stored name of the original
+    """
+    if not PIL_AVAILABLE or filename.lower().endswith(NON_IMAGE_EXTENSIONS):
+        return False
+    side_effects.enqueue(db, "generate_thumbnails", directory=directory, filename=filename)
+    return True
@@ -10,10 +10,12 @@ import sys
 import traceback
 from typing import Optional
 from fastapi.responses import FileResponse, JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 
 # Import the necessary modules using the correct paths
 from api.models import User
-from api.deps import get_db, get_current_user
+from api.deps import get_db, get_current_user, oauth2_scheme
+from app.core.static_files import signed_image_response
 from api.routes import events, maps, projects, auth, monitoring
 from api.routes.monitoring import track_request_middleware
 from api.core.logging import logger
@@ -181,9 +183,32 @@ try:
         os.makedirs("uploads/comments", exist_ok=True)
     app.mount("/comments", StaticFiles(directory="uploads/comments"), name="comments")
 
+    def _authenticate(token: str) -> User:
+        """Look up the user of a bearer token (blocking)"""
+        sessions = get_db()
+        db = next(sessions)
+        try:
+            return get_current_user(db, token)
+        finally:
+            sessions.close()
+
     # Add a dedicated route for serving event images with authentication
     @app.get("/api/v1/image/{image_path:path}")
-    async def get_image(image_path: str, current_user: User = Depends(get_current_user)):
+    async def get_image(
+        image_path: str,
+        request: Request,
+        expires: Optional[int] = None,
+        signature: Optional[str] = None
+    ):
+        # Signed URLs are verified statelessly, without decoding a token or querying the user
+        if expires is not None and signature is not None:
+            return signed_image_response(image_path, expires, signature)
+        
+        # Unsigned URLs still need a valid bearer token, checked against the database
+        # in the threadpool (the session and the user query are blocking)
+        token = await oauth2_scheme(request)
+        await run_in_threadpool(_authenticate, token)
+        
         # Check if the file exists - use the correct relative path
         file_path = os.path.join("uploads/events", image_path)
         if not os.path.exists(file_path):
@@ -0,0 +1,13 @@
+-- Denormalized comment counter on events.
+-- The comment service increments/decrements it in the same transaction as
+-- the comment insert/delete, so event lists no longer need to join and
+-- aggregate event_comments.
+
+ALTER TABLE events
+ADD COLUMN IF NOT EXISTS comment_count INTEGER NOT NULL DEFAULT 0;
+
+-- Backfill (also usable as a repair job)
+UPDATE events e
+SET comment_count = (
+    SELECT COUNT(*) FROM event_comments c WHERE c.event_id = e.id
+);
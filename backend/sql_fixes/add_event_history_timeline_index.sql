@@ -0,0 +1,5 @@
+-- Supports the closure counts of GET /projects/{id}/timeline
+-- (status changes to 'closed' within a date range).
+
+CREATE INDEX IF NOT EXISTS ix_event_history_action_value_created
+    ON event_history (action_type, new_value, created_at);
@@ -0,0 +1,10 @@
+-- Composite indexes backing keyset (cursor) pagination of event lists.
+-- Event list endpoints order by (created_at DESC, id DESC) and continue
+-- from the last row of the previous page, so these indexes let each page
+-- be answered with a single index range scan.
+
+CREATE INDEX IF NOT EXISTS ix_events_project_created_id
+    ON events (project_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS ix_events_map_created_id
+    ON events (map_id, created_at, id);
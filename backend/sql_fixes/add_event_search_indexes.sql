@@ -0,0 +1,9 @@
+-- Full-text search over event titles/descriptions and comment contents.
+-- The indexed expressions must match the ones used by services/event_search.py.
+-- CONCURRENTLY avoids blocking writes while the indexes are built on large tables.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_events_search
+    ON events USING gin (to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, '')));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_event_comments_search
+    ON event_comments USING gin (to_tsvector('simple', coalesce(content, '')));
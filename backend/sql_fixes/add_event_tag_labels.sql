@@ -0,0 +1,39 @@
+-- Keep the tags of events as written for display.
+-- event_tags.tag stays the normalized (lowercased) value used for matching;
+-- event_tags.label is the tag as written on the event (its first spelling when
+-- the event has the same tag with different cases). Tag counters in event_stats
+-- and the tag lists of projects use the label.
+-- Run after create_event_tags.sql and create_event_stats.sql.
+
+ALTER TABLE event_tags ADD COLUMN IF NOT EXISTS label VARCHAR;
+
+-- Backfill from the existing JSON tags
+UPDATE event_tags et
+SET label = l.label
+FROM (
+    SELECT DISTINCT ON (e.id, lower(trim(t.tag)))
+        e.id AS event_id, lower(trim(t.tag)) AS tag, trim(t.tag) AS label
+    FROM events e
+    CROSS JOIN LATERAL json_array_elements_text(e.tags::json) WITH ORDINALITY AS t(tag, position)
+    WHERE e.tags IS NOT NULL
+      AND json_typeof(e.tags::json) = 'array'
+      AND trim(t.tag) <> ''
+    ORDER BY e.id, lower(trim(t.tag)), t.position
+) l
+WHERE et.event_id = l.event_id
+  AND et.tag = l.tag
+  AND et.label IS NULL;
+
+-- Rows whose JSON tag could not be found keep the normalized tag
+UPDATE event_tags SET label = tag WHERE label IS NULL;
+
+ALTER TABLE event_tags ALTER COLUMN label SET NOT NULL;
+
+-- Recount the tag counters per label
+DELETE FROM event_stats WHERE dimension = 'tag';
+
+INSERT INTO event_stats (project_id, map_id, dimension, value, count)
+SELECT e.project_id, e.map_id, 'tag', t.label, COUNT(*)
+FROM event_tags t
+JOIN events e ON e.id = t.event_id
+GROUP BY e.project_id, e.map_id, t.label;
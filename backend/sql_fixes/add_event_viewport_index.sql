@@ -0,0 +1,6 @@
+-- Composite index backing viewport (bounding box) queries of map events.
+-- The map viewer only requests the events whose coordinates fall inside
+-- the visible region of a map.
+
+CREATE INDEX IF NOT EXISTS ix_events_map_xy
+    ON events (map_id, x_coordinate, y_coordinate);
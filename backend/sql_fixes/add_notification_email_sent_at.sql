@@ -0,0 +1,4 @@
+-- Marks notifications whose email copy has been sent, so that a retried
+-- notification_email side effect job never emails the user twice.
+
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS email_sent_at TIMESTAMP;
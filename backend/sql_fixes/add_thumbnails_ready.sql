@@ -0,0 +1,5 @@
+-- Marks events and comments whose image thumbnails have been generated, so
+-- thumbnail URLs are only returned once the thumbnails exist in storage.
+
+ALTER TABLE events ADD COLUMN IF NOT EXISTS thumbnails_ready BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE event_comments ADD COLUMN IF NOT EXISTS thumbnails_ready BOOLEAN NOT NULL DEFAULT FALSE;
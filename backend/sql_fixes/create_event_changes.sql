@@ -0,0 +1,15 @@
+-- Append-only change log behind GET /projects/{id}/changes.
+-- The id is the sequence token clients poll with; event_id has no foreign key
+-- so that deleted events stay in the log as tombstones.
+
+CREATE TABLE IF NOT EXISTS event_changes (
+    id SERIAL PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    map_id INTEGER NOT NULL,
+    event_id INTEGER NOT NULL,
+    action VARCHAR NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_event_changes_project_id
+    ON event_changes (project_id, id);
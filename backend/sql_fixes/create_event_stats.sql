@@ -0,0 +1,33 @@
+-- Materialized event counters per project and map.
+-- The event service keeps these rows up to date in the same transaction as
+-- event creates/updates/deletes, so GET /projects/{id}/stats never scans events.
+
+CREATE TABLE IF NOT EXISTS event_stats (
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    map_id INTEGER NOT NULL REFERENCES maps(id) ON DELETE CASCADE,
+    dimension VARCHAR NOT NULL,
+    value VARCHAR NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (project_id, map_id, dimension, value)
+);
+
+-- Backfill from the existing events
+DELETE FROM event_stats;
+
+INSERT INTO event_stats (project_id, map_id, dimension, value, count)
+SELECT project_id, map_id, 'status', COALESCE(status, 'open'), COUNT(*)
+FROM events GROUP BY project_id, map_id, COALESCE(status, 'open');
+
+INSERT INTO event_stats (project_id, map_id, dimension, value, count)
+SELECT project_id, map_id, 'state', COALESCE(state, 'green'), COUNT(*)
+FROM events GROUP BY project_id, map_id, COALESCE(state, 'green');
+
+INSERT INTO event_stats (project_id, map_id, dimension, value, count)
+SELECT project_id, map_id, 'creator', created_by_user_id::text, COUNT(*)
+FROM events GROUP BY project_id, map_id, created_by_user_id;
+
+INSERT INTO event_stats (project_id, map_id, dimension, value, count)
+SELECT e.project_id, e.map_id, 'tag', t.tag, COUNT(*)
+FROM event_tags t
+JOIN events e ON e.id = t.event_id
+GROUP BY e.project_id, e.map_id, t.tag;
@@ -0,0 +1,24 @@
+-- Normalized, indexed storage of event tags.
+-- Event.tags stays the source of truth (a JSON array); the event service
+-- mirrors it into event_tags on create/update so tag filters are exact
+-- index lookups instead of substring scans over the JSON text.
+
+CREATE TABLE IF NOT EXISTS event_tags (
+    event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+    tag VARCHAR NOT NULL,
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    PRIMARY KEY (event_id, tag)
+);
+
+CREATE INDEX IF NOT EXISTS ix_event_tags_project_tag
+    ON event_tags (project_id, tag);
+
+-- Backfill from the existing JSON tags
+INSERT INTO event_tags (event_id, tag, project_id)
+SELECT DISTINCT e.id, lower(trim(t.tag)), e.project_id
+FROM events e
+CROSS JOIN LATERAL json_array_elements_text(e.tags::json) AS t(tag)
+WHERE e.tags IS NOT NULL
+  AND json_typeof(e.tags::json) = 'array'
+  AND trim(t.tag) <> ''
+ON CONFLICT (event_id, tag) DO NOTHING;
@@ -0,0 +1,17 @@
+-- Resumable (chunked) map uploads in progress. Chunks are stored under
+-- <uploads or bucket>/chunks/<id>/ until the upload is completed or expires.
+
+CREATE TABLE IF NOT EXISTS map_uploads (
+    id VARCHAR(36) PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    map_type VARCHAR NOT NULL,
+    name VARCHAR NOT NULL,
+    transform_data JSON,
+    filename VARCHAR NOT NULL,
+    total_size INTEGER NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    sha256 VARCHAR(64),
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+    expires_at TIMESTAMP NOT NULL
+);
@@ -0,0 +1,18 @@
+-- Durable queue of post-commit side effects (event history, notifications, emails).
+-- Jobs are inserted in the same transaction as the write that causes them and
+-- processed by the side effect worker threads of the API.
+
+CREATE TABLE IF NOT EXISTS side_effect_jobs (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR NOT NULL,
+    payload JSON NOT NULL,
+    status VARCHAR NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+);
+
+CREATE INDEX IF NOT EXISTS ix_side_effect_jobs_status_run_after
+    ON side_effect_jobs (status, run_after);
@@ -0,0 +1,11 @@
+-- Reference counts of content-addressed uploads (map PDFs stored as <directory>/<sha256><ext>).
+-- Identical uploads share one file; it is deleted when its last reference is released.
+
+CREATE TABLE IF NOT EXISTS stored_files (
+    path VARCHAR PRIMARY KEY,
+    sha256 VARCHAR(64) NOT NULL,
+    size INTEGER NOT NULL,
+    content_type VARCHAR,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+);
@@ -0,0 +1,18 @@
+-- Direct-to-storage uploads in progress: the client PUTs the file to a signed URL,
+-- then completes the intent to create the map or event.
+
+CREATE TABLE IF NOT EXISTS upload_intents (
+    id VARCHAR(36) PRIMARY KEY,
+    kind VARCHAR NOT NULL,
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    object_path VARCHAR NOT NULL,
+    filename VARCHAR NOT NULL,
+    content_type VARCHAR NOT NULL,
+    size INTEGER NOT NULL,
+    data JSON,
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_upload_intents_expires_at ON upload_intents (expires_at);
@@ -1,29 +1,50 @@
+import io
 import os
+import shutil
+import tempfile
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from PIL import Image
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+
+# Store the database and uploaded files in a throwaway folder (read when the settings are imported)
+TEST_FOLDER = tempfile.mkdtemp(prefix="construction_map_tests_")
+os.environ["UPLOAD_FOLDER"] = os.path.join(TEST_FOLDER, "uploads")
 
 from app.main import app
+from app.db import database
 from app.db.database import Base, get_db
 from app.core.security import get_password_hash
 from app.models.user import User
 
 
-# Use in-memory SQLite for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Use a SQLite file for testing: unlike a shared in-memory connection, the
+# side effect workers get connections (and transactions) of their own
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(TEST_FOLDER, 'test.db')}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
+    connect_args={"check_same_thread": False, "timeout": 30},
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Code that opens its own sessions (activity logging, side effect workers...) uses the test database too
+database.SessionLocal.configure(bind=engine)
+database.engine = engine
+
+
+@pytest.fixture(scope="session", autouse=True)
+def test_folder():
+    yield TEST_FOLDER
+    engine.dispose()
+    shutil.rmtree(TEST_FOLDER, ignore_errors=True)
+
 
 @pytest.fixture(scope="session")
-def db():
+def db(test_folder):
     # Create the tables
     Base.metadata.create_all(bind=engine)
     
@@ -36,7 +57,7 @@ def db():
         username="testuser",
         email="test@example.com",
         password_hash=hashed_password,
-        role="admin",
+        is_admin=True,
         is_active=True
     )
     db.add(user)
@@ -60,11 +81,93 @@ def client(db):
     
     app.dependency_overrides[get_db] = override_get_db
     
-    # Create a test uploads directory
-    os.makedirs("./test_uploads", exist_ok=True)
-    
     with TestClient(app) as c:
         yield c
     
     # Clean up
-    app.dependency_overrides = {} 
\ No newline at end of file
+    app.dependency_overrides = {}
+
+
+def _pdf_bytes() -> bytes:
+    pdf_buffer = io.BytesIO()
+    c = canvas.Canvas(pdf_buffer, pagesize=letter)
+    c.drawString(100, 750, "Test PDF for Map Upload")
+    c.save()
+    return pdf_buffer.getvalue()
+
+
+def _image_bytes() -> bytes:
+    img_io = io.BytesIO()
+    Image.new("RGB", (100, 100), color="red").save(img_io, format="JPEG")
+    return img_io.getvalue()
+
+
+@pytest.fixture
+def sample_pdf():
+    """A one page letter-size PDF, as uploaded for maps"""
+    return io.BytesIO(_pdf_bytes())
+
+
+@pytest.fixture
+def sample_image():
+    """A 100x100 red JPEG, as attached to events"""
+    return io.BytesIO(_image_bytes())
+
+
+@pytest.fixture(scope="module")
+def auth_headers(client):
+    response = client.post(
+        "/api/v1/auth/login",
+        data={"username": "testuser", "password": "password"}
+    )
+    assert response.status_code == 200
+    token = response.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="module")
+def test_project(client, auth_headers):
+    """A project of its own for each test module"""
+    response = client.post(
+        "/api/v1/projects/",
+        json={"name": "Test Project", "description": "A test project"},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.fixture(scope="module")
+def test_map(client, auth_headers, test_project):
+    """The implantation map of the test project"""
+    response = client.post(
+        "/api/v1/maps/",
+        data={
+            "project_id": test_project["id"],
+            "map_type": "implantation",
+            "name": "Test Map"
+        },
+        files={"file": ("test.pdf", io.BytesIO(_pdf_bytes()), "application/pdf")},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.fixture
+def create_event(client, auth_headers, test_project, test_map):
+    """Create an event on the test map through the API and return it"""
+    def create(image=None, **fields):
+        data = {
+            "project_id": test_project["id"],
+            "map_id": test_map["id"],
+            "title": "Test Event",
+            "x_coordinate": 100.5,
+            "y_coordinate": 200.5,
+        }
+        data.update(fields)
+        files = {"image": image} if image else None
+        response = client.post("/api/v1/events/", data=data, files=files, headers=auth_headers)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return create
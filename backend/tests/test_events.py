@@ -1,104 +1,220 @@
 import pytest
 import io
+import time
+import hashlib
+from types import SimpleNamespace
+import numpy as np
 from PIL import Image
 from fastapi.testclient import TestClient
 
-# Reuse auth_headers fixture from test_projects.py
-from backend.tests.test_projects import auth_headers, test_project
+
+def _list_events(client: TestClient, auth_headers, project_id: int, query: str = ""):
+    response = client.get(f"/api/v1/events/?project_id={project_id}&limit=1000{query}", headers=auth_headers)
+    assert response.status_code == 200
+    return response.json()
 
 
-@pytest.fixture(scope="module")
-def sample_image():
-    """Create a sample image for testing"""
-    # Create a small test image
-    img = Image.new("RGB", (100, 100), color="red")
-    img_io = io.BytesIO()
-    img.save(img_io, format="JPEG")
-    img_io.seek(0)
-    return img_io
+def test_create_event(client: TestClient, create_event, test_project, test_map, sample_image):
+    event = create_event(
+        image=("test.jpg", sample_image, "image/jpeg"),
+        title="Test Event",
+        description="This is a test event",
+        x_coordinate=100.5,
+        y_coordinate=200.5,
+        tags='["test", "issue"]'
+    )
+    assert event["title"] == "Test Event"
+    assert event["description"] == "This is a test event"
+    assert event["project_id"] == test_project["id"]
+    assert event["map_id"] == test_map["id"]
+    assert (event["x_coordinate"], event["y_coordinate"]) == (100.5, 200.5)
+    assert event["tags"] == ["test", "issue"]
+    assert event["image_url"].startswith("/events/img_")
 
 
-def test_create_event(client: TestClient, auth_headers, test_project, sample_image):
-    # Test creating an event
+def test_create_event_on_a_map_of_another_project(client: TestClient, auth_headers, test_map):
+    response = client.post(
+        "/api/v1/projects/",
+        json={"name": "Other Project", "description": "Not the project of the map"},
+        headers=auth_headers
+    )
+    other_project = response.json()
     response = client.post(
         "/api/v1/events/",
         data={
-            "project_id": test_project["id"],
-            "title": "Test Event",
-            "description": "This is a test event",
-            "x_coordinate": 100.5,
-            "y_coordinate": 200.5,
-            "tags": '["test", "issue"]'
+            "project_id": other_project["id"],
+            "map_id": test_map["id"],
+            "title": "Misplaced Event",
+            "x_coordinate": 1.0,
+            "y_coordinate": 1.0
         },
-        files={"image": ("test.jpg", sample_image, "image/jpeg")},
         headers=auth_headers
     )
+    assert response.status_code == 404
+
+
+def test_get_events(client: TestClient, auth_headers, create_event, test_project):
+    event = create_event(title="Listed Event")
+    events = _list_events(client, auth_headers, test_project["id"])
+    assert event["id"] in [e["id"] for e in events]
+
+
+def test_get_event(client: TestClient, auth_headers, create_event, test_project):
+    event = create_event(title="Fetched Event")
+    response = client.get(f"/api/v1/events/{event['id']}", headers=auth_headers)
     assert response.status_code == 200
-    assert response.json()["title"] == "Test Event"
-    assert response.json()["description"] == "This is a test event"
-    assert response.json()["project_id"] == test_project["id"]
-    assert response.json()["x_coordinate"] == 100.5
-    assert response.json()["y_coordinate"] == 200.5
-    assert "image_url" in response.json()
-    assert response.json()["image_url"].startswith("events/")
+    assert response.json()["id"] == event["id"]
+    assert response.json()["title"] == "Fetched Event"
+    assert response.json()["created_by_user_name"] == "testuser"
     
-    # Save event data for later tests
-    return response.json()
+    response = client.get("/api/v1/events/999999", headers=auth_headers)
+    assert response.status_code == 404
 
 
-def test_get_events(client: TestClient, auth_headers, test_project):
-    # Test getting all events for a project
-    response = client.get(
-        f"/api/v1/events/?project_id={test_project['id']}",
-        headers=auth_headers
-    )
-    assert response.status_code == 200
-    assert isinstance(response.json(), list)
-    # Should have at least one event (the one created in test_create_event)
-    assert len(response.json()) >= 1
+def _page_through(fetch_page):
+    # Follow the next page cursors until the last page, returning every id seen
+    seen_ids = []
+    cursor = None
+    while True:
+        page, cursor = fetch_page(cursor)
+        assert len(page) <= 2
+        seen_ids.extend(page)
+        if not cursor:
+            return seen_ids
+        assert len(seen_ids) < 20, "the cursor does not advance"
 
 
-def test_get_event(client: TestClient, auth_headers, test_project):
-    # First get all events to find one to test
-    response = client.get(
-        f"/api/v1/events/?project_id={test_project['id']}",
+def _add_paged_events(db, project_id: int, created):
+    from app.models.event import Event
+    
+    events = [
+        Event(project_id=project_id, map_id=903, created_by_user_id=1, title=f"Paged Event {i}",
+              x_coordinate=1.0, y_coordinate=1.0, created_at=created_at)
+        for i, created_at in enumerate(created)
+    ]
+    db.add_all(events)
+    db.flush()
+    # Inserting None would use the server default
+    undated = [e.id for e, created_at in zip(events, created) if created_at is None]
+    db.query(Event).filter(Event.id.in_(undated)).update({Event.created_at: None}, synchronize_session=False)
+    db.commit()
+    return [e.id for e in events]
+
+
+def test_get_events_cursor_pagination(client: TestClient, auth_headers, db):
+    from datetime import datetime
+    
+    response = client.post(
+        "/api/v1/projects/",
+        json={"name": "Paged Project", "description": "Events to page through"},
         headers=auth_headers
     )
-    events = response.json()
-    assert len(events) > 0
+    project_id = response.json()["id"]
+    ids = _add_paged_events(db, project_id, [
+        datetime(2024, 1, 1), datetime(2024, 1, 2), datetime(2024, 1, 2), datetime(2024, 1, 3)
+    ])
+    
+    def fetch_page(cursor):
+        url = f"/api/v1/events/?project_id={project_id}&limit=2"
+        if cursor:
+            url += f"&cursor={cursor}"
+        response = client.get(url, headers=auth_headers)
+        assert response.status_code == 200
+        return [event["id"] for event in response.json()], response.headers.get("X-Next-Cursor")
+    
+    # Every event is returned exactly once, newest first with ties broken by id
+    assert _page_through(fetch_page) == [ids[3], ids[2], ids[1], ids[0]]
+
+
+def test_event_pagination_with_undated_events(db):
+    from datetime import datetime
+    from app.models.event import Event
+    from app.services import event as event_service
+    
+    ids = _add_paged_events(db, 904, [datetime(2024, 1, 1), None, datetime(2024, 1, 2), None, None])
     
-    # Test getting a specific event
-    event_id = events[0]["id"]
+    def fetch_page(cursor):
+        query = db.query(Event).filter(Event.project_id == 904)
+        events = event_service.apply_event_pagination(query, limit=2, cursor=cursor).all()
+        return [event.id for event in events], event_service.get_next_event_cursor(events, 2)
+    
+    # Undated events come first (as in PostgreSQL's descending order), then the dated ones
+    expected = [ids[4], ids[3], ids[1], ids[2], ids[0]]
+    assert _page_through(fetch_page) == expected
+    assert [e.id for e in event_service.apply_event_pagination(db.query(Event).filter(Event.project_id == 904)).all()] == expected
+
+
+def test_get_events_invalid_cursor(client: TestClient, auth_headers, test_project):
     response = client.get(
-        f"/api/v1/events/{event_id}",
+        f"/api/v1/events/?project_id={test_project['id']}&cursor=not-a-cursor",
         headers=auth_headers
     )
+    assert response.status_code == 400
+
+
+def test_get_map_events_in_viewport(client: TestClient, auth_headers, create_event, test_map):
+    event = create_event(x_coordinate=300.0, y_coordinate=400.0)
+    url = f"/api/v1/events/map/{test_map['id']}"
+    
+    # A bounding box around the event includes it
+    response = client.get(f"{url}?min_x=299&min_y=399&max_x=301&max_y=401", headers=auth_headers)
     assert response.status_code == 200
-    assert response.json()["id"] == event_id
-    assert response.json()["project_id"] == test_project["id"]
-    assert "created_by_user_name" in response.json()
+    assert event["id"] in [e["id"] for e in response.json()]
     
-    # Test getting a non-existent event
-    response = client.get(
-        "/api/v1/events/999",
-        headers=auth_headers
-    )
-    assert response.status_code == 404
+    # A bounding box elsewhere on the map excludes it
+    response = client.get(f"{url}?min_x=310&min_y=410&max_x=320&max_y=420", headers=auth_headers)
+    assert response.status_code == 200
+    assert event["id"] not in [e["id"] for e in response.json()]
 
 
-def test_update_event(client: TestClient, auth_headers, test_project):
-    # First get all events to find one to update
-    response = client.get(
-        f"/api/v1/events/?project_id={test_project['id']}",
-        headers=auth_headers
-    )
-    events = response.json()
-    assert len(events) > 0
+def test_get_map_events_partial_viewport(client: TestClient, auth_headers, test_map):
+    response = client.get(f"/api/v1/events/map/{test_map['id']}?min_x=0", headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_get_map_event_clusters(client: TestClient, auth_headers, create_event, test_project, test_map):
+    create_event(state="red")
+    create_event(state="green")
+    on_map = [e for e in _list_events(client, auth_headers, test_project["id"]) if e["map_id"] == test_map["id"]]
     
-    # Test updating an event
-    event_id = events[0]["id"]
+    # At zoom 0 the whole map is a single cluster holding every event
+    response = client.get(f"/api/v1/maps/{test_map['id']}/events/clusters?zoom=0", headers=auth_headers)
+    assert response.status_code == 200
+    clusters = response.json()["clusters"]
+    assert len(clusters) == 1
+    assert clusters[0]["count"] == len(on_map)
+    assert clusters[0]["count"] == clusters[0]["red"] + clusters[0]["yellow"] + clusters[0]["green"]
+
+
+def test_moved_event_leaves_the_clusters_of_its_old_map(db):
+    from app.models.event import Event
+    from app.services import event_cluster
+    
+    event = Event(
+        project_id=1, map_id=901, created_by_user_id=1, title="Moved Event",
+        x_coordinate=10.0, y_coordinate=10.0, state="red", status="open"
+    )
+    db.add(event)
+    db.commit()
+    try:
+        assert event_cluster.get_clusters(db, 901, 0)[0]["count"] == 1
+        assert event_cluster.get_clusters(db, 902, 0) == []
+        
+        event.map_id = 902
+        db.commit()
+        event_cluster.event_saved(event, previous_map_id=901)
+        assert event_cluster.get_clusters(db, 901, 0) == []
+        assert event_cluster.get_clusters(db, 902, 0)[0]["count"] == 1
+    finally:
+        db.delete(event)
+        db.commit()
+        event_cluster.invalidate()
+
+
+def test_update_event(client: TestClient, auth_headers, create_event):
+    event = create_event(title="Event to Update", tags='["draft"]')
     response = client.put(
-        f"/api/v1/events/{event_id}",
+        f"/api/v1/events/{event['id']}",
         json={
             "title": "Updated Event",
             "description": "This event has been updated",
@@ -107,29 +223,453 @@ def test_update_event(client: TestClient, auth_headers, test_project):
         headers=auth_headers
     )
     assert response.status_code == 200
-    assert response.json()["id"] == event_id
+    assert response.json()["id"] == event["id"]
     assert response.json()["title"] == "Updated Event"
     assert response.json()["description"] == "This event has been updated"
     assert response.json()["tags"] == ["updated", "test"]
 
 
-def test_export_events(client: TestClient, auth_headers, test_project):
-    # Test exporting events as CSV
+@pytest.mark.parametrize("format, content_type", [
+    ("csv", "text/csv; charset=utf-8"),
+    ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+])
+def test_export_events(client: TestClient, auth_headers, create_event, test_project, format, content_type):
+    create_event(title="Exported Event")
+    response = client.get(
+        f"/api/v1/events/export?project_id={test_project['id']}&format={format}",
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == content_type
+    assert f"events-project-{test_project['id']}.{format}" in response.headers["Content-Disposition"]
+    if format == "csv":
+        assert "Exported Event" in response.text
+
+
+def test_filter_events_by_tag_exact_match(client: TestClient, auth_headers, create_event, test_project):
+    tagged = create_event(title="Tagged Event", tags='["scaffolding", "test"]')
+    untagged = create_event(title="Untagged Event")
+    
+    # Tags match whatever their case
+    events = _list_events(client, auth_headers, test_project["id"], "&tags=SCAFFOLDING")
+    assert tagged["id"] in [e["id"] for e in events]
+    assert untagged["id"] not in [e["id"] for e in events]
+    assert all("scaffolding" in [t.lower() for t in e["tags"]] for e in events)
+    
+    # A prefix of a tag does not match it
+    assert _list_events(client, auth_headers, test_project["id"], "&tags=scaff") == []
+
+
+def test_comment_count_maintained(client: TestClient, auth_headers, create_event):
+    event = create_event(title="Commented Event")
+    assert event["comment_count"] == 0
+    
+    # Adding a comment increments the counter
+    response = client.post(
+        f"/api/v1/events/{event['id']}/comments",
+        data={"content": "Counter check"},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    comment_id = response.json()["id"]
+    assert client.get(f"/api/v1/events/{event['id']}", headers=auth_headers).json()["comment_count"] == 1
+    
+    # Deleting it decrements the counter again
+    response = client.delete(
+        f"/api/v1/events/{event['id']}/comments/{comment_id}",
+        headers=auth_headers
+    )
+    assert response.status_code == 204
+    assert client.get(f"/api/v1/events/{event['id']}", headers=auth_headers).json()["comment_count"] == 0
+
+
+def test_project_stats_match_events(client: TestClient, auth_headers, create_event, test_project, test_map):
+    create_event(title="Counted Event", state="red", tags='["counted"]')
+    events = _list_events(client, auth_headers, test_project["id"])
+    
+    response = client.get(f"/api/v1/projects/{test_project['id']}/stats", headers=auth_headers)
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["total"] == len(events)
+    assert stats["by_state"]["red"] == sum(e["state"] == "red" for e in events)
+    assert sum(stats["by_state"].values()) == len(events)
+    assert stats["by_tag"]["counted"] == sum("counted" in (e["tags"] or []) for e in events)
+    assert stats["maps"][str(test_map["id"])]["total"] == len(events)
+
+
+def test_project_stats_follow_state_flips(client: TestClient, auth_headers, create_event, test_project, monkeypatch):
+    from app.services import event_stats
+    
+    event = create_event(title="Flipping Event", state="red")
+    upsert = event_stats._upsert
+    touched = []
+    
+    def recording_upsert(db, project_id, map_id, dimension, value, delta):
+        touched.append((project_id, map_id, dimension, value))
+        upsert(db, project_id, map_id, dimension, value, delta)
+    
+    monkeypatch.setattr(event_stats, "_upsert", recording_upsert)
+    
+    def by_state():
+        response = client.get(f"/api/v1/projects/{test_project['id']}/stats", headers=auth_headers)
+        return response.json()["by_state"]
+    
+    orders = []
+    for old_state, new_state in (("red", "green"), ("green", "red")):
+        before = by_state()
+        touched.clear()
+        response = client.put(f"/api/v1/events/{event['id']}", json={"state": new_state}, headers=auth_headers)
+        assert response.status_code == 200
+        after = by_state()
+        assert after.get(old_state, 0) == before.get(old_state, 0) - 1
+        assert after.get(new_state, 0) == before.get(new_state, 0) + 1
+        orders.append(touched[:])
+    
+    # Both directions lock the same counter rows in the same order
+    assert orders[0] == sorted(orders[0])
+    assert orders[0] == orders[1]
+
+
+def test_project_tags_prefix(client: TestClient, auth_headers, create_event, test_project):
+    create_event(title="Prefixed Tags", tags='["plumbing", "plaster"]')
+    
+    response = client.get(f"/api/v1/projects/{test_project['id']}/tags?prefix=PL", headers=auth_headers)
+    assert response.status_code == 200
+    assert {"plumbing", "plaster"} <= set(response.json())
+    assert all(tag.lower().startswith("pl") for tag in response.json())
+    
+    response = client.get(f"/api/v1/projects/{test_project['id']}/tags/counts", headers=auth_headers)
+    assert response.status_code == 200
+    counts = {entry["tag"]: entry["count"] for entry in response.json()}
+    assert counts["plumbing"] >= 1
+
+
+def test_project_tags_keep_their_case(client: TestClient, auth_headers, create_event, test_project):
+    event = create_event(title="Cased Tags", tags='["Roof Leak", "roof leak", "HVAC"]')
+    assert event["tags"] == ["Roof Leak", "roof leak", "HVAC"]
+    
+    # Listed as written (first spelling), matched regardless of case
+    response = client.get(f"/api/v1/projects/{test_project['id']}/tags?prefix=roof", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == ["Roof Leak"]
+    response = client.get(f"/api/v1/projects/{test_project['id']}/tags?prefix=hv", headers=auth_headers)
+    assert response.json() == ["HVAC"]
+    
+    events = _list_events(client, auth_headers, test_project["id"], "&tags=roof%20LEAK")
+    assert event["id"] in [e["id"] for e in events]
+    
+    response = client.get(f"/api/v1/projects/{test_project['id']}/stats", headers=auth_headers)
+    assert response.json()["by_tag"]["HVAC"] >= 1
+    assert "hvac" not in response.json()["by_tag"]
+
+
+def test_search_events(client: TestClient, auth_headers, create_event, test_project):
+    event = create_event(title="Cracked Beam", description="A crack in the beam of the third floor")
+    
     response = client.get(
-        f"/api/v1/events/export?project_id={test_project['id']}&format=csv",
+        f"/api/v1/events/search?project_id={test_project['id']}&q=beam",
         headers=auth_headers
     )
     assert response.status_code == 200
-    assert response.headers["Content-Type"] == "text/csv"
-    assert "Content-Disposition" in response.headers
-    assert f"events-project-{test_project['id']}.csv" in response.headers["Content-Disposition"]
+    results = response.json()
+    assert results[0]["id"] == event["id"]
+    assert all(results[i]["rank"] >= results[i + 1]["rank"] for i in range(len(results) - 1))
     
-    # Test exporting events as Excel
     response = client.get(
-        f"/api/v1/events/export?project_id={test_project['id']}&format=xlsx",
+        f"/api/v1/events/search?project_id={test_project['id']}&q=nonexistentword",
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_project_changes_feed(client: TestClient, auth_headers, create_event, test_project):
+    event = create_event(title="Event Before Token")
+    response = client.get(f"/api/v1/projects/{test_project['id']}/changes", headers=auth_headers)
+    assert response.status_code == 200
+    token = response.json()["next_token"]
+    
+    response = client.put(
+        f"/api/v1/events/{event['id']}",
+        json={"title": "Changed Event"},
         headers=auth_headers
     )
     assert response.status_code == 200
-    assert response.headers["Content-Type"] == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    assert "Content-Disposition" in response.headers
-    assert f"events-project-{test_project['id']}.xlsx" in response.headers["Content-Disposition"] 
\ No newline at end of file
+    
+    # Only the change made after the token is returned
+    response = client.get(f"/api/v1/projects/{test_project['id']}/changes?since={token}", headers=auth_headers)
+    assert response.status_code == 200
+    feed = response.json()
+    assert [change["event_id"] for change in feed["changes"]] == [event["id"]]
+    assert feed["changes"][0]["action"] == "upsert"
+    assert feed["changes"][0]["event"]["title"] == "Changed Event"
+    assert feed["next_token"] > token
+
+
+def test_changes_feed_with_interleaved_transactions(tmp_path):
+    import threading
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.db.database import Base
+    from app.models.event import Event
+    from app.services import event_changes
+    
+    # A file database, so that each session has its own connection and transaction
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'changes.db'}",
+        connect_args={"check_same_thread": False, "timeout": 10}
+    )
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    first, second, reader = Session(), Session(), Session()
+    
+    token = event_changes.get_changes(reader, 1)["next_token"]
+    reader.commit()
+    
+    event_changes.record_change(first, Event(id=1, project_id=1, map_id=1))
+    first.flush()
+    
+    def write_second():
+        event_changes.record_change(second, Event(id=2, project_id=1, map_id=1))
+        second.commit()
+    
+    thread = threading.Thread(target=write_second)
+    thread.start()
+    thread.join(0.5)
+    
+    # The second writer waits for the first one, so the token cannot skip its change
+    feed = event_changes.get_changes(reader, 1, token)
+    reader.commit()
+    assert feed["changes"] == []
+    assert feed["next_token"] == token
+    
+    first.commit()
+    thread.join()
+    feed = event_changes.get_changes(reader, 1, token)
+    assert [change["event_id"] for change in feed["changes"]] == [1, 2]
+    
+    for session in (first, second, reader):
+        session.close()
+    engine.dispose()
+
+
+def test_event_history_committed_with_update(client: TestClient, auth_headers, create_event):
+    event = create_event(title="Event With History")
+    history_before = client.get(f"/api/v1/events/{event['id']}/history", headers=auth_headers).json()
+    
+    response = client.put(
+        f"/api/v1/events/{event['id']}",
+        json={"description": "Edited together with its history"},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    
+    # The history entry is part of the same commit as the update
+    history = client.get(f"/api/v1/events/{event['id']}/history", headers=auth_headers).json()
+    assert len(history) == len(history_before) + 1
+    assert history[0]["action_type"] == "edit"
+
+
+def test_get_map_event_heatmap(client: TestClient, auth_headers, create_event, test_map):
+    create_event(title="Heat Event")
+    
+    response = client.get(f"/api/v1/maps/{test_map['id']}/events/heatmap?zoom=1", headers=auth_headers)
+    assert response.status_code == 200
+    heatmap = response.json()
+    assert heatmap["size"] == 32
+    assert len(heatmap["counts"]) == 32 * 32
+    assert heatmap["total"] == sum(heatmap["counts"]) >= 1
+    
+    response = client.get(f"/api/v1/maps/{test_map['id']}/events/heatmap.png", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+
+
+def test_heatmap_cache_is_bounded_and_expires(monkeypatch):
+    from app.services import event_heatmap
+    
+    computed = []
+    
+    def compute(db, map_id, zoom, include_closed, state, tag):
+        computed.append(map_id)
+        return np.zeros((1, 1), dtype=np.int32)
+    
+    clock = [1000.0]
+    monkeypatch.setattr(event_heatmap, "_compute", compute)
+    monkeypatch.setattr(event_heatmap, "time", SimpleNamespace(time=lambda: clock[0]))
+    monkeypatch.setattr(event_heatmap, "HEATMAP_CACHE_MAX_ENTRIES", 2)
+    event_heatmap.invalidate()
+    try:
+        for map_id in (1, 2, 1, 3):
+            event_heatmap.get_heatmap(None, map_id)
+        # Map 2 was the least recently used one when map 3 came in
+        assert computed == [1, 2, 3]
+        assert [key[0] for key in event_heatmap._cache] == [1, 3]
+        
+        # An expired grid is dropped and computed again
+        clock[0] += event_heatmap.HEATMAP_CACHE_TTL + 1
+        event_heatmap.get_heatmap(None, 3)
+        assert computed == [1, 2, 3, 3]
+        assert len(event_heatmap._cache) == 2
+    finally:
+        event_heatmap.invalidate()
+
+
+def test_heatmap_render_during_global_invalidation_is_not_cached(monkeypatch):
+    from app.services import event_heatmap
+    
+    def compute(db, map_id, zoom, include_closed, state, tag):
+        # The caches of every map are dropped while this grid is computed
+        event_heatmap.invalidate()
+        return np.zeros((1, 1), dtype=np.int32)
+    
+    monkeypatch.setattr(event_heatmap, "_compute", compute)
+    event_heatmap.get_heatmap(None, 905)
+    assert not event_heatmap._cache
+
+
+def test_event_image_thumbnail_urls(client: TestClient, auth_headers, create_event):
+    # An image of its own, so no thumbnails exist yet for its content
+    image = io.BytesIO()
+    Image.new("RGB", (400, 300), color="blue").save(image, format="JPEG")
+    image.seek(0)
+    event = create_event(title="Photo Event", image=("photo.jpg", image, "image/jpeg"))
+    # Not advertised before they are generated
+    assert event["thumbnail_urls"] is None
+    
+    event = _wait_for_thumbnails(client, auth_headers, event["id"])
+    stem = event["image_url"].rsplit(".", 1)[0]
+    assert event["thumbnail_urls"] == {
+        "medium": f"{stem}_medium.jpg",
+        "small": f"{stem}_small.jpg",
+    }
+    response = client.get(event["thumbnail_urls"]["small"])
+    assert response.status_code == 200
+    assert Image.open(io.BytesIO(response.content)).size[0] <= 240
+
+
+def _wait_for_thumbnails(client: TestClient, auth_headers, event_id: int):
+    # Generated by the side effect workers after the commit
+    for _ in range(50):
+        event = client.get(f"/api/v1/events/{event_id}", headers=auth_headers).json()
+        if event["thumbnail_urls"]:
+            return event
+        time.sleep(0.1)
+    raise AssertionError("Thumbnails were not generated")
+
+
+def test_event_attachments_are_stored_once(create_event, sample_image):
+    image_urls = [
+        create_event(title=title, image=("photo.jpg", io.BytesIO(sample_image.getvalue()), "image/jpeg"))["image_url"]
+        for title in ("Same Photo 1", "Same Photo 2")
+    ]
+    
+    # Named after the content, so the second upload reuses the stored file
+    sha256 = hashlib.sha256(sample_image.getvalue()).hexdigest()
+    assert image_urls == [f"/events/img_{sha256}.jpeg"] * 2
+
+
+def test_event_image_signed_url(client: TestClient, create_event, sample_image):
+    event = create_event(title="Signed Photo Event", image=("photo.jpg", sample_image, "image/jpeg"))
+    signed_url = event["signed_image_url"]
+    assert signed_url.startswith("/api/v1/image/")
+    
+    # Served without an Authorization header
+    response = client.get(signed_url)
+    assert response.status_code == 200
+    assert response.content == sample_image.getvalue()
+    
+    # A tampered signature is rejected
+    response = client.get(signed_url[:-4] + "AAAA")
+    assert response.status_code == 403
+
+
+def _create_upload_intent(client: TestClient, auth_headers, test_project, test_map, content: bytes, **fields):
+    data = {
+        "project_id": test_project["id"],
+        "map_id": test_map["id"],
+        "title": "Direct Event",
+        "x_coordinate": 5.0,
+        "y_coordinate": 6.0,
+        "filename": "site.jpg",
+        "content_type": "image/jpeg",
+        "size": len(content)
+    }
+    data.update(fields)
+    response = client.post("/api/v1/events/upload-intents", json=data, headers=auth_headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_direct_event_upload(client: TestClient, auth_headers, test_project, test_map, sample_image):
+    content = sample_image.getvalue()
+    intent = _create_upload_intent(client, auth_headers, test_project, test_map, content, tags=["direct"])
+    
+    # Without Cloud Storage the signed URL points to the local stand-in
+    response = client.put(intent["upload_url"], content=content, headers=intent["headers"])
+    assert response.status_code == 204
+    
+    response = client.post(f"/api/v1/events/upload-intents/{intent['intent_id']}/complete", headers=auth_headers)
+    assert response.status_code == 200
+    event = response.json()
+    assert event["title"] == "Direct Event"
+    assert event["tags"] == ["direct"]
+    # Stored under its content-addressed attachment name, with thumbnails like API uploads
+    assert event["image_url"] == f"/events/img_{hashlib.sha256(content).hexdigest()}.jpeg"
+    event = _wait_for_thumbnails(client, auth_headers, event["id"])
+    stem = event["image_url"].rsplit(".", 1)[0]
+    assert event["thumbnail_urls"]["small"] == f"{stem}_small.jpg"
+    
+    # The signed URL no longer accepts uploads once the event is created
+    response = client.put(intent["upload_url"], content=b"replaced", headers=intent["headers"])
+    assert response.status_code == 404
+
+
+def test_direct_upload_for_an_intent_completed_meanwhile(client: TestClient, auth_headers, db, test_project, test_map, sample_image, monkeypatch):
+    from app.models.upload_intent import UploadIntent
+    from app.services import storage
+    
+    content = sample_image.getvalue()
+    intent = _create_upload_intent(client, auth_headers, test_project, test_map, content, title="Raced Event")
+    
+    # The intent goes away (completed or cancelled elsewhere) while the body is received
+    save_upload = storage.save_upload
+    async def save_then_complete(*args, **kwargs):
+        result = await save_upload(*args, **kwargs)
+        db.query(UploadIntent).filter(UploadIntent.id == intent["intent_id"]).delete()
+        db.commit()
+        return result
+    monkeypatch.setattr(storage, "save_upload", save_then_complete)
+    
+    response = client.put(intent["upload_url"], content=content, headers=intent["headers"])
+    assert response.status_code == 404
+    # The file is not left behind
+    assert not [path for path in storage.get_backend().list("incoming") if intent["intent_id"] in path]
+
+
+def test_cancelled_upload_intent(client: TestClient, auth_headers, test_project, test_map, sample_image):
+    content = sample_image.getvalue()
+    intent = _create_upload_intent(client, auth_headers, test_project, test_map, content, title="Cancelled Event")
+    
+    response = client.delete(f"/api/v1/events/upload-intents/{intent['intent_id']}", headers=auth_headers)
+    assert response.status_code == 204
+    response = client.post(f"/api/v1/events/upload-intents/{intent['intent_id']}/complete", headers=auth_headers)
+    assert response.status_code == 404
+
+
+def test_create_event_attachment_too_large(client: TestClient, auth_headers, test_project, test_map):
+    oversized = io.BytesIO(b"%PDF-1.4\n" + b"0" * (10 * 1024 * 1024))
+    response = client.post(
+        "/api/v1/events/",
+        data={
+            "project_id": test_project["id"],
+            "map_id": test_map["id"],
+            "title": "Oversized Attachment",
+            "x_coordinate": 10.0,
+            "y_coordinate": 10.0
+        },
+        files={"image": ("plan.pdf", oversized, "application/pdf")},
+        headers=auth_headers
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "File size exceeds the limit of 10MB"
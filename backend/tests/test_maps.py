@@ -1,25 +1,11 @@
 import os
 import pytest
 import io
+import hashlib
+import time
 from fastapi.testclient import TestClient
 import tempfile
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-
-# Reuse auth_headers fixture from test_projects.py
-from backend.tests.test_projects import auth_headers, test_project
-
-
-@pytest.fixture(scope="module")
-def sample_pdf():
-    """Create a sample PDF file for testing"""
-    # Create a temporary PDF file
-    pdf_buffer = io.BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=letter)
-    c.drawString(100, 750, "Test PDF for Map Upload")
-    c.save()
-    pdf_buffer.seek(0)
-    return pdf_buffer
+from types import SimpleNamespace
 
 
 def test_create_map(client: TestClient, auth_headers, test_project, sample_pdf):
@@ -39,63 +25,61 @@ def test_create_map(client: TestClient, auth_headers, test_project, sample_pdf):
     assert response.json()["name"] == "Test Map"
     assert response.json()["map_type"] == "implantation"
     assert response.json()["project_id"] == test_project["id"]
-    assert "filename" in response.json()
     assert response.json()["filename"].endswith(".pdf")
-    
-    # Save map ID for later tests
-    return response.json()
+    # Sent as a JSON string in the form
+    assert response.json()["transform_data"] == {"scale": 1.0, "rotation": 0, "x_offset": 0, "y_offset": 0}
 
 
-def test_get_maps(client: TestClient, auth_headers, test_project):
-    # Test getting all maps for a project
-    response = client.get(
-        f"/api/v1/maps/?project_id={test_project['id']}",
+def test_create_map_invalid_transform_data(client: TestClient, auth_headers, test_project, sample_pdf):
+    response = client.post(
+        "/api/v1/maps/",
+        data={
+            "project_id": test_project["id"],
+            "map_type": "overlay",
+            "name": "Broken Transform",
+            "transform_data": "not json"
+        },
+        files={"file": ("test.pdf", sample_pdf, "application/pdf")},
         headers=auth_headers
     )
-    assert response.status_code == 200
-    assert isinstance(response.json(), list)
-    # Should have at least one map (the one created in test_create_map)
-    assert len(response.json()) >= 1
+    assert response.status_code == 400
 
 
-def test_get_map(client: TestClient, auth_headers, test_project):
-    # First get all maps to find one to test
+def test_get_maps(client: TestClient, auth_headers, test_project, test_map):
     response = client.get(
         f"/api/v1/maps/?project_id={test_project['id']}",
         headers=auth_headers
     )
-    maps = response.json()
-    assert len(maps) > 0
-    
-    # Test getting a specific map
-    map_id = maps[0]["id"]
+    assert response.status_code == 200
+    assert test_map["id"] in [m["id"] for m in response.json()]
+
+
+def test_get_map(client: TestClient, auth_headers, test_project, test_map):
     response = client.get(
-        f"/api/v1/maps/{map_id}",
+        f"/api/v1/maps/{test_map['id']}",
         headers=auth_headers
     )
     assert response.status_code == 200
-    assert response.json()["id"] == map_id
+    assert response.json()["id"] == test_map["id"]
     assert response.json()["project_id"] == test_project["id"]
     
     # Test getting a non-existent map
     response = client.get(
-        "/api/v1/maps/999",
+        "/api/v1/maps/999999",
         headers=auth_headers
     )
     assert response.status_code == 404
 
 
-def test_update_map(client: TestClient, auth_headers, test_project):
-    # First get all maps to find one to update
-    response = client.get(
-        f"/api/v1/maps/?project_id={test_project['id']}",
+def test_update_map(client: TestClient, auth_headers, test_project, sample_pdf):
+    response = client.post(
+        "/api/v1/maps/",
+        data={"project_id": test_project["id"], "map_type": "overlay", "name": "Map to Update"},
+        files={"file": ("test.pdf", sample_pdf, "application/pdf")},
         headers=auth_headers
     )
-    maps = response.json()
-    assert len(maps) > 0
+    map_id = response.json()["id"]
     
-    # Test updating a map
-    map_id = maps[0]["id"]
     response = client.put(
         f"/api/v1/maps/{map_id}",
         json={
@@ -107,4 +91,296 @@ def test_update_map(client: TestClient, auth_headers, test_project):
     assert response.status_code == 200
     assert response.json()["id"] == map_id
     assert response.json()["name"] == "Updated Map"
-    assert response.json()["transform_data"] == {"scale": 1.5, "rotation": 90, "x_offset": 10, "y_offset": 20} 
\ No newline at end of file
+    assert response.json()["transform_data"] == {"scale": 1.5, "rotation": 90, "x_offset": 10, "y_offset": 20}
+
+
+def test_duplicate_map_uploads_share_file(client: TestClient, auth_headers, test_project, sample_pdf):
+    filenames = []
+    for name in ("Copy A", "Copy B"):
+        sample_pdf.seek(0)
+        response = client.post(
+            "/api/v1/maps/",
+            data={
+                "project_id": test_project["id"],
+                "map_type": "overlay",
+                "name": name
+            },
+            files={"file": ("plan.pdf", sample_pdf, "application/pdf")},
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        filenames.append(response.json()["filename"])
+    
+    # Identical content is stored once, under its SHA-256 digest
+    assert filenames[0] == filenames[1]
+    assert len(filenames[0]) == len("0" * 64 + ".pdf")
+
+
+def test_resumable_map_upload(client: TestClient, auth_headers, test_project, sample_pdf):
+    content = sample_pdf.getvalue()
+    response = client.post(
+        "/api/v1/maps/uploads",
+        json={
+            "project_id": test_project["id"],
+            "map_type": "overlay",
+            "name": "Chunked Map",
+            "filename": "chunked.pdf",
+            "total_size": len(content)
+        },
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    upload = response.json()
+    assert upload["received_chunks"] == []
+    
+    chunk_size = upload["chunk_size"]
+    for index in range(upload["total_chunks"]):
+        chunk = content[index * chunk_size:(index + 1) * chunk_size]
+        response = client.put(
+            f"/api/v1/maps/uploads/{upload['upload_id']}/chunks/{index}",
+            files={"chunk": ("chunk", io.BytesIO(chunk), "application/octet-stream")},
+            headers=auth_headers
+        )
+        assert response.status_code == 204
+    
+    # A failed resend of a chunk keeps the copy received before
+    response = client.put(
+        f"/api/v1/maps/uploads/{upload['upload_id']}/chunks/0",
+        files={"chunk": ("chunk", io.BytesIO(content[:10]), "application/octet-stream")},
+        headers=auth_headers
+    )
+    assert response.status_code == 400
+    
+    response = client.get(f"/api/v1/maps/uploads/{upload['upload_id']}", headers=auth_headers)
+    assert response.json()["received_chunks"] == list(range(upload["total_chunks"]))
+    
+    response = client.post(f"/api/v1/maps/uploads/{upload['upload_id']}/complete", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["name"] == "Chunked Map"
+    assert response.json()["project_id"] == test_project["id"]
+    
+    # The upload is gone once completed
+    response = client.get(f"/api/v1/maps/uploads/{upload['upload_id']}", headers=auth_headers)
+    assert response.status_code == 404
+
+
+def test_get_map_tiles(client: TestClient, auth_headers, test_map):
+    from app.services import map_tiles
+    
+    map_id = test_map["id"]
+    
+    # Generated in the background after the upload (or on the first request)
+    for _ in range(100):
+        response = client.get(f"/api/v1/maps/{map_id}/tiles", headers=auth_headers)
+        assert response.status_code == 200
+        tiles = response.json()
+        if tiles["status"] != "pending":
+            break
+        time.sleep(0.1)
+    assert tiles["status"] == "ready"
+    assert tiles["levels"][0]["columns"] == 1 and tiles["levels"][0]["rows"] == 1
+    # Tile paths name the rendering layout, so cached (immutable) tiles never go stale
+    assert f"/{map_tiles.TILE_LAYOUT}/" in tiles["url_template"]
+    response = client.get(f"/api/v1/maps/{map_id}/tiles/0/0/0.png", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+
+
+def test_render_pyramid(sample_pdf, tmp_path):
+    from PIL import Image
+    from app.services import map_tiles
+    
+    pdf_path = tmp_path / "sheet.pdf"
+    pdf_path.write_bytes(sample_pdf.getvalue())
+    tiles = {}
+    
+    def write_tile(level, x, y, data):
+        tiles[(level, x, y)] = Image.open(io.BytesIO(data)).size
+    
+    manifest = map_tiles.render_pyramid(str(pdf_path), write_tile)
+    levels = manifest["levels"]
+    # Letter page at MAX_TILE_DPI: 2200 px on the longest side -> levels 0..4
+    assert manifest["max_level"] == 4
+    assert [level["level"] for level in levels] == [0, 1, 2, 3, 4]
+    assert (manifest["width"], manifest["height"]) == (levels[-1]["width"], levels[-1]["height"])
+    assert len(tiles) == sum(level["columns"] * level["rows"] for level in levels)
+    
+    # Level 0 is the whole sheet in one tile, scaled to the tile size
+    assert (levels[0]["columns"], levels[0]["rows"]) == (1, 1)
+    assert tiles[(0, 0, 0)] == (198, 256)
+    
+    for level in levels:
+        z, columns, rows = level["level"], level["columns"], level["rows"]
+        assert level["height"] == 256 * 2 ** z
+        # Full tiles, except the right and bottom edges that cover the rest of the sheet
+        assert tiles[(z, 0, 0)] == (min(256, level["width"]), 256)
+        edge_width = level["width"] - (columns - 1) * 256
+        assert tiles[(z, columns - 1, rows - 1)] == (edge_width, 256)
+        assert 0 < edge_width <= 256
+
+
+def test_tile_generation_is_retried_after_failure(sample_pdf, monkeypatch):
+    from app.services import storage
+    from app.services import map_tiles
+    from app.services.storage_backends import InMemoryStorageBackend
+    
+    class InlineExecutor:
+        def submit(self, fn, *args):
+            fn(*args)
+    
+    previous = storage.get_backend()
+    storage.set_backend(InMemoryStorageBackend())
+    monkeypatch.setattr(map_tiles, "_get_executor", lambda: InlineExecutor())
+    clock = [1000.0]
+    monkeypatch.setattr(map_tiles, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    render_pyramid = map_tiles.render_pyramid
+    
+    def failing_render(pdf_path, write_tile):
+        raise RuntimeError("renderer crashed")
+    
+    try:
+        storage.store_bytes("maps/retried.pdf", sample_pdf.getvalue(), "application/pdf")
+        monkeypatch.setattr(map_tiles, "render_pyramid", failing_render)
+        assert map_tiles.schedule_tiles("retried.pdf")
+        # Retried later, not on every request
+        assert map_tiles.get_tiles_status("retried.pdf") == "pending"
+        assert not map_tiles.schedule_tiles("retried.pdf")
+        
+        clock[0] += map_tiles.TILE_RETRY_BASE_DELAY
+        monkeypatch.setattr(map_tiles, "render_pyramid", render_pyramid)
+        assert map_tiles.schedule_tiles("retried.pdf")
+        assert map_tiles.get_tiles_status("retried.pdf") == "ready"
+        
+        # Given up after TILE_MAX_ATTEMPTS failures
+        map_tiles.remove_tiles("retried.pdf")
+        monkeypatch.setattr(map_tiles, "render_pyramid", failing_render)
+        for attempt in range(map_tiles.TILE_MAX_ATTEMPTS):
+            assert map_tiles.schedule_tiles("retried.pdf")
+            # Twice as long after every failure
+            clock[0] += map_tiles.TILE_RETRY_BASE_DELAY * 2 ** attempt - 1
+            assert not map_tiles.schedule_tiles("retried.pdf")
+            clock[0] += 1
+        assert not map_tiles.schedule_tiles("retried.pdf")
+        assert map_tiles.get_tiles_status("retried.pdf") == "failed"
+    finally:
+        map_tiles.remove_tiles("retried.pdf")
+        storage.set_backend(previous)
+
+
+def test_map_file_caching_and_ranges(client: TestClient, auth_headers, test_project, sample_pdf):
+    sample_pdf.seek(0)
+    response = client.post(
+        "/api/v1/maps/",
+        data={
+            "project_id": test_project["id"],
+            "map_type": "implantation",
+            "name": "Cached Map"
+        },
+        files={"file": ("cached.pdf", sample_pdf, "application/pdf")},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    file_url = f"/uploads/maps/{response.json()['filename']}"
+
+    response = client.get(file_url)
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["accept-ranges"] == "bytes"
+    etag = response.headers["etag"]
+    size = len(response.content)
+
+    response = client.get(file_url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = client.get(file_url, headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 0-9/{size}"
+    assert response.content == sample_pdf.getvalue()[:10]
+
+    response = client.get(file_url, headers={"Range": f"bytes={size}-"})
+    assert response.status_code == 416
+
+
+
+def test_parse_range():
+    from app.core.static_files import parse_range
+    
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-5", 100) == (95, 99)
+    assert parse_range("bytes=95-200", 100) == (95, 99)
+    # Invalid or multiple ranges are ignored
+    assert parse_range("bytes=9-3", 100) is None
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    # Unsatisfiable ranges (416)
+    for header, size in (("bytes=100-", 100), ("bytes=-0", 100), ("bytes=-5", 0), ("bytes=0-", 0)):
+        with pytest.raises(ValueError):
+            parse_range(header, size)
+
+def test_direct_map_upload(client: TestClient, auth_headers, test_project, sample_pdf):
+    content = sample_pdf.getvalue()
+    response = client.post(
+        "/api/v1/maps/upload-intents",
+        json={
+            "project_id": test_project["id"],
+            "map_type": "overlay",
+            "name": "Direct Map",
+            "filename": "direct.pdf",
+            "size": len(content)
+        },
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    intent = response.json()
+    assert intent["method"] == "PUT"
+    
+    # Completing before the file is uploaded fails
+    response = client.post(f"/api/v1/maps/upload-intents/{intent['intent_id']}/complete", headers=auth_headers)
+    assert response.status_code == 400
+    
+    # Without Cloud Storage the signed URL points to the local stand-in
+    response = client.put(intent["upload_url"], content=content, headers=intent["headers"])
+    assert response.status_code == 204
+    
+    response = client.post(f"/api/v1/maps/upload-intents/{intent['intent_id']}/complete", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["name"] == "Direct Map"
+    assert response.json()["filename"] == hashlib.sha256(content).hexdigest() + ".pdf"
+
+
+def test_map_upload_with_in_memory_storage(client: TestClient, auth_headers, test_project, sample_pdf):
+    from app.services import storage
+    from app.services import map_tiles
+    from app.services.storage_backends import InMemoryStorageBackend
+    
+    previous = storage.get_backend()
+    backend = InMemoryStorageBackend()
+    storage.set_backend(backend)
+    filename = None
+    try:
+        sample_pdf.seek(0)
+        response = client.post(
+            "/api/v1/maps/",
+            data={
+                "project_id": test_project["id"],
+                "map_type": "overlay",
+                "name": "In Memory Map"
+            },
+            files={"file": ("memory.pdf", sample_pdf, "application/pdf")},
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        filename = response.json()["filename"]
+        
+        # Stored through the backend, under its content-addressed name
+        path = f"maps/{filename}"
+        assert backend.exists(path)
+        assert backend.read_bytes(path) == sample_pdf.getvalue()
+        assert backend.list("maps") == [path]
+    finally:
+        # The tile job of the new map reads from the in-memory backend: let it finish first
+        for _ in range(100):
+            if filename is None or map_tiles.get_tiles_status(filename) != "pending":
+                break
+            time.sleep(0.1)
+        storage.set_backend(previous)
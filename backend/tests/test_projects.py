@@ -1,28 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
 
-@pytest.fixture(scope="module")
-def auth_headers(client: TestClient):
-    # Login and get the token
-    response = client.post(
-        "/api/v1/auth/login",
-        data={"username": "testuser", "password": "password"}
-    )
-    token = response.json()["access_token"]
-    return {"Authorization": f"Bearer {token}"}
-
-
-@pytest.fixture(scope="module")
-def test_project(client: TestClient, auth_headers):
-    # Create a test project
-    response = client.post(
-        "/api/v1/projects/",
-        json={"name": "Test Project", "description": "A test project"},
-        headers=auth_headers
-    )
-    assert response.status_code == 200
-    return response.json()
-
 
 def test_create_project(client: TestClient, auth_headers):
     # Test creating a project
@@ -104,4 +82,47 @@ def test_delete_project(client: TestClient, auth_headers):
         f"/api/v1/projects/{project_id}",
         headers=auth_headers
     )
-    assert response.status_code == 404 
\ No newline at end of file
+    assert response.status_code == 404 
+
+
+def test_project_timeline(client: TestClient, auth_headers, test_project):
+    response = client.get(
+        f"/api/v1/projects/{test_project['id']}/timeline?interval=week",
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    timeline = response.json()
+    assert timeline["interval"] == "week"
+    assert len(timeline["buckets"]) >= 4
+    for bucket in timeline["buckets"]:
+        assert bucket["created"] == sum(bucket["created_by_state"].values())
+        assert bucket["closed"] == sum(bucket["closed_by_state"].values())
+        # An event with several tags counts once for each of them
+        assert all(count <= bucket["closed"] for count in bucket["closed_by_tag"].values())
+    
+    response = client.get(
+        f"/api/v1/projects/{test_project['id']}/timeline?start_date=2024-02-01&end_date=2024-01-01",
+        headers=auth_headers
+    )
+    assert response.status_code == 400
+
+
+def test_project_timeline_counts_closures(client: TestClient, auth_headers, create_event, test_project):
+    def today():
+        response = client.get(f"/api/v1/projects/{test_project['id']}/timeline", headers=auth_headers)
+        assert response.status_code == 200
+        return response.json()["buckets"][-1]
+    before = today()
+    
+    # One event created closed, one closed afterwards
+    create_event(title="Created Closed", status="closed", tags='["Timeline"]')
+    event = create_event(title="Closed Later", tags='["Timeline"]')
+    response = client.put(f"/api/v1/events/{event['id']}", json={"status": "closed"}, headers=auth_headers)
+    assert response.status_code == 200
+    
+    after = today()
+    assert after["created"] == before["created"] + 2
+    assert after["closed"] == before["closed"] + 2
+    assert after["created_by_tag"]["Timeline"] == 2
+    assert after["closed_by_tag"]["Timeline"] == 2
+    assert after["closed"] == sum(after["closed_by_state"].values())
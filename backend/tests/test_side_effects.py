@@ -0,0 +1,120 @@
+import io
+import time
+import asyncio
+import uuid
+
+import pytest
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.models.notification import Notification
+from app.models.side_effect_job import SideEffectJob
+from app.services import side_effects
+from app.services import storage
+from app.services import notification as notification_service
+from app.services.notification import NotificationService
+
+
+def test_side_effect_workers_use_the_test_database(client, db):
+    ran = []
+    side_effects.handler("test_job")(lambda job_db, value: ran.append(value))
+    
+    # The job only exists in the test database
+    side_effects.enqueue(db, "test_job", value=42)
+    db.commit()
+    
+    for _ in range(50):
+        if ran:
+            break
+        time.sleep(0.1)
+    assert ran == [42]
+    db.expire_all()
+    assert db.query(SideEffectJob).filter(SideEffectJob.kind == "test_job").count() == 0
+
+
+def test_notification_email_job_is_idempotent(db, monkeypatch):
+    sent = []
+    monkeypatch.setattr(
+        NotificationService,
+        "send_email_if_enabled",
+        staticmethod(lambda job_db, user_id, message, link: sent.append(user_id) or True)
+    )
+    notification = Notification(
+        user_id=1,
+        message="Test notification",
+        link="/",
+        notification_type="admin_notification"
+    )
+    db.add(notification)
+    db.commit()
+    
+    # A retried job (e.g. after a crash before it was removed) does not email again
+    for _ in range(2):
+        notification_service.send_notification_email(
+            db, user_id=1, message="Test notification", link="/", notification_id=notification.id
+        )
+    assert sent == [1]
+    db.refresh(notification)
+    assert notification.email_sent_at is not None
+
+
+def test_failed_notification_email_is_retried(db, monkeypatch):
+    outcomes = [False, True]
+    sent = []
+    def send(job_db, user_id, message, link):
+        sent.append(user_id)
+        return outcomes.pop(0)
+    monkeypatch.setattr(NotificationService, "send_email_if_enabled", staticmethod(send))
+    notification = Notification(
+        user_id=1,
+        message="Retried notification",
+        link="/",
+        notification_type="admin_notification"
+    )
+    db.add(notification)
+    db.commit()
+    
+    # A failed send releases the claim and fails the job, so that it is retried
+    with pytest.raises(RuntimeError):
+        notification_service.send_notification_email(
+            db, user_id=1, message="Retried notification", link="/", notification_id=notification.id
+        )
+    db.refresh(notification)
+    assert notification.email_sent_at is None
+    
+    notification_service.send_notification_email(
+        db, user_id=1, message="Retried notification", link="/", notification_id=notification.id
+    )
+    db.refresh(notification)
+    assert notification.email_sent_at is not None
+    assert sent == [1, 1]
+
+
+def _save_text_file(db, text: str) -> str:
+    upload = UploadFile(
+        io.BytesIO(text.encode()),
+        filename="note.txt",
+        headers=Headers({"content-type": "text/plain"})
+    )
+    filename, _ = asyncio.run(storage.save_file(db, upload, "comments"))
+    return f"comments/{filename}"
+
+
+def test_file_stored_for_a_rolled_back_transaction_is_removed(db, monkeypatch):
+    monkeypatch.setattr(storage, "UNCOMMITTED_FILE_CLEANUP_DELAY", 0)
+    backend = storage.get_backend()
+    
+    kept = _save_text_file(db, f"committed {uuid.uuid4()}")
+    db.commit()
+    rolled_back = _save_text_file(db, f"rolled back {uuid.uuid4()}")
+    assert backend.exists(rolled_back)
+    db.rollback()
+    
+    # Removed by a background job (run here, or by a worker)
+    side_effects.run_pending()
+    for _ in range(50):
+        if not backend.exists(rolled_back):
+            break
+        time.sleep(0.1)
+    assert not backend.exists(rolled_back)
+    assert backend.exists(kept)
@@ -0,0 +1,136 @@
+import os
+import time
+import threading
+import pytest
+
+from app.services import storage
+from app.services.storage import BlobDiskCache
+from app.services.storage_backends import InMemoryStorageBackend, LocalStorageBackend
+
+
+class CountingBackend(InMemoryStorageBackend):
+    """In-memory backend that counts (and slows down) downloads"""
+
+    def __init__(self):
+        super().__init__()
+        self.downloads = 0
+
+    def download_to(self, path, destination):
+        self.downloads += 1
+        time.sleep(0.1)
+        super().download_to(path, destination)
+
+
+@pytest.fixture
+def backend():
+    previous = storage.get_backend()
+    backend = CountingBackend()
+    for name in ("a", "b", "c"):
+        backend.write_bytes(f"maps/{name}.pdf", name.encode() * 10, "application/pdf")
+    storage.set_backend(backend)
+    yield backend
+    storage.set_backend(previous)
+
+
+def _read(cache: BlobDiskCache, path: str) -> bytes:
+    with cache.open_local(path) as local_path:
+        with open(local_path, "rb") as f:
+            return f.read()
+
+
+def test_cache_uses_a_private_directory(tmp_path, backend):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    (shared / "keep.txt").write_text("not the cache's")
+
+    cache = BlobDiskCache(str(shared), 100)
+    assert (shared / "keep.txt").exists()
+    assert os.path.dirname(cache.directory) == str(shared)
+
+
+def test_cache_evicts_least_recently_used(tmp_path, backend):
+    cache = BlobDiskCache(str(tmp_path), 25)
+    assert _read(cache, "maps/a.pdf") == b"a" * 10
+    _read(cache, "maps/b.pdf")
+    _read(cache, "maps/a.pdf")
+    # b is now the least recently used file and makes room for c
+    _read(cache, "maps/c.pdf")
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["size_bytes"] == 20
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["hit_rate"] == 0.25
+
+    _read(cache, "maps/a.pdf")
+    _read(cache, "maps/b.pdf")
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 4
+
+
+def test_cache_keeps_files_in_use(tmp_path, backend):
+    cache = BlobDiskCache(str(tmp_path), 15)
+    with cache.open_local("maps/a.pdf") as local_path:
+        _read(cache, "maps/b.pdf")
+        _read(cache, "maps/c.pdf")
+        # Over budget, but the file in use is not evicted
+        assert os.path.exists(local_path)
+        assert cache.stats()["evictions"] == 2
+
+    # Once released it is evicted like any other file
+    _read(cache, "maps/b.pdf")
+    assert not os.path.exists(local_path)
+
+
+def test_cache_removes_invalidated_file_when_released(tmp_path, backend):
+    cache = BlobDiskCache(str(tmp_path), 100)
+    with cache.open_local("maps/a.pdf") as local_path:
+        cache.invalidate("maps/a.pdf")
+        assert os.path.exists(local_path)
+        assert cache.stats()["entries"] == 0
+    assert not os.path.exists(local_path)
+    assert os.listdir(cache.directory) == []
+
+
+def test_cache_downloads_concurrent_misses_once(tmp_path, backend):
+    cache = BlobDiskCache(str(tmp_path), 100)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(_read(cache, "maps/a.pdf")))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [b"a" * 10] * 5
+    assert backend.downloads == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 4
+
+
+def test_local_backend_concurrent_writes_of_a_path(tmp_path):
+    backend = LocalStorageBackend(str(tmp_path))
+    payloads = [bytes([index]) * (1024 * 1024) for index in range(8)]
+    barrier = threading.Barrier(len(payloads))
+    errors = []
+
+    def write(data):
+        barrier.wait()
+        try:
+            backend.write_bytes("maps/shared.pdf", data, "application/pdf")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(data,)) for data in payloads]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every write completes and the file holds exactly one of them
+    assert errors == []
+    assert backend.read_bytes("maps/shared.pdf") in payloads
+    assert os.listdir(tmp_path / "maps") == ["shared.pdf"]
@@ -74,9 +74,10 @@ export const fetchEvents = async (projectId) => {
 /**
  * Fetch all events for a specific map
  * @param {string|number} mapId - ID of the map to fetch events for
+ * @param {Object} [bbox] - Optional viewport {minX, minY, maxX, maxY} to only fetch visible events
  * @returns {Promise<Array>} - Promise resolving to an array of event objects
  */
-export const fetchMapEvents = async (mapId) => {
+export const fetchMapEvents = async (mapId, bbox = null) => {
   try {
     if (!mapId) {
       console.error('Missing map ID in fetchMapEvents call');
@@ -86,7 +87,18 @@ export const fetchMapEvents = async (mapId) => {
     console.debug(`[EventService Debug] Fetching events for map ${mapId}`);
     
     // DIRECT FIX: Use a fully qualified HTTPS URL instead of relying on axios composition
-    const directSecureUrl = `https://construction-map-backend-ypzdt6srya-uc.a.run.app/api/v1/maps/${mapId}/events/`;
+    let directSecureUrl = `https://construction-map-backend-ypzdt6srya-uc.a.run.app/api/v1/maps/${mapId}/events/`;
+    
+    // Only request the events inside the visible region of the map
+    if (bbox) {
+      const params = new URLSearchParams({
+        min_x: bbox.minX,
+        min_y: bbox.minY,
+        max_x: bbox.maxX,
+        max_y: bbox.maxY
+      });
+      directSecureUrl += `?${params.toString()}`;
+    }
     console.log(`[EventService] Using direct secure URL: ${directSecureUrl}`);
     
     // Create a secure config with the direct URL